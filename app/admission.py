@@ -0,0 +1,181 @@
+from collections import OrderedDict
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+from app.auth import SECRET_KEY, ALGORITHM
+import math
+import os
+import threading
+import time
+
+# Per-user and global request rates (requests per second) and burst sizes for LLM endpoints
+LLM_USER_RATE = float(os.getenv("LLM_USER_RATE", "0.5"))
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", "5"))
+LLM_GLOBAL_RATE = float(os.getenv("LLM_GLOBAL_RATE", "5"))
+LLM_GLOBAL_BURST = int(os.getenv("LLM_GLOBAL_BURST", "20"))
+
+# Concurrent AIService calls, and how many requests may wait (and for how long) for a slot
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "16"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "2"))
+
+# Idle per-user buckets beyond this many are evicted, oldest first
+MAX_TRACKED_USERS = 10000
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def retry_after(self, now: float) -> float:
+        """Seconds until one token is available, 0 if one is available now"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+
+    def take(self):
+        self.tokens -= 1
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Admission control for AIService calls.
+
+    A request must get a token from both its user's bucket and the global
+    bucket, then a concurrency slot. When all slots are busy it may wait up
+    to `queue_timeout` seconds in a queue of at most `max_queue` requests.
+    """
+
+    def __init__(
+        self,
+        user_rate: float = LLM_USER_RATE,
+        user_burst: int = LLM_USER_BURST,
+        global_rate: float = LLM_GLOBAL_RATE,
+        global_burst: int = LLM_GLOBAL_BURST,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.user_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = {"user_rate": 0, "global_rate": 0, "queue_full": 0, "queue_timeout": 0}
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(reason, retry_after)
+
+    def _take_tokens(self, key: str):
+        """Take one token from the user's and the global bucket and join the queue, or reject without taking any"""
+        with self._lock:
+            now = time.monotonic()
+            bucket = self.user_buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate, self.user_burst)
+                self.user_buckets[key] = bucket
+                if len(self.user_buckets) > MAX_TRACKED_USERS:
+                    self.user_buckets.popitem(last=False)
+            self.user_buckets.move_to_end(key)
+
+            user_wait = bucket.retry_after(now)
+            if user_wait > 0:
+                self._reject("user_rate", user_wait)
+
+            global_wait = self.global_bucket.retry_after(now)
+            if global_wait > 0:
+                self._reject("global_rate", global_wait)
+
+            if self.in_flight >= self.max_concurrency and self.queued >= self.max_queue:
+                self._reject("queue_full", self.queue_timeout)
+
+            bucket.take()
+            self.global_bucket.take()
+            self.queued += 1
+
+    def acquire(self, key: str):
+        """Admit a request for `key` or raise AdmissionRejected"""
+        self._take_tokens(key)
+
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        with self._lock:
+            self.queued -= 1
+            if not acquired:
+                self._reject("queue_timeout", self.queue_timeout)
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "queued": self.queued,
+                "max_concurrency": self.max_concurrency,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "tracked_users": len(self.user_buckets),
+            }
+
+
+admission_controller = AdmissionController()
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller by the user id in their bearer token, falling back to their IP address"""
+    authorization = request.headers.get("Authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            payload = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM])
+            if payload.get("sub") is not None:
+                return f"user:{payload['sub']}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def llm_admission(request: Request):
+    """Dependency admitting a request to the LLM endpoints, responding 429 with Retry-After when over limits"""
+    try:
+        admission_controller.acquire(client_key(request))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=f"Too many requests ({e.reason}), please retry later",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
+    try:
+        yield
+    finally:
+        admission_controller.release()
@@ -1,16 +1,28 @@
 from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from typing import List, Optional
 from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from app.database import get_db
 from app.dao import UserDAO
+import multiprocessing
 import os
+import threading
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Below this many passwords, hashing inline is cheaper than a round trip to the worker processes
+PARALLEL_HASH_THRESHOLD = 4
+
+# Processes of the pool shared by bulk password hashing
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_executor_lock = threading.Lock()
+
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "a_very_secret_key_that_should_be_changed_in_production")
 ALGORITHM = "HS256"
@@ -27,6 +39,32 @@ def get_password_hash(password):
     """Hash a password for storing"""
     return pwd_context.hash(password)
 
+def _hash_pool() -> ProcessPoolExecutor:
+    """Process pool shared by every bulk hash, started on first use"""
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            # Forking the threaded server would copy held locks into the children, start clean interpreters instead
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _hash_executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context(method))
+        return _hash_executor
+
+def shutdown_hash_pool():
+    """Stop the password hashing processes, on application shutdown"""
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(cancel_futures=True)
+            _hash_executor = None
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Hash many passwords in parallel on the shared process pool, preserving their order"""
+    if len(passwords) < PARALLEL_HASH_THRESHOLD:
+        return [get_password_hash(password) for password in passwords]
+
+    chunksize = max(1, len(passwords) // (PASSWORD_HASH_WORKERS * 4))
+    return list(_hash_pool().map(get_password_hash, passwords, chunksize=chunksize))
+
 def create_access_token(data: dict):
     """Create a JWT access token"""
     to_encode = data.copy()
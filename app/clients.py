@@ -0,0 +1,95 @@
+import httpx
+from fastapi import HTTPException, Request, status
+from mistralai import Mistral
+from llama_index.core import Settings
+from llama_index.llms.mistralai import MistralAI
+from llama_index.embeddings.mistralai import MistralAIEmbedding
+from app.resilience import ResilientTransport
+from app.usage import on_request, on_response
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Model names shared by every AIService call
+CHAT_MODEL = "mistral-large-latest"
+EMBED_MODEL = "mistral-embed"
+
+# HTTP connection pool settings for the Mistral API
+MISTRAL_MAX_CONNECTIONS = int(os.getenv("MISTRAL_MAX_CONNECTIONS", "20"))
+MISTRAL_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("MISTRAL_MAX_KEEPALIVE_CONNECTIONS", "10"))
+MISTRAL_KEEPALIVE_EXPIRY = float(os.getenv("MISTRAL_KEEPALIVE_EXPIRY", "30"))
+MISTRAL_CONNECT_TIMEOUT = float(os.getenv("MISTRAL_CONNECT_TIMEOUT", "5"))
+MISTRAL_READ_TIMEOUT = float(os.getenv("MISTRAL_READ_TIMEOUT", "120"))
+
+# Mistral API base URL, pointed at a local fake server in tests and load runs
+MISTRAL_SERVER_URL = os.getenv("MISTRAL_SERVER_URL") or None
+
+# Number of texts sent per embedding request
+MISTRAL_EMBED_BATCH_SIZE = int(os.getenv("MISTRAL_EMBED_BATCH_SIZE", "32"))
+
+
+class AIClients:
+    """
+    Application scoped registry of the Mistral chat, LLM and embedding clients.
+
+    All three clients share one keep-alive httpx connection pool so requests
+    reuse open TLS connections instead of performing a new handshake per call.
+    The pool's transport applies deadlines, retries, hedging and the circuit
+    breaker of `ResilientTransport` to every model call.
+    Built once in the FastAPI lifespan and closed on shutdown.
+    """
+
+    def __init__(self, api_key: str | None = None):
+        self.api_key = api_key if api_key is not None else os.getenv("MISTRAL_API_KEY")
+
+        self.transport = ResilientTransport(
+            httpx.HTTPTransport(limits=httpx.Limits(
+                max_connections=MISTRAL_MAX_CONNECTIONS,
+                max_keepalive_connections=MISTRAL_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=MISTRAL_KEEPALIVE_EXPIRY,
+            )),
+            max_workers=MISTRAL_MAX_CONNECTIONS,
+        )
+        self.http_client = httpx.Client(
+            transport=self.transport,
+            timeout=httpx.Timeout(MISTRAL_READ_TIMEOUT, connect=MISTRAL_CONNECT_TIMEOUT),
+            # Token usage of every chat and embedding call is buffered for accounting
+            event_hooks={"request": [on_request], "response": [on_response]},
+        )
+        self.chat_client = Mistral(api_key=self.api_key, client=self.http_client, server_url=MISTRAL_SERVER_URL)
+
+        self.llm = MistralAI(model=CHAT_MODEL, api_key=self.api_key, timeout=MISTRAL_READ_TIMEOUT)
+        self.embed_model = MistralAIEmbedding(model_name=EMBED_MODEL, api_key=self.api_key, embed_batch_size=MISTRAL_EMBED_BATCH_SIZE)
+
+        # The llama-index wrappers build their own Mistral SDK client internally,
+        # point them at the pooled one so they share its connections.
+        self.llm._client = self.chat_client
+        self.embed_model._client = self.chat_client
+
+        Settings.llm = self.llm
+        Settings.embed_model = self.embed_model
+
+    def close(self):
+        """Close the pooled HTTP connections"""
+        self.http_client.close()
+        logger.info("Closed Mistral HTTP connection pool")
+
+
+def build_ai_clients() -> AIClients | None:
+    """Build the AI clients, or return None when no Mistral API key is configured"""
+    if not os.getenv("MISTRAL_API_KEY"):
+        logger.warning("MISTRAL_API_KEY is not set, AI endpoints will be unavailable")
+        return None
+    return AIClients()
+
+
+def get_ai_clients(request: Request) -> AIClients:
+    """Dependency returning the application scoped AI clients"""
+    ai_clients = getattr(request.app.state, "ai_clients", None)
+    if ai_clients is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="AI service is not configured"
+        )
+    return ai_clients
@@ -1,9 +1,16 @@
-from fastapi import APIRouter, Depends, status, Path
+from fastapi import APIRouter, Body, Depends, File, HTTPException, Path, Query, Request, Response, UploadFile, status
+from fastapi.responses import ORJSONResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.database import get_db
+from app.clients import AIClients, get_ai_clients
+from app.admission import admission_controller, llm_admission
+from app.auth import get_current_user
+from app.usage import track_usage
+from app.matching import MATCH_TOP_K
 from app.service import *
-from typing import List
+from typing import Any, List, Optional
+import io
 import logging
 
 logger = logging.getLogger(__name__)
@@ -14,6 +21,27 @@ router = APIRouter(tags=["auth"])
 async def register(user_data: UserCreate, db: Session = Depends(get_db)):
     return UserService.register_user(db, user_data)
 
+@router.post("/register/bulk", response_model=BulkRegisterResponse, dependencies=[Depends(get_current_user), Depends(llm_admission)])
+def bulk_register(users: List[Any] = Body(...), db: Session = Depends(get_db)):
+    """
+    Register many users in one request
+
+    Rows are validated one by one, a malformed row is reported without
+    rejecting the others.
+
+    Args:
+        users: User information, one object per user, at most BULK_REGISTER_MAX_ROWS
+
+    Returns:
+        Registered users and per-row errors (rows are 1-based positions in the request)
+    """
+    if len(users) > BULK_REGISTER_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {BULK_REGISTER_MAX_ROWS} users per request"
+        )
+    return UserService.bulk_register_users(db, users)
+
 @router.post("/login", response_model=TokenResponse)
 async def login(
         payload: LoginRequest,
@@ -42,6 +70,20 @@ async def get_options(db: Session = Depends(get_db)):
     """
     return OptionService.list_initial_options(db)
 
+@router.get("/onboarding", response_model=List[OnboardingOptionResponse], status_code=status.HTTP_200_OK)
+def get_onboarding(request: Request, db: Session = Depends(get_db)):
+    """
+    Retrieve every option with its queries in order, for rendering the onboarding flow in one request.
+
+    Returns:
+        List of options with their ordered queries, or 304 when the client's ETag is current
+    """
+    body, etag = OptionService.get_onboarding(db)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/query/{option_id}", response_model=List[QueryResponse], status_code=status.HTTP_200_OK)
 async def get_query(option_id:int, db: Session = Depends(get_db)):
     """
@@ -50,10 +92,11 @@ async def get_query(option_id:int, db: Session = Depends(get_db)):
     Returns:
         List of option names (initial_option)
     """
-    return QueryService.list_all_queries_per_option(option_id, db)
+    # Fast path: rows are serialized by orjson without building response models
+    return ORJSONResponse(QueryService.get_query_rows(option_id, db))
 
-@router.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest):
+@router.post("/chat", response_model=ChatResponse, dependencies=[Depends(llm_admission), Depends(track_usage)])
+def chat(request: ChatRequest, clients: AIClients = Depends(get_ai_clients)):
     """
     Chat with the AI model
     
@@ -63,23 +106,87 @@ def chat(request: ChatRequest):
     Returns:
         ChatResponse: Model response
     """
-    ai_service = AIService()
+    ai_service = AIService(clients)
 
     user = request.user
 
     if (user == 'lead'):
         return ai_service.chat(model='mistral', prompt=request.prompt, chat_history=request.chat_history)
     if (user == 'staff'):
-        return ai_service.chat_with_rag(model='mistral', prompt=request.prompt, chat_history=request.chat_history)
+        return ai_service.chat_with_rag(model='mistral', prompt=request.prompt, chat_history=request.chat_history, department_id=request.department_id, search_all_departments=request.search_all_departments)
 
-@router.post("/summarize", response_model=SummarizeResponse)
-def summarize(request: SummarizeRequest, db: Session = Depends(get_db)):
-    ai_service = AIService()
-    return ai_service.summarize(model='mistral', chat_history=request.chat_history, db=db)
+@router.post("/summarize", response_model=SummarizeResponse, dependencies=[Depends(llm_admission), Depends(track_usage)])
+def summarize(request: SummarizeRequest, db: Session = Depends(get_db), clients: AIClients = Depends(get_ai_clients)):
+    ai_service = AIService(clients)
+    return ai_service.summarize(model='mistral', chat_history=request.chat_history, db=db, department_id=request.department_id, user_id=request.user_id)
 
 @router.get("/opportunities", response_model=list[OpportunityResponse])
 def get_opportunities(db: Session = Depends(get_db)):
-    return OpportunityService.get_opportunities(db)
+    # Fast path: rows are serialized by orjson without building response models
+    return ORJSONResponse(OpportunityService.get_opportunity_rows(db))
+
+@router.post("/opportunities/bulk", response_model=BulkIngestResponse, status_code=status.HTTP_201_CREATED, dependencies=[Depends(llm_admission), Depends(track_usage)])
+def bulk_ingest_opportunities(
+        file: UploadFile = File(...),
+        db: Session = Depends(get_db),
+        clients: AIClients = Depends(get_ai_clients)
+):
+    """
+    Bulk load opportunities from a JSONL or CSV upload and index them.
+
+    Each row needs a `details` field and may carry `department_id` and `user_id`.
+
+    Returns:
+        Inserted and failed row counts with per-row errors
+    """
+    filename = (file.filename or "").lower()
+    if filename.endswith(".csv") or file.content_type == "text/csv":
+        file_format = "csv"
+    elif filename.endswith((".jsonl", ".ndjson")) or file.content_type in ("application/jsonl", "application/x-ndjson"):
+        file_format = "jsonl"
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Upload must be a .jsonl or .csv file"
+        )
+
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return OpportunityService.bulk_ingest(db, stream, file_format, AIService(clients))
+
+@router.post("/opportunities/{opportunity_id}/close", response_model=OpportunityResponse, status_code=status.HTTP_200_OK)
+def close_opportunity(opportunity_id: int, db: Session = Depends(get_db)):
+    """
+    Close an opportunity, it is archived by the next retention run.
+
+    Returns:
+        The closed opportunity
+    """
+    return OpportunityService.close_opportunity(db, opportunity_id)
+
+@router.post("/opportunities/archive", response_model=RetentionResponse, status_code=status.HTTP_200_OK)
+def archive_opportunities(db: Session = Depends(get_db), clients: AIClients = Depends(get_ai_clients)):
+    """
+    Run the retention job: move expired and closed opportunities to the archive and out of the index.
+
+    Returns:
+        Counts of archived opportunities per reason and purged archive rows
+    """
+    return RetentionService.archive_stale_opportunities(db, AIService(clients))
+
+@router.get("/opportunities/archived", response_model=List[ArchivedOpportunityResponse], status_code=status.HTTP_200_OK)
+def archived_opportunities(
+        department_id: Optional[int] = None,
+        limit: int = Query(100, ge=1, le=500),
+        offset: int = Query(0, ge=0),
+        db: Session = Depends(get_db)
+):
+    """
+    Retrieve archived opportunities, most recently archived first.
+
+    Returns:
+        Archived opportunities with the reason and time they were archived
+    """
+    return RetentionService.list_archived(db, department_id, limit, offset)
 
 @router.get("/department", response_model=List[DepartmentDTO], status_code=status.HTTP_200_OK)
 async def department(db: Session = Depends(get_db)):
@@ -101,13 +208,66 @@ async def designation(department_id: int = Path(..., title="Department ID", ge=1
     """
     return DesignationService.list_designation(department_id, db)
 
-@router.get("/index-opportunity", response_model=CreateIndexResponse)
-def create_index(db: Session = Depends(get_db)):
+@router.get("/index-opportunity", response_model=CreateIndexResponse, dependencies=[Depends(llm_admission), Depends(track_usage)])
+def create_index(db: Session = Depends(get_db), clients: AIClients = Depends(get_ai_clients)):
     """
     Create index from all created opportunities.
 
     Returns:
         success (bool): whether or not index was created
     """
-    ai_service = AIService()
-    return ai_service.create_index(model='mistral', db=db)
\ No newline at end of file
+    ai_service = AIService(clients)
+    return ai_service.create_index(model='mistral', db=db)
+
+@router.post("/matches/refresh", response_model=MatchRefreshResponse, dependencies=[Depends(llm_admission), Depends(track_usage)])
+def refresh_matches(full: bool = Query(False), db: Session = Depends(get_db), clients: AIClients = Depends(get_ai_clients)):
+    """
+    Update the precomputed staff to opportunity matches now.
+
+    Matches are also updated in the background after registrations, opportunity
+    saves and archival, `full` rescores every pair instead of the changed ones.
+
+    Returns:
+        Counts of staff, opportunities, texts embedded, matches rescored and rows written
+    """
+    return MatchService.refresh_matches(db, clients, full=full)
+
+@router.get("/matches/staff/{user_id}", response_model=List[MatchResponse], status_code=status.HTTP_200_OK)
+def staff_matches(user_id: int, limit: int = Query(MATCH_TOP_K, ge=1, le=MATCH_TOP_K), db: Session = Depends(get_db)):
+    """
+    Retrieve the best matching opportunities for a staff member.
+
+    Returns:
+        Opportunity ids with similarity scores, best first
+    """
+    return MatchService.matches_for_user(user_id, db, limit)
+
+@router.get("/matches/opportunity/{opportunity_id}", response_model=List[MatchResponse], status_code=status.HTTP_200_OK)
+def opportunity_matches(opportunity_id: int, limit: int = Query(MATCH_TOP_K, ge=1, le=MATCH_TOP_K), db: Session = Depends(get_db)):
+    """
+    Retrieve the best matching staff for an opportunity.
+
+    Returns:
+        User ids with similarity scores, best first
+    """
+    return MatchService.matches_for_opportunity(opportunity_id, db, limit)
+
+@router.get("/llm/stats", status_code=status.HTTP_200_OK)
+def llm_stats(clients: AIClients = Depends(get_ai_clients)):
+    """
+    Model call resilience state, for monitoring the provider.
+
+    Returns:
+        Circuit breaker state, call, retry, hedge and failure counts and p95 latencies
+    """
+    return clients.transport.stats()
+
+@router.get("/admission/stats", status_code=status.HTTP_200_OK)
+def admission_stats():
+    """
+    Current LLM admission control state, for tuning the limits.
+
+    Returns:
+        In-flight and queued requests, admitted count and rejection counts by reason
+    """
+    return admission_controller.stats()
@@ -1,20 +1,85 @@
 from dataclasses import dataclass
+from datetime import datetime, timezone
+from sqlalchemy import column, delete, func, insert, select, table, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from app.models import User, Option, Query, Opportunity, Department, Designation
-from typing import List
+from app.models import User, Option, Query, Opportunity, OpportunityMatch, ArchivedOpportunity, Department, Designation
+from typing import Dict, List, Optional, Set, Tuple
+import csv
+import io
 
-@dataclass
+# Read-only list DTOs are filled straight from projected column tuples, slots keep them small
+
+@dataclass(slots=True)
 class DepartmentDTO:
     id: int
     name: str
 
-@dataclass
+@dataclass(slots=True)
 class DesignationDTO:
     id: int
     department_id: int
     title: str
 
+@dataclass(slots=True)
+class OptionDTO:
+    id: int
+    initial_option: str
+
+@dataclass(slots=True)
+class QueryDTO:
+    option_id: int
+    ask: str
+    order_num: int
+
+@dataclass(slots=True)
+class OptionWithQueriesDTO:
+    id: int
+    initial_option: str
+    queries: List[QueryDTO]
+
+@dataclass(slots=True)
+class OpportunityDTO:
+    id: int
+    details: str
+    department_id: Optional[int]
+    user_id: Optional[int]
+    created_at: Optional[datetime]
+    duplicate_of: Optional[int] = None
+
+@dataclass(slots=True)
+class OpportunityLifecycleDTO:
+    id: int
+    details: str
+    created_at: Optional[datetime]
+    closed_at: Optional[datetime]
+    duplicate_of: Optional[int]
+
+@dataclass(slots=True)
+class ArchivedOpportunityDTO:
+    id: int
+    details: str
+    department_id: Optional[int]
+    user_id: Optional[int]
+    created_at: datetime
+    closed_at: Optional[datetime]
+    duplicate_of: Optional[int]
+    archive_reason: str
+    archived_at: datetime
+
+# Columns of OpportunityDTO, in field order
+OPPORTUNITY_DTO_COLUMNS = (
+    Opportunity.id, Opportunity.details, Opportunity.department_id, Opportunity.user_id, Opportunity.created_at, Opportunity.duplicate_of
+)
+
+# Ids per IN (...) list when moving opportunities to the archive
+ARCHIVE_BATCH_SIZE = 1000
+
+# (user_id, opportunity_id) keys per IN (...) list when deleting stale matches
+MATCH_WRITE_BATCH_SIZE = 1000
+
 class UserDAO:
     @staticmethod
     def save_user(db: Session, user_data: dict) -> User:
@@ -42,6 +107,48 @@ class UserDAO:
             db.rollback()
             raise e
 
+    @staticmethod
+    def bulk_save_users(db: Session, users: List[dict]) -> List[User]:
+        """
+        Save a batch of new users in one INSERT statement and one commit
+
+        Args:
+            db: Database session
+            users: Dictionaries containing user information
+
+        Returns:
+            The saved User objects, in input order
+
+        Raises:
+            IntegrityError: If any user's email already exists, nothing is saved
+        """
+        if not users:
+            return []
+
+        try:
+            saved = list(db.scalars(insert(User).returning(User, sort_by_parameter_order=True), users))
+            db.commit()
+            return saved
+        except IntegrityError as e:
+            db.rollback()
+            raise e
+
+    @staticmethod
+    def retrieve_existing_emails(db: Session, emails: List[str]) -> set[str]:
+        """
+        Retrieve which of the given emails are already registered
+
+        Args:
+            db: Database session
+            emails: Emails to check
+
+        Returns:
+            Set of the emails that belong to existing users
+        """
+        if not emails:
+            return set()
+        return set(db.scalars(select(User.email).where(User.email.in_(emails))))
+
     @staticmethod
     def retrieve_user_by_email(db: Session, email: str) -> User:
         """
@@ -56,6 +163,10 @@ class UserDAO:
         """
         return db.query(User).filter(User.email == email).first()
         
+    @staticmethod
+    def list_users(db: Session) -> List[User]:
+        return db.query(User).all()
+
     @staticmethod
     def retrieve_user_by_id(db: Session, user_id: int) -> User:
         """
@@ -72,14 +183,37 @@ class UserDAO:
 
 class OptionDAO:
     @staticmethod
-    def list_initial_options(db: Session) -> List[Option]:
-        return db.query(Option).all()
+    def list_initial_options(db: Session) -> List[OptionDTO]:
+        rows = db.execute(select(Option.id, Option.initial_option))
+        return [OptionDTO(*row) for row in rows]
+
+    @staticmethod
+    def list_options_with_queries(db: Session) -> List[OptionWithQueriesDTO]:
+        """Every option with its queries in order, read with one outer join"""
+        rows = db.execute(
+            select(Option.id, Option.initial_option, Query.ask, Query.order_num)
+            .outerjoin(Query, Query.option_id == Option.id)
+            .order_by(Option.id, Query.order_num)
+        )
+
+        options: Dict[int, OptionWithQueriesDTO] = {}
+        for option_id, initial_option, ask, order_num in rows:
+            option = options.get(option_id)
+            if option is None:
+                option = options[option_id] = OptionWithQueriesDTO(option_id, initial_option, [])
+            # Options without queries come back once with a NULL query
+            if ask is not None:
+                option.queries.append(QueryDTO(option_id, ask, order_num))
+        return list(options.values())
 
 
 class QueryDAO:
     @staticmethod
-    def list_queries_per_option(optionId: int, db: Session) -> List[Query]:
-        return db.query(Query).filter(Query.option_id == optionId).all()
+    def list_queries_per_option(optionId: int, db: Session) -> List[QueryDTO]:
+        rows = db.execute(
+            select(Query.option_id, Query.ask, Query.order_num).where(Query.option_id == optionId)
+        )
+        return [QueryDTO(*row) for row in rows]
 
 
 class OpportunityDAO:
@@ -97,29 +231,285 @@ class OpportunityDAO:
             raise e
 
     @staticmethod
-    def get_all_opportunities(db: Session) -> list[Opportunity]:
-        return db.query(Opportunity).all()
+    def bulk_add_opportunities(db: Session, opportunities: List[dict]) -> List[OpportunityDTO]:
+        """
+        Insert a batch of opportunities in one statement and one commit
+
+        On PostgreSQL the rows are COPYed into a temporary staging table and
+        moved with INSERT ... SELECT ... RETURNING, elsewhere they are inserted
+        with an executemany INSERT ... RETURNING. Either way exactly the rows
+        of this batch come back, never rows other writers committed meanwhile.
+
+        Args:
+            db: Database session
+            opportunities: Dictionaries with details, department_id and user_id
+
+        Returns:
+            The inserted opportunities as DTOs ordered by id, which follows input
+            order, so nothing is reloaded when the commit expires the session
+        """
+        if not opportunities:
+            return []
+
+        rows = [
+            {'details': opportunity["details"], 'department_id': opportunity.get("department_id"), 'user_id': opportunity.get("user_id")}
+            for opportunity in opportunities
+        ]
+        try:
+            # The configured bind is the primary, asking get_bind() would count as a write
+            if db.bind.dialect.name == "postgresql":
+                inserted = OpportunityDAO._copy_opportunities(db, rows)
+            else:
+                # Without sort_by_parameter_order the rows are sent in a few multi-row statements, they are sorted by id below
+                inserted = [
+                    OpportunityDTO(*row)
+                    for row in db.execute(insert(Opportunity.__table__).returning(*OPPORTUNITY_DTO_COLUMNS), rows)
+                ]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return sorted(inserted, key=lambda opportunity: opportunity.id)
+
+    @staticmethod
+    def _copy_opportunities(db: Session, rows: List[dict]) -> List[OpportunityDTO]:
+        """COPY rows into a staging table dropped at commit, then insert them into opportunity returning the new rows"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row["details"], row["department_id"], row["user_id"]])
+        buffer.seek(0)
+
+        db.execute(text(
+            "CREATE TEMPORARY TABLE opportunity_staging "
+            "(seq serial, details text, department_id integer, user_id integer) ON COMMIT DROP"
+        ))
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(
+            "COPY opportunity_staging (details, department_id, user_id) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+        staging = table("opportunity_staging", column("seq"), column("details"), column("department_id"), column("user_id"))
+        statement = (
+            insert(Opportunity)
+            .from_select(
+                ["details", "department_id", "user_id"],
+                select(staging.c.details, staging.c.department_id, staging.c.user_id).order_by(staging.c.seq)
+            )
+            .returning(*OPPORTUNITY_DTO_COLUMNS)
+        )
+        return [OpportunityDTO(*row) for row in db.execute(statement)]
+
+    @staticmethod
+    def get_all_opportunities(db: Session, include_duplicates: bool = True) -> List[OpportunityDTO]:
+        statement = select(*OPPORTUNITY_DTO_COLUMNS)
+        if not include_duplicates:
+            statement = statement.where(Opportunity.duplicate_of.is_(None))
+        return [OpportunityDTO(*row) for row in db.execute(statement)]
+
+    @staticmethod
+    def get_opportunity_details_after(db: Session, last_id: int) -> List[Tuple[int, str]]:
+        """(id, details) of opportunities newer than last_id that are not flagged as duplicates"""
+        rows = db.execute(
+            select(Opportunity.id, Opportunity.details)
+            .where(Opportunity.id > last_id, Opportunity.duplicate_of.is_(None))
+            .order_by(Opportunity.id)
+        )
+        return [tuple(row) for row in rows]
+
+    @staticmethod
+    def close_opportunity(db: Session, opportunity_id: int) -> Optional[Opportunity]:
+        """Mark an opportunity closed, None if it does not exist"""
+        opportunity = db.get(Opportunity, opportunity_id)
+        if opportunity is None:
+            return None
+        if opportunity.closed_at is None:
+            opportunity.closed_at = func.now()
+            db.commit()
+            db.refresh(opportunity)
+        return opportunity
+
+    @staticmethod
+    def list_opportunity_lifecycles(db: Session) -> List[OpportunityLifecycleDTO]:
+        """Columns the retention job decides on, for every active opportunity"""
+        rows = db.execute(select(
+            Opportunity.id, Opportunity.details, Opportunity.created_at, Opportunity.closed_at, Opportunity.duplicate_of
+        ))
+        return [OpportunityLifecycleDTO(*row) for row in rows]
+
+    @staticmethod
+    def archive_opportunities(db: Session, reasons: Dict[int, str]) -> int:
+        """
+        Move opportunities into the archive table in one transaction
+
+        Their staff matches are deleted, and opportunities left flagged as
+        duplicates of an archived one are unflagged.
+
+        Args:
+            db: Database session
+            reasons: Archive reason keyed by opportunity id
+
+        Returns:
+            Number of opportunities archived
+        """
+        ids = sorted(reasons)
+        batches = [ids[start:start + ARCHIVE_BATCH_SIZE] for start in range(0, len(ids), ARCHIVE_BATCH_SIZE)]
+        archived = 0
+        try:
+            # Copy every row before any duplicate flag is cleared
+            archived_at = datetime.now(timezone.utc)
+            for batch in batches:
+                rows = db.execute(select(
+                    Opportunity.id, Opportunity.details, Opportunity.department_id, Opportunity.user_id,
+                    Opportunity.created_at, Opportunity.closed_at, Opportunity.duplicate_of,
+                ).where(Opportunity.id.in_(batch))).all()
+                if rows:
+                    db.execute(insert(ArchivedOpportunity), [
+                        {**row._asdict(), 'archive_reason': reasons[row.id], 'archived_at': archived_at}
+                        for row in rows
+                    ])
+                archived += len(rows)
+
+            for batch in batches:
+                db.execute(delete(OpportunityMatch).where(OpportunityMatch.opportunity_id.in_(batch)))
+                db.execute(update(Opportunity).where(Opportunity.duplicate_of.in_(batch)).values(duplicate_of=None))
+            for batch in batches:
+                db.execute(delete(Opportunity).where(Opportunity.id.in_(batch)))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return archived
+
+    @staticmethod
+    def list_archived_opportunities(db: Session, department_id: Optional[int] = None, limit: int = 100, offset: int = 0) -> List[ArchivedOpportunityDTO]:
+        """Archived opportunities, most recently archived first"""
+        statement = select(
+            ArchivedOpportunity.id, ArchivedOpportunity.details, ArchivedOpportunity.department_id, ArchivedOpportunity.user_id,
+            ArchivedOpportunity.created_at, ArchivedOpportunity.closed_at, ArchivedOpportunity.duplicate_of,
+            ArchivedOpportunity.archive_reason, ArchivedOpportunity.archived_at,
+        )
+        if department_id is not None:
+            statement = statement.where(ArchivedOpportunity.department_id == department_id)
+        statement = statement.order_by(ArchivedOpportunity.archived_at.desc(), ArchivedOpportunity.id.desc()).limit(limit).offset(offset)
+        return [ArchivedOpportunityDTO(*row) for row in db.execute(statement)]
+
+    @staticmethod
+    def purge_archived_before(db: Session, cutoff: datetime) -> int:
+        """Delete archived opportunities archived before the cutoff, returns the number deleted"""
+        try:
+            result = db.execute(delete(ArchivedOpportunity).where(ArchivedOpportunity.archived_at < cutoff))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+        return result.rowcount
+
+class MatchDAO:
+    @staticmethod
+    def list_match_scores(db: Session) -> Dict[Tuple[int, int], float]:
+        """Every stored match score keyed by (user_id, opportunity_id)"""
+        rows = db.execute(select(OpportunityMatch.user_id, OpportunityMatch.opportunity_id, OpportunityMatch.score))
+        return {(user_id, opportunity_id): score for user_id, opportunity_id, score in rows}
+
+    @staticmethod
+    def list_staff_matched_to(db: Session, opportunity_ids: List[int]) -> Set[int]:
+        """Ids of staff with a stored match to any of the given opportunities"""
+        staff = set()
+        for start in range(0, len(opportunity_ids), MATCH_WRITE_BATCH_SIZE):
+            staff.update(db.scalars(select(OpportunityMatch.user_id).distinct().where(
+                OpportunityMatch.opportunity_id.in_(opportunity_ids[start:start + MATCH_WRITE_BATCH_SIZE])
+            )))
+        return staff
+
+    @staticmethod
+    def replace_matches(db: Session, pairs: Dict[Tuple[int, int], float], existing: Dict[Tuple[int, int], float]) -> int:
+        """
+        Make the stored matches equal to the given pairs, writing only the rows that changed
+
+        New and rescored pairs are written with one bulk upsert, pairs no longer
+        kept are removed with batched deletes.
+
+        Args:
+            db: Database session
+            pairs: Scores keyed by (user_id, opportunity_id)
+            existing: Stored scores the pairs replace, keyed the same way
+
+        Returns:
+            Number of rows inserted, updated or deleted
+        """
+        upserts = [
+            {'user_id': user_id, 'opportunity_id': opportunity_id, 'score': score}
+            for (user_id, opportunity_id), score in pairs.items()
+            if (user_id, opportunity_id) not in existing or abs(existing[(user_id, opportunity_id)] - score) > 1e-6
+        ]
+        stale = [key for key in existing if key not in pairs]
+
+        try:
+            if upserts:
+                dialect_insert = postgresql_insert if db.bind.dialect.name == "postgresql" else sqlite_insert
+                statement = dialect_insert(OpportunityMatch)
+                db.execute(statement.on_conflict_do_update(
+                    index_elements=[OpportunityMatch.user_id, OpportunityMatch.opportunity_id],
+                    set_={'score': statement.excluded.score, 'updated_at': func.now()},
+                ), upserts)
+            for start in range(0, len(stale), MATCH_WRITE_BATCH_SIZE):
+                db.execute(delete(OpportunityMatch).where(
+                    tuple_(OpportunityMatch.user_id, OpportunityMatch.opportunity_id).in_(stale[start:start + MATCH_WRITE_BATCH_SIZE])
+                ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            raise e
+
+        return len(upserts) + len(stale)
+
+    @staticmethod
+    def list_matches_for_user(db: Session, user_id: int, limit: int) -> List[OpportunityMatch]:
+        return (db.query(OpportunityMatch)
+                .filter(OpportunityMatch.user_id == user_id)
+                .order_by(OpportunityMatch.score.desc())
+                .limit(limit)
+                .all())
+
+    @staticmethod
+    def list_matches_for_opportunity(db: Session, opportunity_id: int, limit: int) -> List[OpportunityMatch]:
+        return (db.query(OpportunityMatch)
+                .filter(OpportunityMatch.opportunity_id == opportunity_id)
+                .order_by(OpportunityMatch.score.desc())
+                .limit(limit)
+                .all())
 
 class DepartmentDAO:
     @staticmethod
     def list_departments(db: Session) -> List[DepartmentDTO]:
-        depts = db.query(Department).all()
-        return [DepartmentDTO(id=d.id, name=d.name) for d in depts]
+        rows = db.execute(select(Department.id, Department.name))
+        return [DepartmentDTO(*row) for row in rows]
 
     def retrieve_department_name(departmentId: int, db: Session) -> str:
-        department_model = db.query(Department).filter(Department.id == departmentId).first()
-        if not department_model:
+        department_name = db.execute(select(Department.name).where(Department.id == departmentId)).scalar()
+        if department_name is None:
             raise ValueError(f"Department with ID {departmentId} not found.")
-        return department_model.name
+        return department_name
 
 
 class DesignationDAO:
+    @staticmethod
+    def list_designations(db: Session) -> List[DesignationDTO]:
+        rows = db.execute(select(Designation.id, Designation.department_id, Designation.title))
+        return [DesignationDTO(*row) for row in rows]
+
     @staticmethod
     def list_designations_per_department(departmentId: int, db: Session) -> List[DesignationDTO]:
-        designation_list = db.query(Designation).filter(Designation.department_id == departmentId).all()
-        return [DesignationDTO(id=d.id, department_id=d.department_id, title=d.title) for d in designation_list]
+        rows = db.execute(
+            select(Designation.id, Designation.department_id, Designation.title).where(Designation.department_id == departmentId)
+        )
+        return [DesignationDTO(*row) for row in rows]
     def retrieve_designation_name(designationId: int, db: Session) -> str:
-        designation_model = db.query(Designation).filter(Designation.id == designationId).first()
-        if not designation_model:
+        designation_title = db.execute(select(Designation.title).where(Designation.id == designationId)).scalar()
+        if designation_title is None:
             raise ValueError(f"Designation with ID {designationId} not found.")
-        return designation_model.title
\ No newline at end of file
+        return designation_title
\ No newline at end of file
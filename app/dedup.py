@@ -0,0 +1,115 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+from app.retrieval import shingles
+import numpy as np
+import logging
+import os
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Estimated shingle Jaccard similarity above which a new opportunity is a near-duplicate
+OPPORTUNITY_DUPLICATE_THRESHOLD = float(os.getenv("OPPORTUNITY_DUPLICATE_THRESHOLD", "0.7"))
+
+# "merge" keeps the existing opportunity instead of inserting, "flag" inserts it marked as a duplicate
+OPPORTUNITY_DUPLICATE_POLICY = os.getenv("OPPORTUNITY_DUPLICATE_POLICY", "merge")
+
+# 32 bands of 4 rows make pairs above ~0.42 similarity likely LSH candidates, well below the threshold
+MINHASH_PERMUTATIONS = 128
+MINHASH_BANDS = 32
+
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+class MinHasher:
+    """MinHash signatures of word shingle sets, using universal hashing (a * x + b) mod p"""
+
+    def __init__(self, num_permutations: int = MINHASH_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode()) % _MERSENNE_PRIME for shingle in shingles(text)),
+            dtype=np.uint64,
+        )
+        if not len(hashes):
+            return np.full(len(self.a), _MERSENNE_PRIME, dtype=np.uint32)
+        # Values are below 2^31, uint32 halves the memory kept per opportunity
+        return ((np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME).min(axis=0).astype(np.uint32)
+
+
+class DuplicateIndex:
+    """
+    In-memory MinHash LSH index of opportunity details.
+
+    Signatures are split into bands. Opportunities sharing a band are
+    candidates, and the candidate with the highest estimated Jaccard
+    similarity at or above the threshold is reported as the duplicate.
+    """
+
+    def __init__(self, threshold: float = OPPORTUNITY_DUPLICATE_THRESHOLD, bands: int = MINHASH_BANDS, hasher: Optional[MinHasher] = None):
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+        self.rows = len(self.hasher.a) // bands
+        self.bands = bands
+        self.signatures: Dict[int, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, bytes], Set[int]] = defaultdict(set)
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, opportunity_id: int, details: str):
+        signature = self.hasher.signature(details)
+        self.signatures[opportunity_id] = signature
+        for key in self._band_keys(signature):
+            self.buckets[key].add(opportunity_id)
+        self.last_id = max(self.last_id, opportunity_id)
+
+    def remove(self, opportunity_id: int):
+        signature = self.signatures.pop(opportunity_id, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            self.buckets[key].discard(opportunity_id)
+            if not self.buckets[key]:
+                del self.buckets[key]
+
+    def matches(self, details: str) -> List[Tuple[int, float]]:
+        """
+        Indexed opportunities the details are a near-duplicate of, most similar first.
+
+        Returns:
+            List[Tuple[int, float]]: opportunity ids and estimated Jaccard similarities
+        """
+        signature = self.hasher.signature(details)
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+
+        similarities = [(candidate, float(np.mean(self.signatures[candidate] == signature))) for candidate in candidates]
+        return sorted(
+            ((candidate, similarity) for candidate, similarity in similarities if similarity >= self.threshold),
+            key=lambda match: (-match[1], match[0])
+        )
+
+    def find(self, details: str) -> Optional[Tuple[int, float]]:
+        """
+        Most similar indexed opportunity, if it is a near-duplicate of the details.
+
+        Returns:
+            Optional[Tuple[int, float]]: opportunity id and estimated Jaccard similarity
+        """
+        matches = self.matches(details)
+        return matches[0] if matches else None
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+
+duplicate_index = DuplicateIndex()
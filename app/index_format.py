@@ -0,0 +1,321 @@
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.data_structs.data_structs import IndexDict
+from llama_index.core.schema import BaseNode
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.index_store import SimpleIndexStore
+from llama_index.core.storage.kvstore.simple_kvstore import SimpleKVStore
+from llama_index.core.vector_stores import SimpleVectorStore
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+import logging
+import mmap
+import msgpack
+import numpy as np
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Files of the compact index format, written next to the BM25 index in a snapshot directory
+MANIFEST_FILE_NAME = "manifest.msgpack"
+VECTORS_FILE_NAME = "vectors.npy"
+NODES_FILE_NAME = "nodes.bin"
+
+COMPACT_FORMAT_VERSION = 1
+
+# Node records are compressed one by one so any node can still be read on its own, "zstd" or "none"
+INDEX_COMPRESSION = os.getenv("INDEX_COMPRESSION", "zstd")
+INDEX_COMPRESSION_LEVEL = int(os.getenv("INDEX_COMPRESSION_LEVEL", "3"))
+
+
+def _encode_record(node_json: dict, compression: Optional[str]) -> bytes:
+    record = msgpack.packb(node_json, use_bin_type=True)
+    if compression == "zstd":
+        record = zstandard.ZstdCompressor(level=INDEX_COMPRESSION_LEVEL).compress(record)
+    return record
+
+
+def _decode_record(record: bytes, compression: Optional[str]) -> dict:
+    if compression == "zstd":
+        record = zstandard.ZstdDecompressor().decompress(record)
+    return msgpack.unpackb(record, raw=False)
+
+
+class LazyNodeMapping(MutableMapping):
+    """
+    Docstore node collection reading node records from a memory mapped file on first access.
+
+    Nodes added or replaced after loading are kept decoded in memory.
+    """
+
+    def __init__(self, path: str, records: Dict[str, Tuple[int, int]], compression: Optional[str]):
+        self.compression = compression
+        self._records = dict(records)
+        self._decoded: Dict[str, dict] = {}
+        self._buffer = b""
+        # mmap rejects empty files, and keeps its own handle once created
+        if self._records:
+            with open(path, "rb") as f:
+                self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def raw_record(self, key: str) -> Optional[bytes]:
+        """Encoded record of a node that has not been replaced since loading"""
+        if key in self._decoded or key not in self._records:
+            return None
+        offset, length = self._records[key]
+        return self._buffer[offset:offset + length]
+
+    def __getitem__(self, key: str) -> dict:
+        if key not in self._decoded:
+            if key not in self._records:
+                raise KeyError(key)
+            self._decoded[key] = _decode_record(self.raw_record(key), self.compression)
+        return self._decoded[key]
+
+    def __setitem__(self, key: str, value: dict):
+        self._decoded[key] = value
+
+    def __delitem__(self, key: str):
+        if key not in self._records and key not in self._decoded:
+            raise KeyError(key)
+        self._records.pop(key, None)
+        self._decoded.pop(key, None)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._decoded or key in self._records
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._records
+        yield from (key for key in self._decoded if key not in self._records)
+
+    def __len__(self) -> int:
+        return len(self._records) + sum(1 for key in self._decoded if key not in self._records)
+
+
+class CompactVectorStore(BasePydanticVectorStore):
+    """
+    In-memory vector store keeping embeddings as one float32 matrix.
+
+    Queries score all rows, or only the rows of `query.node_ids`, by cosine
+    similarity with a single matrix product.
+    """
+
+    stores_text: bool = False
+
+    _node_ids: List[str] = PrivateAttr()
+    _ref_doc_ids: List[Optional[str]] = PrivateAttr()
+    _vectors: np.ndarray = PrivateAttr()
+    _rows: Dict[str, int] = PrivateAttr()
+    _norms: Optional[np.ndarray] = PrivateAttr(default=None)
+
+    def __init__(self, node_ids: List[str], ref_doc_ids: List[Optional[str]], vectors: np.ndarray):
+        super().__init__()
+        self._set_columns(node_ids, ref_doc_ids, vectors)
+
+    def _set_columns(self, node_ids: List[str], ref_doc_ids: List[Optional[str]], vectors: np.ndarray):
+        self._node_ids = list(node_ids)
+        self._ref_doc_ids = list(ref_doc_ids)
+        self._vectors = vectors
+        self._rows = {node_id: row for row, node_id in enumerate(self._node_ids)}
+        self._norms = None
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CompactVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def columns(self) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+        """Node ids, ref doc ids and the float32 vector matrix, in row order"""
+        return self._node_ids, self._ref_doc_ids, self._vectors
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        added = np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        self._vectors = np.vstack([self._vectors, added]) if len(self._node_ids) else added
+        for node in nodes:
+            self._rows[node.node_id] = len(self._node_ids)
+            self._node_ids.append(node.node_id)
+            self._ref_doc_ids.append(node.ref_doc_id)
+        self._norms = None
+        return [node.node_id for node in nodes]
+
+    def _keep_rows(self, keep: List[int]):
+        if len(keep) == len(self._node_ids):
+            return
+        self._set_columns(
+            [self._node_ids[row] for row in keep],
+            [self._ref_doc_ids[row] for row in keep],
+            np.asarray(self._vectors[keep], dtype=np.float32),
+        )
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self._keep_rows([row for row, ref in enumerate(self._ref_doc_ids) if ref != ref_doc_id])
+
+    def delete_nodes(self, node_ids: Optional[List[str]] = None, filters: Any = None, **delete_kwargs: Any) -> None:
+        """Delete many nodes with a single copy of the vector matrix"""
+        if filters is not None:
+            raise ValueError("CompactVectorStore does not support metadata filters, pass node_ids instead")
+        removed = set(node_ids or [])
+        self._keep_rows([row for row, node_id in enumerate(self._node_ids) if node_id not in removed])
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        if query.filters is not None:
+            raise ValueError("CompactVectorStore does not support metadata filters, pass node_ids instead")
+        if query.query_embedding is None or not self._node_ids:
+            return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+
+        if self._norms is None:
+            self._norms = np.linalg.norm(self._vectors, axis=1)
+            self._norms[self._norms == 0] = 1.0
+
+        query_vector = np.asarray(query.query_embedding, dtype=np.float32)
+        query_vector /= np.linalg.norm(query_vector) or 1.0
+
+        rows = None
+        if query.node_ids is not None:
+            # Local lookup, retrievers pass every node id of the index and private attributes resolve through pydantic
+            row_of = self._rows
+            rows = np.asarray([row_of[node_id] for node_id in query.node_ids if node_id in row_of], dtype=np.int64)
+            if not len(rows):
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            # Node ids are unique, so every row selected means the whole matrix is scored without copying it
+            if len(rows) == len(self._node_ids):
+                rows = None
+
+        if rows is None:
+            rows = np.arange(len(self._node_ids))
+            scores = (self._vectors @ query_vector) / self._norms
+        else:
+            scores = (self._vectors[rows] @ query_vector) / self._norms[rows]
+
+        k = min(query.similarity_top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return VectorStoreQueryResult(
+            similarities=[float(scores[i]) for i in best],
+            ids=[self._node_ids[rows[i]] for i in best],
+        )
+
+
+def _vector_columns(vector_store: BasePydanticVectorStore) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+    if isinstance(vector_store, CompactVectorStore):
+        return vector_store.columns()
+    if isinstance(vector_store, SimpleVectorStore):
+        data = vector_store.data
+        node_ids = list(data.embedding_dict)
+        vectors = np.asarray([data.embedding_dict[node_id] for node_id in node_ids], dtype=np.float32)
+        return node_ids, [data.text_id_to_ref_doc_id.get(node_id) for node_id in node_ids], vectors
+    raise ValueError(f"Cannot persist vector store {type(vector_store).__name__} in the compact format")
+
+
+def save_index(index: VectorStoreIndex, persist_dir: str, compression: str = INDEX_COMPRESSION):
+    """
+    Persist a local vector index in the compact format.
+
+    Vectors are written as one float32 .npy matrix and nodes as msgpack
+    records, zstd compressed when `compression` is "zstd" and zstandard is
+    installed. Records loaded from a previous snapshot are copied without
+    being decoded.
+
+    Args:
+        index: Index backed by a SimpleVectorStore or CompactVectorStore
+        persist_dir: Directory to write the index files to
+        compression: "zstd" or "none"
+    """
+    if compression == "zstd" and zstandard is None:
+        logger.warning("zstandard is not installed, writing the index uncompressed")
+        compression = "none"
+    codec = compression if compression != "none" else None
+
+    os.makedirs(persist_dir, exist_ok=True)
+    node_ids, ref_doc_ids, vectors = _vector_columns(index.vector_store)
+    np.save(os.path.join(persist_dir, VECTORS_FILE_NAME), np.asarray(vectors, dtype=np.float32))
+
+    docstore = index.docstore
+    collections = docstore._kvstore._collections_mappings
+    nodes = collections.get(docstore._node_collection, {})
+
+    records = {}
+    with open(os.path.join(persist_dir, NODES_FILE_NAME), "wb") as f:
+        offset = 0
+        for node_id in nodes:
+            record = None
+            if isinstance(nodes, LazyNodeMapping) and nodes.compression == codec:
+                record = nodes.raw_record(node_id)
+            if record is None:
+                record = _encode_record(nodes[node_id], codec)
+            f.write(record)
+            records[node_id] = (offset, len(record))
+            offset += len(record)
+
+    manifest = {
+        "format": COMPACT_FORMAT_VERSION,
+        "compression": codec,
+        "index_id": index.index_struct.index_id,
+        "node_ids": node_ids,
+        "ref_doc_ids": ref_doc_ids,
+        "records": records,
+        "node_metadata": dict(collections.get(docstore._metadata_collection, {})),
+        "ref_doc_info": dict(collections.get(docstore._ref_doc_collection, {})),
+    }
+    with open(os.path.join(persist_dir, MANIFEST_FILE_NAME), "wb") as f:
+        f.write(msgpack.packb(manifest, use_bin_type=True))
+
+
+def load_index(persist_dir: str, embed_model: BaseEmbedding) -> VectorStoreIndex:
+    """
+    Load an index written by `save_index`, or by llama-index's default JSON persistence.
+
+    Only the manifest is parsed up front. Vectors are memory mapped and node
+    records are decoded the first time they are read.
+
+    Args:
+        persist_dir: Directory the index was persisted to
+        embed_model: Embedding model used to embed queries and inserted nodes
+    """
+    manifest_path = os.path.join(persist_dir, MANIFEST_FILE_NAME)
+    if not os.path.exists(manifest_path):
+        storage_context = StorageContext.from_defaults(persist_dir=persist_dir)
+        return load_index_from_storage(storage_context, embed_model=embed_model)
+
+    with open(manifest_path, "rb") as f:
+        manifest = msgpack.unpackb(f.read(), raw=False, strict_map_key=False)
+    if manifest["format"] != COMPACT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported index format version {manifest['format']}")
+    if manifest["compression"] == "zstd" and zstandard is None:
+        raise ImportError("zstandard is required to load this index")
+
+    vectors = np.load(os.path.join(persist_dir, VECTORS_FILE_NAME), mmap_mode="r")
+    vector_store = CompactVectorStore(manifest["node_ids"], manifest["ref_doc_ids"], vectors)
+
+    # Collection names follow the docstore's namespace
+    collection_names = SimpleDocumentStore()
+    kvstore = SimpleKVStore({
+        collection_names._node_collection: LazyNodeMapping(
+            os.path.join(persist_dir, NODES_FILE_NAME),
+            {node_id: tuple(location) for node_id, location in manifest["records"].items()},
+            manifest["compression"],
+        ),
+        collection_names._metadata_collection: manifest["node_metadata"],
+        collection_names._ref_doc_collection: manifest["ref_doc_info"],
+    })
+    docstore = SimpleDocumentStore(simple_kvstore=kvstore)
+
+    index_struct = IndexDict(index_id=manifest["index_id"])
+    index_struct.nodes_dict = {node_id: node_id for node_id in manifest["node_ids"]}
+    index_store = SimpleIndexStore()
+    index_store.add_index_struct(index_struct)
+
+    storage_context = StorageContext.from_defaults(docstore=docstore, vector_store=vector_store, index_store=index_store)
+    return VectorStoreIndex(index_struct=index_struct, storage_context=storage_context, embed_model=embed_model)
@@ -0,0 +1,140 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+import fcntl
+import logging
+import os
+import shutil
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Directory the local opportunity index is persisted to
+INDEX_STORE_DIR = "./index_store"
+
+# Number of published snapshots kept, and how long a snapshot survives garbage collection after it stopped being current
+INDEX_SNAPSHOTS_KEPT = int(os.getenv("INDEX_SNAPSHOTS_KEPT", "3"))
+INDEX_SNAPSHOT_GRACE_SECONDS = float(os.getenv("INDEX_SNAPSHOT_GRACE_SECONDS", "300"))
+
+# File that marks a directory as a persisted llama-index index
+INDEX_MARKER_FILE = "docstore.json"
+
+# Written into a snapshot when a newer one replaces it, its mtime is when the snapshot stopped being current
+SUPERSEDED_MARKER_FILE = ".superseded"
+
+
+class IndexBuildInProgress(Exception):
+    pass
+
+
+class IndexSnapshotStore:
+    """
+    Versioned index snapshots published by an atomic pointer swap.
+
+    Every build writes into a fresh `snapshots/<version>` directory. Only when
+    it is complete is the `current` symlink replaced (an atomic rename), so
+    readers in any worker always resolve a fully written index. Builds hold an
+    exclusive file lock, and old snapshots are garbage collected after publishing.
+    """
+
+    def __init__(self, root: str = INDEX_STORE_DIR, keep: int = INDEX_SNAPSHOTS_KEPT, grace_seconds: float = INDEX_SNAPSHOT_GRACE_SECONDS):
+        self.root = root
+        self.keep = keep
+        self.grace_seconds = grace_seconds
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.pointer = os.path.join(root, "current")
+        self.lock_path = os.path.join(root, ".build.lock")
+
+    def current_dir(self) -> Optional[str]:
+        """
+        Resolve the directory of the published index, None if no index has been built.
+
+        Readers should resolve once and load everything from the returned path.
+        """
+        if os.path.islink(self.pointer):
+            return os.path.realpath(self.pointer)
+        # Index persisted before snapshots were introduced
+        if os.path.exists(os.path.join(self.root, INDEX_MARKER_FILE)):
+            return self.root
+        return None
+
+    @contextmanager
+    def _lock(self, blocking: bool) -> Iterator[None]:
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                raise IndexBuildInProgress("An index build is already in progress")
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @contextmanager
+    def build(self, blocking: bool = True) -> Iterator[str]:
+        """
+        Hold the build lock and yield a new snapshot directory to persist into.
+
+        The snapshot is published when the block exits normally and discarded
+        when it raises.
+
+        Args:
+            blocking: Wait for a running build to finish instead of raising IndexBuildInProgress
+        """
+        with self._lock(blocking):
+            # Sortable by build time, newest last
+            version = f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}"
+            snapshot_dir = os.path.join(self.snapshots_dir, version)
+            os.makedirs(snapshot_dir)
+
+            try:
+                yield snapshot_dir
+            except BaseException:
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+                raise
+
+            self._publish(version)
+            self.collect_garbage()
+
+    def _publish(self, version: str):
+        previous = os.path.realpath(self.pointer) if os.path.islink(self.pointer) else None
+        temporary_pointer = f"{self.pointer}.{uuid.uuid4().hex}"
+        os.symlink(os.path.join("snapshots", version), temporary_pointer)
+        os.replace(temporary_pointer, self.pointer)
+        logger.info("Published index snapshot %s", version)
+
+        # Readers that resolved the previous snapshot may still be loading its shards, its grace period starts now
+        if previous is not None and os.path.isdir(previous):
+            with open(os.path.join(previous, SUPERSEDED_MARKER_FILE), "w"):
+                pass
+
+    @staticmethod
+    def _superseded_at(path: str) -> float:
+        """When a snapshot stopped being current, its build time if it was never published"""
+        try:
+            return os.path.getmtime(os.path.join(path, SUPERSEDED_MARKER_FILE))
+        except OSError:
+            return os.path.getmtime(path)
+
+    def collect_garbage(self):
+        """Delete snapshots beyond the newest `keep`, sparing the current one and any superseded within the grace period"""
+        if not os.path.isdir(self.snapshots_dir):
+            return
+
+        current = self.current_dir()
+        versions = sorted(os.listdir(self.snapshots_dir), reverse=True)
+        now = time.time()
+
+        for version in versions[self.keep:]:
+            path = os.path.join(self.snapshots_dir, version)
+            if current is not None and os.path.realpath(path) == current:
+                continue
+            if now - self._superseded_at(path) < self.grace_seconds:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info("Removed index snapshot %s", version)
+
+
+snapshot_store = IndexSnapshotStore()
@@ -0,0 +1,356 @@
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from llama_index.core.base.embeddings.base import BaseEmbedding
+import numpy as np
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Embeddings of staff profiles and opportunities are cached here between refreshes
+MATCH_STORE_DIR = os.path.join("index_store", "matching")
+
+# Matches kept per person and per opportunity
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "10"))
+
+# Rows scored per matrix product, bounds memory to MATCH_CHUNK_SIZE x (other side) floats
+MATCH_CHUNK_SIZE = int(os.getenv("MATCH_CHUNK_SIZE", "1024"))
+
+# Scores this close are equal, the same pair scored in another matrix product can differ in the last bits
+MATCH_SCORE_TOLERANCE = 1e-6
+
+# Seconds between a staff or opportunity change and the match update, a burst of changes shares one update
+MATCH_UPDATE_DELAY = float(os.getenv("MATCH_UPDATE_DELAY", "5"))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so dot products are cosine similarities"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k_per_row(
+    query_vectors: np.ndarray,
+    target_vectors: np.ndarray,
+    k: int,
+    chunk_size: int = MATCH_CHUNK_SIZE,
+) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Score every query row against every target row and keep the best k targets per query.
+
+    Scores are computed one chunk of query rows at a time as a single matrix product.
+
+    Args:
+        query_vectors: Unit length vectors, shape (n, dim)
+        target_vectors: Unit length vectors, shape (m, dim)
+        k: Number of targets kept per query row
+        chunk_size: Query rows scored per matrix product
+
+    Returns:
+        Iterator of (query row, target rows, scores) with targets ordered best first
+    """
+    if len(query_vectors) == 0 or len(target_vectors) == 0:
+        return
+
+    k = min(k, len(target_vectors))
+    for start in range(0, len(query_vectors), chunk_size):
+        scores = query_vectors[start:start + chunk_size] @ target_vectors.T
+
+        if k < scores.shape[1]:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+        for offset in range(len(top)):
+            yield start + offset, top[offset], top_scores[offset]
+
+
+def match_pairs(
+    staff_ids: np.ndarray,
+    staff_vectors: np.ndarray,
+    opportunity_ids: np.ndarray,
+    opportunity_vectors: np.ndarray,
+    k: int = MATCH_TOP_K,
+    chunk_size: int = MATCH_CHUNK_SIZE,
+) -> Dict[Tuple[int, int], float]:
+    """
+    Keep the top k opportunities per person and the top k people per opportunity.
+
+    Returns:
+        Scores keyed by (user_id, opportunity_id) for the union of both top k sets
+    """
+    pairs: Dict[Tuple[int, int], float] = {}
+
+    for row, targets, scores in top_k_per_row(staff_vectors, opportunity_vectors, k, chunk_size):
+        for target, score in zip(targets, scores):
+            pairs[(int(staff_ids[row]), int(opportunity_ids[target]))] = float(score)
+
+    for row, targets, scores in top_k_per_row(opportunity_vectors, staff_vectors, k, chunk_size):
+        for target, score in zip(targets, scores):
+            pairs[(int(staff_ids[target]), int(opportunity_ids[row]))] = float(score)
+
+    return pairs
+
+
+def kth_best(scores: np.ndarray, k: int) -> np.ndarray:
+    """k-th best score of each row, -inf when a row has k columns or fewer so all of them are kept"""
+    if scores.shape[1] <= k:
+        return np.full(scores.shape[0], -np.inf, dtype=np.float32)
+    return -np.partition(-scores, k - 1, axis=1)[:, k - 1]
+
+
+def _stored_kth(stored: Dict[Tuple[int, int], float], side: int, k: int, others: int) -> Dict[int, float]:
+    """
+    k-th best stored score per id on one side of the pairs.
+
+    Ids with fewer stored pairs than they should have are left out, their
+    threshold is unknown and they are rescored.
+    """
+    scores: Dict[int, List[float]] = {}
+    for key, score in stored.items():
+        scores.setdefault(key[side], []).append(score)
+
+    needed = min(k, others)
+    thresholds = {}
+    for entity_id, entity_scores in scores.items():
+        if len(entity_scores) < needed:
+            continue
+        thresholds[entity_id] = sorted(entity_scores, reverse=True)[k - 1] if others > k else -np.inf
+    return thresholds
+
+
+def _affected(
+    ids: np.ndarray,
+    vectors: np.ndarray,
+    thresholds: Dict[int, float],
+    forced: Set[int],
+    changed_vectors: np.ndarray,
+    chunk_size: int,
+) -> np.ndarray:
+    """Rows that must be rescored: forced ones, unknown thresholds and rows a changed counterpart now beats"""
+    affected = np.fromiter(
+        (entity_id in forced or entity_id not in thresholds for entity_id in ids.tolist()),
+        dtype=bool, count=len(ids),
+    )
+    if len(changed_vectors):
+        limits = np.fromiter((thresholds.get(entity_id, np.inf) for entity_id in ids.tolist()), dtype=np.float64, count=len(ids))
+        for start in range(0, len(ids), chunk_size):
+            best = (vectors[start:start + chunk_size] @ changed_vectors.T).max(axis=1)
+            affected[start:start + chunk_size] |= best > limits[start:start + chunk_size]
+    return np.flatnonzero(affected)
+
+
+def update_pairs(
+    staff_ids: np.ndarray,
+    staff_vectors: np.ndarray,
+    opportunity_ids: np.ndarray,
+    opportunity_vectors: np.ndarray,
+    stored: Dict[Tuple[int, int], float],
+    changed_staff: Set[int],
+    changed_opportunities: Set[int],
+    k: int = MATCH_TOP_K,
+    chunk_size: int = MATCH_CHUNK_SIZE,
+) -> Tuple[Dict[Tuple[int, int], float], Set[int], Set[int]]:
+    """
+    Recompute the matches of the staff and opportunities a change can affect.
+
+    A pair is kept when its score reaches the k-th best score of its person or
+    of its opportunity, the pairs `match_pairs` keeps. Only rows of affected
+    staff and columns of affected opportunities are rescored: changed ones,
+    those with a stored match to a changed counterpart, and those a changed
+    counterpart now scores above their stored k-th best match. Everyone else
+    keeps the k-th best score read from `stored`.
+
+    Args:
+        stored: Stored scores keyed by (user_id, opportunity_id)
+        changed_staff: Staff ids that are new, re-embedded or removed
+        changed_opportunities: Opportunity ids that are new, re-embedded or removed
+
+    Returns:
+        (scores keyed by (user_id, opportunity_id) of every pair with an affected
+        person or opportunity, affected staff ids, affected opportunity ids)
+    """
+    staff_kth = _stored_kth(stored, 0, k, len(opportunity_ids))
+    opportunity_kth = _stored_kth(stored, 1, k, len(staff_ids))
+    touched_staff = {user_id for user_id, opportunity_id in stored if opportunity_id in changed_opportunities}
+    touched_opportunities = {opportunity_id for user_id, opportunity_id in stored if user_id in changed_staff}
+
+    changed_opportunity_rows = np.isin(opportunity_ids, list(changed_opportunities))
+    changed_staff_rows = np.isin(staff_ids, list(changed_staff))
+    rows = _affected(staff_ids, staff_vectors, staff_kth, changed_staff | touched_staff,
+                     opportunity_vectors[changed_opportunity_rows], chunk_size)
+    columns = _affected(opportunity_ids, opportunity_vectors, opportunity_kth, changed_opportunities | touched_opportunities,
+                        staff_vectors[changed_staff_rows], chunk_size)
+
+    affected_staff = changed_staff | {int(staff_ids[row]) for row in rows}
+    affected_opportunities = changed_opportunities | {int(opportunity_ids[column]) for column in columns}
+    pairs: Dict[Tuple[int, int], float] = {}
+    if len(staff_ids) == 0 or len(opportunity_ids) == 0:
+        return pairs, affected_staff, affected_opportunities
+
+    staff_limits = np.fromiter((staff_kth.get(user_id, -np.inf) for user_id in staff_ids.tolist()), dtype=np.float32, count=len(staff_ids))
+    opportunity_limits = np.fromiter((opportunity_kth.get(opportunity_id, -np.inf) for opportunity_id in opportunity_ids.tolist()),
+                                     dtype=np.float32, count=len(opportunity_ids))
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        staff_limits[chunk] = kth_best(staff_vectors[chunk] @ opportunity_vectors.T, k)
+    for start in range(0, len(columns), chunk_size):
+        chunk = columns[start:start + chunk_size]
+        opportunity_limits[chunk] = kth_best(opportunity_vectors[chunk] @ staff_vectors.T, k)
+
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        scores = staff_vectors[chunk] @ opportunity_vectors.T
+        keep = scores >= np.minimum(staff_limits[chunk, None], opportunity_limits[None, :]) - MATCH_SCORE_TOLERANCE
+        for row, column in zip(*np.nonzero(keep)):
+            pairs[(int(staff_ids[chunk[row]]), int(opportunity_ids[column]))] = float(scores[row, column])
+    for start in range(0, len(columns), chunk_size):
+        chunk = columns[start:start + chunk_size]
+        scores = opportunity_vectors[chunk] @ staff_vectors.T
+        keep = scores >= np.minimum(opportunity_limits[chunk, None], staff_limits[None, :]) - MATCH_SCORE_TOLERANCE
+        for row, column in zip(*np.nonzero(keep)):
+            pairs[(int(staff_ids[column]), int(opportunity_ids[chunk[row]]))] = float(scores[row, column])
+
+    return pairs, affected_staff, affected_opportunities
+
+
+class EmbeddingCache:
+    """
+    Embeddings keyed by entity id, persisted as a float32 .npz file.
+
+    An entity is only re-embedded when the hash of its text changes, so a
+    refresh after a few profile or opportunity edits costs a few embedding calls.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.vectors: Dict[int, Tuple[str, np.ndarray]] = {}
+
+        if os.path.exists(path):
+            data = np.load(path)
+            for entity_id, text_hash, vector in zip(data["ids"], data["hashes"], data["vectors"]):
+                self.vectors[int(entity_id)] = (str(text_hash), vector)
+
+    @staticmethod
+    def _hashes(texts: Dict[int, str]) -> Dict[int, str]:
+        return {entity_id: hashlib.sha1(text.encode("utf-8")).hexdigest() for entity_id, text in texts.items()}
+
+    def changed(self, texts: Dict[int, str]) -> Set[int]:
+        """Ids that are new, whose text changed, or that are cached but missing from `texts`"""
+        hashes = self._hashes(texts)
+        changed = {entity_id for entity_id, text_hash in hashes.items()
+                   if entity_id not in self.vectors or self.vectors[entity_id][0] != text_hash}
+        return changed | (self.vectors.keys() - hashes.keys())
+
+    def embed(self, texts: Dict[int, str], embed_model: BaseEmbedding) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Return the ids and unit length vectors of the given texts, embedding only new or changed ones.
+
+        Entities missing from `texts` are dropped from the cache.
+
+        Returns:
+            (ids, vectors, number of texts embedded)
+        """
+        hashes = self._hashes(texts)
+        stale = [entity_id for entity_id, text_hash in hashes.items()
+                 if entity_id not in self.vectors or self.vectors[entity_id][0] != text_hash]
+
+        if stale:
+            embeddings = embed_model.get_text_embedding_batch([texts[entity_id] for entity_id in stale])
+            fresh = normalize(np.asarray(embeddings, dtype=np.float32))
+            for entity_id, vector in zip(stale, fresh):
+                self.vectors[entity_id] = (hashes[entity_id], vector)
+
+        self.vectors = {entity_id: self.vectors[entity_id] for entity_id in hashes}
+
+        ids = np.fromiter(self.vectors.keys(), dtype=np.int64, count=len(self.vectors))
+        if not self.vectors:
+            return ids, np.zeros((0, 0), dtype=np.float32), len(stale)
+        vectors = np.stack([vector for _, vector in self.vectors.values()])
+        return ids, vectors, len(stale)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        ids = list(self.vectors.keys())
+        np.savez(
+            self.path,
+            ids=np.asarray(ids, dtype=np.int64),
+            hashes=np.asarray([self.vectors[entity_id][0] for entity_id in ids]),
+            vectors=np.stack([self.vectors[entity_id][1] for entity_id in ids]) if ids else np.zeros((0, 0), dtype=np.float32),
+        )
+
+
+class MatchUpdater:
+    """
+    Background thread keeping the stored matches current.
+
+    `request` only records the change, so it is cheap to call after every
+    registration, opportunity save or archival. The thread runs the update
+    `delay` seconds after the first request it sees, so a burst of changes
+    shares one incremental update.
+    """
+
+    def __init__(self, delay: float = MATCH_UPDATE_DELAY):
+        self.delay = delay
+        self._update: Optional[Callable[[Set[int]], object]] = None
+        self._pending = False
+        self._staff: Set[int] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def request(self, staff_ids: Iterable[int] = ()):
+        """Schedule an update, `staff_ids` are rescored even when their profile is unchanged"""
+        with self._lock:
+            self._pending = True
+            self._staff.update(staff_ids)
+        self._wake.set()
+
+    def run_pending(self) -> bool:
+        """Run the update if one was requested, returns whether it ran"""
+        with self._lock:
+            if self._update is None or not self._pending:
+                return False
+            staff, self._staff, self._pending = self._staff, set(), False
+        try:
+            self._update(staff)
+            return True
+        except Exception:
+            logger.exception("Could not update matches, retrying on the next change")
+            with self._lock:
+                self._pending = True
+                self._staff |= staff
+            return False
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopping.wait(self.delay):
+                return
+            self.run_pending()
+
+    def start(self, update: Callable[[Set[int]], object]):
+        if self._thread is not None:
+            return
+        self._update = update
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="match-update", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+
+match_updater = MatchUpdater()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, func, Enum
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, Float, func, Enum
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -12,6 +12,7 @@ class User(Base):
     password = Column(String(255), nullable=False)
     department_id = Column(Integer, nullable=False)
     designation_id = Column(Integer, nullable=False)
+    skills = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
 class Department(Base):
@@ -49,6 +50,46 @@ class Opportunity(Base):
     department_id = Column(Integer, ForeignKey("department.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Set when the opportunity was flagged as a near-duplicate of an earlier one
+    duplicate_of = Column(Integer, ForeignKey("opportunity.id"), nullable=True)
+    # Set when the opportunity was closed, it is archived by the next retention run
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ArchivedOpportunity(Base):
+    __tablename__ = "opportunity_archive"
+    # Keeps the id the opportunity had in the opportunity table
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    details = Column(Text, nullable=False)
+    department_id = Column(Integer, index=True)
+    user_id = Column(Integer)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    closed_at = Column(DateTime(timezone=True), nullable=True)
+    duplicate_of = Column(Integer, nullable=True)
+    archive_reason = Column(String(20), nullable=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class OpportunityMatch(Base):
+    __tablename__ = "opportunity_match"
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    opportunity_id = Column(Integer, ForeignKey("opportunity.id"), primary_key=True, index=True)
+    score = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class LlmUsage(Base):
+    __tablename__ = "llm_usage"
+    id = Column(Integer, primary_key=True)
+    user_key = Column(String(100), index=True)
+    endpoint = Column(String(100))
+    operation = Column(String(50), nullable=False)
+    model = Column(String(100))
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, index=True)
 
 
 class Option(Base):
@@ -66,3 +107,4 @@ class Query(Base):
 
 def __repr__(self):
     return f"<User {self.email}>"
+
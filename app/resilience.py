@@ -0,0 +1,312 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, Optional
+import httpx
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Deadline of one model call in seconds, covering every attempt and the waits between them
+LLM_CALL_DEADLINE = float(os.getenv("LLM_CALL_DEADLINE", "90"))
+
+# Attempts after the first one for throttled, failed or timed out calls, with full jitter exponential backoff
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# A duplicate request is sent when the first has not answered after the p95 latency of its operation
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LATENCY_WINDOW = 200
+
+# Consecutive failed calls that open the circuit, and seconds it stays open before one probe call is let through
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# Model calls whose latency is tracked for hedging, keyed by API path
+HEDGED_OPERATIONS = {"/v1/chat/completions": "chat", "/v1/embeddings": "embeddings"}
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+    def __init__(self, retry_after: float, request: Optional[httpx.Request] = None):
+        super().__init__(f"Model provider unavailable, retry in {retry_after:.0f}s", request=request)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive failure circuit breaker.
+
+    Closed, calls go through. After `failure_threshold` consecutive failed
+    calls it opens and calls fail fast. After `reset_seconds` it is half open
+    and lets one probe call through, which closes it on success or opens it
+    again on failure.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.reset_seconds - (self.clock() - self.opened_at))
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and self.retry_after() == 0:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Model provider recovered, closing circuit")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Model provider failing, opening circuit for %.0fs", self.reset_seconds)
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = self.clock()
+            self._probing = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "retry_after": round(self.retry_after(), 1),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+            }
+
+
+class LatencyTracker:
+    """Recent successful call latencies per operation, for the hedging threshold"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._latencies: Dict[str, deque] = {}
+        self.window = window
+        self._lock = threading.Lock()
+
+    def record(self, operation: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(operation, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, operation: str, percentile: float, min_samples: int) -> Optional[float]:
+        """Latency percentile of the operation, None until it has `min_samples` samples"""
+        with self._lock:
+            latencies = sorted(self._latencies.get(operation, ()))
+        if not latencies or len(latencies) < min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percentile / 100))]
+
+
+class ResilientTransport(httpx.BaseTransport):
+    """
+    httpx transport adding deadlines, retries, hedging and a circuit breaker to model calls.
+
+    Wraps the transport of the shared Mistral HTTP client, so every chat,
+    llama-index chat engine and embedding call of AIService goes through it.
+    The breaker counts a call as failed when its last attempt was throttled,
+    failed with a 5xx or raised a transport error.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.BaseTransport,
+        deadline: float = LLM_CALL_DEADLINE,
+        max_retries: int = LLM_MAX_RETRIES,
+        base_delay: float = LLM_RETRY_BASE_DELAY,
+        max_delay: float = LLM_RETRY_MAX_DELAY,
+        hedge: bool = LLM_HEDGE_ENABLED,
+        hedge_percentile: float = LLM_HEDGE_PERCENTILE,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+        hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+        breaker: Optional[CircuitBreaker] = None,
+        max_workers: int = 16,
+    ):
+        self.transport = transport
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.counters = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "deadline_exceeded": 0}
+        self._counters_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge") if hedge else None
+
+    def _count(self, counter: str):
+        with self._counters_lock:
+            self.counters[counter] += 1
+
+    def _attempt_request(self, request: httpx.Request, remaining: float) -> httpx.Request:
+        """Copy of the request whose timeouts end by the call deadline"""
+        timeout = dict(request.extensions.get("timeout") or {})
+        for name in ("connect", "read", "write", "pool"):
+            timeout[name] = min(timeout.get(name) or remaining, remaining)
+        return httpx.Request(
+            request.method, request.url, headers=request.headers, content=request.content,
+            extensions={**request.extensions, "timeout": timeout},
+        )
+
+    def _send_once(self, request: httpx.Request, operation: Optional[str]) -> httpx.Response:
+        started = time.monotonic()
+        response = self.transport.handle_request(request)
+        if operation is not None and response.status_code < 400:
+            self.latency.record(operation, time.monotonic() - started)
+        return response
+
+    def _hedge_delay(self, operation: Optional[str]) -> Optional[float]:
+        if self._executor is None or operation is None:
+            return None
+        percentile = self.latency.percentile(operation, self.hedge_percentile, self.hedge_min_samples)
+        return max(self.hedge_min_delay, percentile) if percentile is not None else None
+
+    def _send_hedged(self, request: httpx.Request, operation: Optional[str], remaining: float) -> httpx.Response:
+        """Send the request, and a duplicate when it is slower than usual, returning the first good answer"""
+        delay = self._hedge_delay(operation)
+        if delay is None or delay >= remaining:
+            return self._send_once(request, operation)
+
+        primary = self._executor.submit(self._send_once, request, operation)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedge = self._executor.submit(self._send_once, request, operation)
+        outcome = None
+        for future in as_completed([primary, hedge]):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = e
+            if isinstance(outcome, httpx.Response):
+                outcome.close()
+            outcome = result
+            if self._is_good(result):
+                if future is hedge:
+                    self._count("hedge_wins")
+                # The slower request cannot be cancelled, its response is closed once it arrives
+                other = primary if future is hedge else hedge
+                other.add_done_callback(self._discard)
+                break
+
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    @staticmethod
+    def _is_good(outcome) -> bool:
+        return isinstance(outcome, httpx.Response) and outcome.status_code not in LLM_RETRY_STATUSES
+
+    @staticmethod
+    def _discard(future):
+        if future.exception() is None:
+            future.result().close()
+
+    def _backoff(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.retry_after(), request=request)
+
+        self._count("calls")
+        operation = HEDGED_OPERATIONS.get(request.url.path)
+        request.read()
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            response, error = None, None
+            try:
+                response = self._send_hedged(self._attempt_request(request, remaining), operation, remaining)
+            except httpx.TransportError as e:
+                error = e
+            except Exception:
+                self.breaker.record_failure()
+                raise
+
+            if error is None and response.status_code not in LLM_RETRY_STATUSES:
+                self.breaker.record_success()
+                return response
+
+            delay = self._backoff(attempt, response)
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                self._count("failures")
+                if error is not None and time.monotonic() >= deadline:
+                    self._count("deadline_exceeded")
+                self.breaker.record_failure()
+                if error is not None:
+                    raise error
+                return response
+
+            logger.info("Model call to %s failed (%s), retrying in %.2fs", request.url.path, error or response.status_code, delay)
+            if response is not None:
+                response.close()
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        with self._counters_lock:
+            counters = dict(self.counters)
+        return {
+            "breaker": self.breaker.stats(),
+            **counters,
+            "p95_seconds": {
+                operation: self.latency.percentile(operation, 95, 1)
+                for operation in HEDGED_OPERATIONS.values()
+            },
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.transport.close()
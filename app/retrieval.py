@@ -0,0 +1,493 @@
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from dateutil import parser as date_parser
+from llama_index.core import Document, Settings, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle
+import contextvars
+import json
+import logging
+import math
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Persisted next to the llama-index files in the index store directory
+BM25_FILE_NAME = "bm25_index.json"
+
+# Reciprocal rank fusion damping constant, see Cormack et al. (2009)
+RRF_K = 60
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+# Opportunity types offered in the onboarding queries, keyed by the phrases that identify them
+OPPORTUNITY_TYPES = {
+    "BD Work": ("bd work", "business development"),
+    "Client engagement": ("client engagement",),
+    "Internal Asset Building": ("internal asset",),
+}
+
+# Opportunity metadata stored on each indexed node, hidden from the embedding text
+OPPORTUNITY_METADATA_KEYS = ["opportunity_id", "department_id", "user_id", "created_at", "start_date", "opportunity_type"]
+
+_NUMERIC_DATE_PATTERN = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{4})\b")
+_WRITTEN_DATE_PATTERN = re.compile(
+    r"\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b",
+    re.IGNORECASE,
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into keyword tokens, keeping tech names like c++, c#, .net"""
+    return [token.rstrip(".") for token in _TOKEN_PATTERN.findall(text.lower())]
+
+
+class BM25Index:
+    """
+    In-process inverted index scoring documents with Okapi BM25.
+
+    Used next to the vector index so exact tech stack keywords such as
+    "SAP" or "Salesforce" rank the opportunities that mention them.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def add(self, doc_id: str, text: str):
+        """Index a document, replacing any previous version with the same id"""
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+
+        tokens = tokenize(text)
+        for term, frequency in Counter(tokens).items():
+            self.postings[term][doc_id] = frequency
+
+        self.doc_lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, doc_id: str):
+        """Remove a document from the index if present"""
+        if doc_id not in self.doc_lengths:
+            return
+
+        for term in list(self.postings):
+            docs = self.postings[term]
+            if docs.pop(doc_id, None) is not None and not docs:
+                del self.postings[term]
+
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def remove_many(self, doc_ids: Iterable[str]):
+        """Remove several documents with one pass over the postings"""
+        removed = {doc_id for doc_id in doc_ids if doc_id in self.doc_lengths}
+        if not removed:
+            return
+
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for doc_id in removed.intersection(docs):
+                del docs[doc_id]
+            if not docs:
+                del self.postings[term]
+
+        for doc_id in removed:
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def search(self, query: str, top_k: int = 5, candidates: Optional[set] = None) -> List[tuple[str, float]]:
+        """
+        Return up to top_k (doc_id, score) pairs ordered by descending BM25 score
+
+        Args:
+            query: Free text query
+            top_k: Maximum number of hits
+            candidates: Optional set of doc ids the search is restricted to
+        """
+        doc_count = len(self.doc_lengths)
+        if doc_count == 0:
+            return []
+
+        avg_length = self.total_length / doc_count
+        scores: Dict[str, float] = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+
+            idf = math.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, frequency in docs.items():
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    def persist(self, persist_dir: str):
+        """Write the index to the given directory"""
+        with open(os.path.join(persist_dir, BM25_FILE_NAME), "w") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "postings": self.postings,
+                "doc_lengths": self.doc_lengths,
+            }, f)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "BM25Index":
+        """Load an index written by `persist`, or an empty index if none exists"""
+        path = os.path.join(persist_dir, BM25_FILE_NAME)
+        if not os.path.exists(path):
+            return cls()
+
+        with open(path) as f:
+            data = json.load(f)
+
+        index = cls(k1=data["k1"], b=data["b"])
+        index.postings.update(data["postings"])
+        index.doc_lengths = data["doc_lengths"]
+        index.total_length = sum(index.doc_lengths.values())
+        return index
+
+
+def parse_start_date(details: str) -> Optional[date]:
+    """Parse the estimated start date from an opportunity summary, None if it has none"""
+    position = details.lower().find("start date")
+    text = details[position:] if position >= 0 else details
+
+    match = _NUMERIC_DATE_PATTERN.search(text)
+    if match:
+        month, day, year = map(int, match.groups())
+        try:
+            return date(year, month, day)
+        except ValueError:
+            pass
+
+    match = _WRITTEN_DATE_PATTERN.search(text)
+    if match:
+        try:
+            return date_parser.parse(match.group(0)).date()
+        except (ValueError, OverflowError):
+            pass
+
+    return None
+
+
+def parse_opportunity_type(text: str) -> Optional[str]:
+    """Return the first opportunity type mentioned in the text, None if no type is mentioned"""
+    lower = text.lower()
+    found = [
+        (lower.find(phrase), name)
+        for name, phrases in OPPORTUNITY_TYPES.items()
+        for phrase in phrases
+        if phrase in lower
+    ]
+    return min(found)[1] if found else None
+
+
+def build_opportunity_document(opportunity) -> Document:
+    """
+    Build the index document for an opportunity row with its metadata attached.
+
+    Metadata is excluded from the embedded text so it only drives filtering.
+    """
+    start_date = parse_start_date(opportunity.details)
+    created_at = opportunity.created_at
+
+    return Document(
+        text=opportunity.details,
+        id_=f"opportunity-{opportunity.id}",
+        metadata={
+            "opportunity_id": opportunity.id,
+            "department_id": opportunity.department_id,
+            "user_id": opportunity.user_id,
+            "created_at": created_at.isoformat() if created_at else None,
+            "start_date": start_date.isoformat() if start_date else None,
+            "opportunity_type": parse_opportunity_type(opportunity.details),
+        },
+        excluded_embed_metadata_keys=OPPORTUNITY_METADATA_KEYS,
+        excluded_llm_metadata_keys=["opportunity_id", "department_id", "user_id", "created_at"],
+    )
+
+
+@dataclass
+class OpportunityFilter:
+    """
+    Pre-filter applied to opportunity metadata before similarity scoring.
+
+    Opportunities missing a field (no department, unparsed start date or type)
+    are kept, so a filter only ever excludes opportunities known not to match.
+    """
+    department_id: Optional[int] = None
+    opportunity_type: Optional[str] = None
+    min_start_date: Optional[date] = None
+
+    @classmethod
+    def from_conversation(cls, department_id: Optional[int], texts: Iterable[str]) -> "OpportunityFilter":
+        """Build the filter from the user's department and the opportunity type they asked for"""
+        return cls(
+            department_id=department_id,
+            opportunity_type=parse_opportunity_type(" ".join(texts)),
+            min_start_date=date.today(),
+        )
+
+    def is_empty(self) -> bool:
+        return self.department_id is None and self.opportunity_type is None and self.min_start_date is None
+
+    def matches(self, metadata: dict) -> bool:
+        department_id = metadata.get("department_id")
+        if self.department_id is not None and department_id is not None and department_id != self.department_id:
+            return False
+
+        opportunity_type = metadata.get("opportunity_type")
+        if self.opportunity_type is not None and opportunity_type is not None and opportunity_type != self.opportunity_type:
+            return False
+
+        start_date = metadata.get("start_date")
+        if self.min_start_date is not None and start_date is not None and start_date < self.min_start_date.isoformat():
+            return False
+
+        return True
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[tuple[str, float]]:
+    """
+    Fuse several ranked id lists into one ranking.
+
+    Args:
+        rankings: Lists of ids, each ordered best first
+        k: Damping constant, higher values flatten the weight of top ranks
+
+    Returns:
+        (id, fused score) pairs ordered by descending score
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever fusing vector similarity hits with BM25 keyword hits via reciprocal rank fusion.
+
+    When an OpportunityFilter is given, the candidate nodes are narrowed on their
+    metadata first and both searches only score those candidates.
+    """
+
+    def __init__(
+        self,
+        index: VectorStoreIndex,
+        bm25_index: BM25Index,
+        top_k: int = 5,
+        keyword_top_k: Optional[int] = None,
+        opportunity_filter: Optional[OpportunityFilter] = None,
+    ):
+        self.index = index
+        self.bm25_index = bm25_index
+        self.top_k = top_k
+        self.keyword_top_k = keyword_top_k or top_k
+        self.opportunity_filter = opportunity_filter
+        super().__init__()
+
+    def _candidate_ids(self) -> Optional[List[str]]:
+        """Node ids passing the metadata filter, None when every node is a candidate"""
+        if self.opportunity_filter is None or self.opportunity_filter.is_empty():
+            return None
+        # Nodes share their opportunity document's metadata, so filter on documents without reading every node
+        ref_doc_info = self.index.docstore.get_all_ref_doc_info() or {}
+        return [
+            node_id for info in ref_doc_info.values()
+            if self.opportunity_filter.matches(info.metadata)
+            for node_id in info.node_ids
+        ]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        candidate_ids = self._candidate_ids()
+        if candidate_ids is not None and not candidate_ids:
+            return []
+
+        if candidate_ids is None:
+            vector_retriever = self.index.as_retriever(similarity_top_k=self.top_k)
+        else:
+            vector_retriever = VectorIndexRetriever(self.index, similarity_top_k=self.top_k, node_ids=candidate_ids)
+        vector_hits = vector_retriever.retrieve(query_bundle)
+        keyword_hits = self.bm25_index.search(
+            query_bundle.query_str,
+            top_k=self.keyword_top_k,
+            candidates=set(candidate_ids) if candidate_ids is not None else None,
+        )
+
+        nodes = {hit.node.node_id: hit.node for hit in vector_hits}
+        fused = reciprocal_rank_fusion([
+            [hit.node.node_id for hit in vector_hits],
+            [doc_id for doc_id, _ in keyword_hits],
+        ])
+
+        results = []
+        for node_id, score in fused[:self.top_k]:
+            node = nodes.get(node_id) or self.index.docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                results.append(NodeWithScore(node=node, score=score))
+        return results
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Retriever querying several index shards in parallel and merging their hits
+    with reciprocal rank fusion.
+
+    The query is embedded once and the embedding shared by every shard.
+    """
+
+    def __init__(self, retrievers: List[BaseRetriever], embed_model: Optional[BaseEmbedding] = None, top_k: int = 5):
+        self.retrievers = retrievers
+        self.embed_model = embed_model
+        self.top_k = top_k
+        super().__init__()
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        if len(self.retrievers) == 1:
+            return self.retrievers[0].retrieve(query_bundle)[:self.top_k]
+        if not self.retrievers:
+            return []
+
+        if query_bundle.embedding is None and self.embed_model is not None:
+            query_bundle.embedding = self.embed_model.get_agg_embedding_from_queries(query_bundle.embedding_strs)
+
+        with ThreadPoolExecutor(max_workers=len(self.retrievers)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, retriever.retrieve, query_bundle)
+                for retriever in self.retrievers
+            ]
+            shard_hits = [future.result() for future in futures]
+
+        nodes = {hit.node.node_id: hit.node for hits in shard_hits for hit in hits}
+        fused = reciprocal_rank_fusion([[hit.node.node_id for hit in hits] for hits in shard_hits])
+        return [NodeWithScore(node=nodes[node_id], score=score) for node_id, score in fused[:self.top_k]]
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """Set of `size` word shingles of the tokenized text"""
+    tokens = tokenize(text)
+    return {" ".join(tokens[i:i + size]) for i in range(max(len(tokens) - size + 1, 1))}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def token_decoder() -> Optional[Callable[[List[Any]], str]]:
+    """
+    Inverse of Settings.tokenizer, or None when it cannot be found.
+
+    llama-index stores tiktoken and Hugging Face tokenizers as a partial of
+    their bound encode method, the decoder is the same object's decode.
+    """
+    encode = getattr(Settings.tokenizer, "func", Settings.tokenizer)
+    return getattr(getattr(encode, "__self__", None), "decode", None)
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """
+    Post-retrieval stage that reranks the retrieved opportunities, drops near
+    duplicates and packs the best passages into a fixed prompt token budget.
+
+    Passages longer than their share of the budget are truncated, so the
+    context sent to the LLM never exceeds `token_budget` tokens.
+    """
+
+    token_budget: int = Field(default=1500, description="Maximum context tokens across all passages.")
+    max_passages: int = Field(default=5, description="Maximum number of passages kept.")
+    max_passage_tokens: int = Field(default=500, description="Maximum tokens kept from one passage.")
+    duplicate_threshold: float = Field(default=0.8, description="Shingle overlap above which a passage is a duplicate.")
+    keyword_weight: float = Field(default=0.5, description="Weight of query keyword coverage versus retrieval score.")
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+    def _rerank(self, nodes: List[NodeWithScore], query_str: str) -> List[NodeWithScore]:
+        """Blend the normalised retrieval score with how many query keywords each passage covers"""
+        query_terms = set(tokenize(query_str))
+        max_score = max((node.score or 0.0 for node in nodes), default=0.0) or 1.0
+
+        reranked = []
+        for node in nodes:
+            coverage = len(query_terms & set(tokenize(node.node.get_content()))) / len(query_terms) if query_terms else 0.0
+            score = (1 - self.keyword_weight) * (node.score or 0.0) / max_score + self.keyword_weight * coverage
+            reranked.append(NodeWithScore(node=node.node, score=score))
+
+        return sorted(reranked, key=lambda node: node.score, reverse=True)
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text down to at most max_tokens tokens, at a word boundary when a few proportional cuts get there"""
+        for _ in range(3):
+            token_count = len(Settings.tokenizer(text))
+            if token_count <= max_tokens:
+                return text
+            cut = int(len(text) * max_tokens / token_count * 0.95)
+            text = text[:cut].rsplit(" ", 1)[0] + " ..."
+
+        # Dense text or the " ..." marker can still overshoot, keep exactly the first max_tokens tokens
+        tokens = Settings.tokenizer(text)
+        if len(tokens) <= max_tokens:
+            return text
+        decode = token_decoder()
+        for limit in range(max_tokens, 0, -1):
+            # A cut inside a multi-byte character or merge can re-encode to more tokens
+            capped = decode(tokens[:limit]) if decode is not None else text[:limit]
+            if len(Settings.tokenizer(capped)) <= max_tokens:
+                return capped
+        return ""
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if not nodes:
+            return nodes
+
+        if query_bundle is not None:
+            nodes = self._rerank(nodes, query_bundle.query_str)
+
+        packed: List[NodeWithScore] = []
+        kept_shingles: List[set] = []
+        remaining = self.token_budget
+
+        for node in nodes:
+            if len(packed) >= self.max_passages or remaining <= 0:
+                break
+
+            text = node.node.get_content()
+            passage_shingles = shingles(text)
+            if any(_jaccard(passage_shingles, kept) >= self.duplicate_threshold for kept in kept_shingles):
+                continue
+
+            truncated = self._truncate(text, min(self.max_passage_tokens, remaining))
+            remaining -= len(Settings.tokenizer(truncated))
+
+            if truncated != text:
+                packed_node = node.node.model_copy()
+                packed_node.set_content(truncated)
+                node = NodeWithScore(node=packed_node, score=node.score)
+
+            packed.append(node)
+            kept_shingles.append(passage_shingles)
+
+        logger.debug("Packed %d of %d passages into %d context tokens", len(packed), len(nodes), self.token_budget - remaining)
+        return packed
@@ -1,23 +1,85 @@
 from sqlalchemy.orm import Session
 from sqlalchemy import make_url
+from sqlalchemy.exc import IntegrityError
 from fastapi import HTTPException, status
-from app.dao import UserDAO, OptionDAO, QueryDAO, OpportunityDAO, DepartmentDAO, DesignationDAO, DepartmentDTO, DesignationDTO
-from app.auth import get_password_hash, verify_password, create_access_token
-from app.models import Opportunity
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from app.database import SessionLocal, read_from_primary
+from app.dao import UserDAO, OptionDAO, QueryDAO, OpportunityDAO, MatchDAO, DepartmentDAO, DesignationDAO, DepartmentDTO, DesignationDTO, OpportunityDTO
+from app.auth import get_password_hash, hash_passwords, verify_password, create_access_token
+from app.models import Opportunity, User
+from pydantic import BaseModel, EmailStr, ValidationError
+from typing import IO, AbstractSet, Dict, Iterator, List, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+import contextvars
+import csv
+import hashlib
+import json
+import orjson
 import os
-from mistralai import Mistral, Messages, SystemMessage, UserMessage, AssistantMessage
-from llama_index.core import StorageContext, VectorStoreIndex, load_index_from_storage, Settings
-from llama_index.llms.mistralai import MistralAI
-from llama_index.embeddings.mistralai import MistralAIEmbedding
+import threading
+import time
+from mistralai import Messages, SystemMessage, UserMessage, AssistantMessage
+from llama_index.core import StorageContext
 from llama_index.vector_stores.postgres import PGVectorStore
 from llama_index.readers.database import DatabaseReader
 from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.chat_engine import ContextChatEngine
+from app.clients import AIClients, CHAT_MODEL
+from app.dedup import OPPORTUNITY_DUPLICATE_POLICY, duplicate_index
+from app.index_store import IndexBuildInProgress, snapshot_store
+from app.matching import MATCH_STORE_DIR, MATCH_TOP_K, EmbeddingCache, match_pairs, match_updater, update_pairs
+from app.summarization import (
+    CHUNK_NOTES_INSTRUCTIONS,
+    REDUCE_INSTRUCTIONS,
+    SUMMARIZE_CHUNK_TOKENS,
+    SUMMARIZE_INSTRUCTIONS,
+    SUMMARIZE_MAX_PARALLEL,
+    SUMMARIZE_MAX_ROUNDS,
+    chunk_lines,
+    serialize_chat_history,
+)
+from app.retrieval import ContextPacker, HybridRetriever, OpportunityFilter, ShardedRetriever, parse_start_date
+from app.shards import LEGACY_SHARD, IndexShards, build_sharded_index, remove_from_sharded_index, shard_key, update_sharded_index
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Seconds the serialized onboarding options and queries are reused before being read again
+ONBOARDING_CACHE_SECONDS = float(os.getenv("ONBOARDING_CACHE_SECONDS", "300"))
+
+# Number of fused vector + keyword candidates retrieved for the staff chat
+RAG_SIMILARITY_TOP_K = int(os.getenv("RAG_SIMILARITY_TOP_K", "10"))
+RAG_KEYWORD_TOP_K = int(os.getenv("RAG_KEYWORD_TOP_K", "10"))
+
+# Reranked candidates are deduplicated and packed into this many context passages and tokens
+RAG_MAX_PASSAGES = int(os.getenv("RAG_MAX_PASSAGES", "5"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1500"))
+RAG_MAX_PASSAGE_TOKENS = int(os.getenv("RAG_MAX_PASSAGE_TOKENS", "500"))
+
+# HNSW index of the pgvector store, also used by scripts/benchmark_retrieval.py
+PGVECTOR_HNSW_SETTINGS = {
+    "hnsw_m": 16,
+    "hnsw_ef_construction": 64,
+    "hnsw_ef_search": 40,
+    "hnsw_dist_method": "vector_cosine_ops",
+}
+
+# Days after their start date opportunities stay active before the retention job archives them
+OPPORTUNITY_ARCHIVE_AFTER_DAYS = int(os.getenv("OPPORTUNITY_ARCHIVE_AFTER_DAYS", "0"))
+
+# Days archived opportunities are kept before being deleted, 0 keeps them forever
+OPPORTUNITY_ARCHIVE_RETENTION_DAYS = int(os.getenv("OPPORTUNITY_ARCHIVE_RETENTION_DAYS", "0"))
+
+# Rows inserted per COPY/executemany statement during bulk ingest
+BULK_INGEST_BATCH_SIZE = int(os.getenv("BULK_INGEST_BATCH_SIZE", "5000"))
+BULK_INGEST_MAX_REPORTED_ERRORS = 100
+
+# Users inserted per INSERT statement during bulk registration
+BULK_REGISTER_BATCH_SIZE = int(os.getenv("BULK_REGISTER_BATCH_SIZE", "500"))
+
+# Rows accepted by one bulk registration request, larger files go through scripts/provision_users.py
+BULK_REGISTER_MAX_ROWS = int(os.getenv("BULK_REGISTER_MAX_ROWS", "2000"))
+
 class UserCreate(BaseModel):
     first_name: str
     last_name: str
@@ -25,6 +87,7 @@ class UserCreate(BaseModel):
     password: str
     department_id: int
     designation_id: int
+    skills: Optional[str] = None
 
     class Config:
         from_attributes = True
@@ -60,11 +123,66 @@ class QueryResponse(BaseModel):
     ask: str
     order_num: int
 
+class OnboardingOptionResponse(BaseModel):
+    id: int
+    initial_option: str
+    queries: List[QueryResponse]
+
 class OpportunityResponse(BaseModel):
     id: int
     details: str
     department_id: Optional[int] = None
     user_id: Optional[int] = None
+    duplicate_of: Optional[int] = None
+
+class ArchivedOpportunityResponse(BaseModel):
+    id: int
+    details: str
+    department_id: Optional[int] = None
+    user_id: Optional[int] = None
+    created_at: datetime
+    closed_at: Optional[datetime] = None
+    duplicate_of: Optional[int] = None
+    archive_reason: str
+    archived_at: datetime
+
+class RetentionResponse(BaseModel):
+    archived: int
+    expired: int
+    closed: int
+    duplicates: int
+    purged: int
+    indexed: bool
+    message: str
+
+class MatchResponse(BaseModel):
+    user_id: int
+    opportunity_id: int
+    score: float
+
+class MatchRefreshResponse(BaseModel):
+    staff: int
+    opportunities: int
+    embedded: int
+    matches: int
+    changed: int
+
+class BulkRowError(BaseModel):
+    row: int
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    inserted: int
+    failed: int
+    indexed: bool
+    message: str
+    errors: List[BulkRowError]
+
+class BulkRegisterResponse(BaseModel):
+    created: int
+    failed: int
+    users: List[UserResponse]
+    errors: List[BulkRowError]
 
 class UserService:
     @staticmethod
@@ -100,7 +218,7 @@ class UserService:
             
             # Save user to database
             user = UserDAO.save_user(db, user_dict)
-
+            match_updater.request()
 
             designation_name = DesignationService.retrieve_designation_name(user.designation_id, db)
             department_name = DepartmentService.retrieve_department_name(user.department_id, db)
@@ -127,6 +245,111 @@ class UserService:
                 detail=f"Failed to register user: {str(e)}"
             )
     
+    @staticmethod
+    def bulk_register_users(db: Session, users: List[Union[UserCreate, dict]]) -> BulkRegisterResponse:
+        """
+        Register many users at once
+
+        Raw rows are validated one by one, department and designation ids are
+        validated against maps loaded once, passwords are hashed in parallel
+        across CPU cores and users are inserted in batches. Rows that fail are
+        reported without failing the rest.
+
+        Args:
+            db: Database session
+            users: User information or raw rows to validate, one entry per row
+
+        Returns:
+            Registered users and per-row errors
+        """
+        errors: List[BulkRowError] = []
+        parsed: List[tuple[int, UserCreate]] = []
+        for row, user in enumerate(users, start=1):
+            if isinstance(user, UserCreate):
+                parsed.append((row, user))
+                continue
+            try:
+                if not isinstance(user, dict):
+                    raise ValueError("row must be an object")
+                parsed.append((row, UserCreate(**user)))
+            except ValidationError as e:
+                errors.append(BulkRowError(row=row, error="; ".join(
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+                )))
+            except ValueError as e:
+                errors.append(BulkRowError(row=row, error=str(e)))
+
+        # The email check decides what is inserted, a lagging replica would miss recent registrations
+        read_from_primary(db)
+        departments = {dept.id: dept.name for dept in DepartmentDAO.list_departments(db)}
+        designations = {desig.id: desig for desig in DesignationDAO.list_designations(db)}
+        existing_emails = UserDAO.retrieve_existing_emails(db, [user.email for _, user in parsed])
+
+        valid: List[tuple[int, UserCreate]] = []
+        seen_emails = set()
+
+        for row, user in parsed:
+            designation = designations.get(user.designation_id)
+            if user.email in existing_emails:
+                error = "Email already registered"
+            elif user.email in seen_emails:
+                error = "Email duplicated in request"
+            elif user.department_id not in departments:
+                error = f"Department with ID {user.department_id} not found."
+            elif designation is None:
+                error = f"Designation with ID {user.designation_id} not found."
+            elif designation.department_id != user.department_id:
+                error = f"Designation with ID {user.designation_id} does not belong to department {user.department_id}."
+            else:
+                error = None
+
+            if error is not None:
+                errors.append(BulkRowError(row=row, error=error))
+            else:
+                seen_emails.add(user.email)
+                valid.append((row, user))
+
+        hashed_passwords = hash_passwords([user.password for _, user in valid])
+
+        saved: List[User] = []
+        for start in range(0, len(valid), BULK_REGISTER_BATCH_SIZE):
+            batch = valid[start:start + BULK_REGISTER_BATCH_SIZE]
+            user_dicts = [
+                {**user.dict(), 'password': hashed}
+                for (_, user), hashed in zip(batch, hashed_passwords[start:start + BULK_REGISTER_BATCH_SIZE])
+            ]
+
+            try:
+                saved.extend(UserDAO.bulk_save_users(db, user_dicts))
+            except IntegrityError:
+                # An email was registered concurrently, save row by row to isolate it
+                for (row, _), user_dict in zip(batch, user_dicts):
+                    try:
+                        saved.append(UserDAO.save_user(db, user_dict))
+                    except IntegrityError:
+                        errors.append(BulkRowError(row=row, error="Email already registered"))
+
+        if saved:
+            match_updater.request()
+        return BulkRegisterResponse(
+            created=len(saved),
+            failed=len(errors),
+            users=[
+                UserResponse(
+                    id=user.id,
+                    first_name=user.first_name,
+                    last_name=user.last_name,
+                    email=user.email,
+                    department_id=user.department_id,
+                    department=departments[user.department_id],
+                    designation_id=user.designation_id,
+                    designation=designations[user.designation_id].title
+                )
+                for user in saved
+            ],
+            errors=sorted(errors, key=lambda error: error.row)
+        )
+
     @staticmethod
     def validate_user(db: Session, user_data: UserLogin) -> TokenResponse:
         """
@@ -181,27 +404,217 @@ class UserService:
         )
 
 class OptionService:
+    # Serialized onboarding payload as (body, etag, expires at), shared by requests
+    _onboarding_cache: Optional[Tuple[bytes, str, float]] = None
+    _onboarding_lock = threading.Lock()
+
     @staticmethod
     def list_initial_options(db: Session) -> List[str]:
         optionList = OptionDAO.list_initial_options(db)
         return [opt.initial_option for opt in optionList]
 
+    @staticmethod
+    def get_onboarding(db: Session) -> Tuple[bytes, str]:
+        """
+        Every option with its ordered queries, serialized once and cached for ONBOARDING_CACHE_SECONDS
+
+        Returns:
+            JSON body and its ETag, derived from the content so every worker agrees on it
+        """
+        with OptionService._onboarding_lock:
+            cached = OptionService._onboarding_cache
+            if cached is not None and cached[2] > time.monotonic():
+                return cached[0], cached[1]
+
+            body = orjson.dumps([
+                {
+                    "id": option.id,
+                    "initial_option": option.initial_option,
+                    "queries": [
+                        {"option_id": query.option_id, "ask": query.ask, "order_num": query.order_num}
+                        for query in option.queries
+                    ],
+                }
+                for option in OptionDAO.list_options_with_queries(db)
+            ])
+            etag = f'"{hashlib.sha1(body).hexdigest()}"'
+            OptionService._onboarding_cache = (body, etag, time.monotonic() + ONBOARDING_CACHE_SECONDS)
+            return body, etag
+
+    @staticmethod
+    def clear_onboarding_cache():
+        with OptionService._onboarding_lock:
+            OptionService._onboarding_cache = None
+
 class QueryService:
     @staticmethod
     def list_all_queries_per_option(optionId: int, db: Session) -> List[QueryResponse]:
         queryList = QueryDAO.list_queries_per_option(optionId, db)
         return [QueryResponse(option_id=query.option_id, ask=query.ask, order_num=query.order_num)  for query in queryList]
 
+    @staticmethod
+    def get_query_rows(optionId: int, db: Session) -> List[dict]:
+        """Queries as plain dicts for direct JSON serialization, skipping pydantic models"""
+        return [
+            {"option_id": query.option_id, "ask": query.ask, "order_num": query.order_num}
+            for query in QueryDAO.list_queries_per_option(optionId, db)
+        ]
+
+def _optional_int(value) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(value)
+
+def parse_opportunity_rows(stream: IO[str], file_format: str) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Stream opportunity rows out of a JSONL or CSV upload
+
+    Args:
+        stream: Text stream of the uploaded file
+        file_format: "jsonl" or "csv"
+
+    Returns:
+        Iterator of (row number, opportunity dict or None, error message or None)
+    """
+    if file_format == "csv":
+        records = ((row_number, record) for row_number, record in enumerate(csv.DictReader(stream), start=1))
+    else:
+        records = ((row_number, line) for row_number, line in enumerate(stream, start=1) if line.strip())
+
+    for row_number, record in records:
+        try:
+            if file_format != "csv":
+                record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError("row must be an object")
+
+            details = record.get("details")
+            if not isinstance(details, str) or not details.strip():
+                raise ValueError("details is required")
+
+            yield row_number, {
+                'details': details,
+                'department_id': _optional_int(record.get("department_id")),
+                'user_id': _optional_int(record.get("user_id")),
+            }, None
+        except (ValueError, TypeError) as e:
+            yield row_number, None, str(e)
+
 class OpportunityService:
     @staticmethod
     def get_opportunities(db: Session) -> List[OpportunityResponse]:
         opportunityList = OpportunityDAO.get_all_opportunities(db)
-        return [OpportunityResponse(id=opp.id, details=opp.details, department_id=opp.department_id, user_id=opp.user_id)  for opp in opportunityList]
+        return [OpportunityResponse(id=opp.id, details=opp.details, department_id=opp.department_id, user_id=opp.user_id, duplicate_of=opp.duplicate_of)  for opp in opportunityList]
+
+    @staticmethod
+    def get_opportunity_rows(db: Session) -> List[dict]:
+        """Opportunities as plain dicts for direct JSON serialization, skipping pydantic models"""
+        return [
+            {"id": opp.id, "details": opp.details, "department_id": opp.department_id, "user_id": opp.user_id, "duplicate_of": opp.duplicate_of}
+            for opp in OpportunityDAO.get_all_opportunities(db)
+        ]
+
+    @staticmethod
+    def close_opportunity(db: Session, opportunity_id: int) -> OpportunityResponse:
+        opportunity = OpportunityDAO.close_opportunity(db, opportunity_id)
+        if opportunity is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Opportunity not found")
+        return OpportunityResponse(id=opportunity.id, details=opportunity.details, department_id=opportunity.department_id,
+                                   user_id=opportunity.user_id, duplicate_of=opportunity.duplicate_of)
+
+    @staticmethod
+    def add_opportunity(db: Session, opportunity_data: dict, policy: str = OPPORTUNITY_DUPLICATE_POLICY) -> Tuple[Opportunity, Optional[int]]:
+        """
+        Save an opportunity unless it is a near-duplicate of an existing one
+
+        The MinHash index is first caught up with opportunities saved since its
+        last check, including those written by other workers. Candidates that
+        no longer exist, archived by another worker, are dropped from the index.
+
+        Args:
+            db: Database session
+            opportunity_data: Dictionary with details, department_id and user_id
+            policy: "merge" returns the existing opportunity instead of saving, "flag" saves it with duplicate_of set
+
+        Returns:
+            The saved or existing opportunity, and the id it duplicates if any
+        """
+        # Catch-up reads decide whether this row is a duplicate, so they must see every committed row
+        read_from_primary(db)
+        with duplicate_index.lock:
+            for opportunity_id, details in OpportunityDAO.get_opportunity_details_after(db, duplicate_index.last_id):
+                duplicate_index.add(opportunity_id, details)
+
+            for duplicate_id, similarity in duplicate_index.matches(opportunity_data["details"]):
+                # Another worker may have archived the candidate since it was indexed here
+                existing = db.get(Opportunity, duplicate_id)
+                if existing is None:
+                    duplicate_index.remove(duplicate_id)
+                    continue
+
+                logger.info("Opportunity is a near-duplicate of %d (similarity %.2f), policy %s", duplicate_id, similarity, policy)
+                if policy == "merge":
+                    return existing, duplicate_id
+                opportunity_data = {**opportunity_data, "duplicate_of": duplicate_id}
+                break
+
+            opportunity = OpportunityDAO.add_opportunity(db, opportunity_data)
+            if opportunity.duplicate_of is None:
+                duplicate_index.add(opportunity.id, opportunity.details)
+                match_updater.request()
+            return opportunity, opportunity.duplicate_of
+
+    @staticmethod
+    def bulk_ingest(db: Session, stream: IO[str], file_format: str, ai_service: "AIService") -> BulkIngestResponse:
+        """
+        Insert every valid row of an upload in batches, then index the new opportunities
+
+        Args:
+            db: Database session
+            stream: Text stream of the uploaded JSONL or CSV file
+            file_format: "jsonl" or "csv"
+            ai_service: Service used to embed and index the inserted rows
+
+        Returns:
+            Inserted and failed row counts with per-row errors
+        """
+        inserted: List[OpportunityDTO] = []
+        errors: List[BulkRowError] = []
+        failed = 0
+        batch: List[dict] = []
+
+        for row_number, opportunity, error in parse_opportunity_rows(stream, file_format):
+            if error is not None:
+                failed += 1
+                if len(errors) < BULK_INGEST_MAX_REPORTED_ERRORS:
+                    errors.append(BulkRowError(row=row_number, error=error))
+                continue
+
+            batch.append(opportunity)
+            if len(batch) >= BULK_INGEST_BATCH_SIZE:
+                inserted.extend(OpportunityDAO.bulk_add_opportunities(db, batch))
+                batch = []
+
+        inserted.extend(OpportunityDAO.bulk_add_opportunities(db, batch))
+        if inserted:
+            match_updater.request()
+
+        index_response = ai_service.index_opportunities(inserted)
+
+        return BulkIngestResponse(
+            inserted=len(inserted),
+            failed=failed,
+            indexed=index_response.success,
+            message=index_response.message,
+            errors=errors
+        )
 
 class ChatRequest(BaseModel):
     prompt: str
     chat_history: list[Messages]
     user: str
+    department_id: Optional[int] = None
+    search_all_departments: bool = False
 class ChatResponse(BaseModel):
     response: str
     chat_history: list[Messages]
@@ -212,15 +625,25 @@ class LoginRequest(BaseModel):
 
 class SummarizeRequest(BaseModel):
     chat_history: list[Messages]
+    department_id: Optional[int] = None
+    user_id: Optional[int] = None
 class SummarizeResponse(BaseModel):
     response: str
+    opportunity_id: Optional[int] = None
+    duplicate_of: Optional[int] = None
 
 class CreateIndexResponse(BaseModel):
     success: bool
     message: str
+
+# Department shards of the published snapshot, shared by requests
+_loaded_shards: Optional[IndexShards] = None
+_loaded_shards_lock = threading.Lock()
+
 class AIService:
 
-    def __init__(self):
+    def __init__(self, clients: AIClients):
+        self.clients = clients
         system_prompt = """
             You are a chat bot assistant designed to help with the staffing processes at EY. Two types of users will be communicating with you: 1) people
             with technical skills that looking for engagements, and 2) people who are trying to staff engagements with the resources who have the correct
@@ -251,17 +674,14 @@ class AIService:
     def chat(self, model: str, prompt: str, chat_history: list[Messages] = []) -> ChatResponse:
         print("In chat function")
         if model.lower() == "mistral":
-            api_key = os.environ["MISTRAL_API_KEY"]
-            model = "mistral-large-latest"
-
-            client = Mistral(api_key=api_key)
+            client = self.clients.chat_client
 
             messages = self.messages
             messages.extend(chat_history)
             messages.append(UserMessage(content=prompt))
 
             chat_response = client.chat.complete(
-                model = model,
+                model = CHAT_MODEL,
                 messages = messages
             )
             messages.append(AssistantMessage(content=chat_response.choices[0].message.content))
@@ -270,12 +690,68 @@ class AIService:
         else:
             raise Exception("AI model is not currently supported or does not exist")
         
-    def chat_with_rag(self, model: str, prompt: str, chat_history: list[Messages] = []) -> ChatResponse:
+    def load_current_shards(self) -> IndexShards:
+        """
+        Department shards of the published snapshot, opened once per worker.
+
+        Each shard's vector and BM25 indexes are loaded on first use and reused
+        by later requests until a newer snapshot is published.
+        """
+        global _loaded_shards
+
+        # Resolve the published snapshot once so every shard comes from the same build
+        index_dir = snapshot_store.current_dir()
+        if index_dir is None:
+            raise Exception("No opportunity index has been built")
+
+        with _loaded_shards_lock:
+            if _loaded_shards is None or _loaded_shards.snapshot_dir != index_dir:
+                _loaded_shards = IndexShards.open(index_dir)
+            return _loaded_shards
+
+    def build_retriever(self, shards: IndexShards, opportunity_filter: OpportunityFilter, search_all_departments: bool = False) -> ShardedRetriever:
+        """
+        Hybrid retriever over the shards relevant to the caller.
+
+        A caller with a department searches its department's shard and the shard
+        of opportunities without a department. Callers without a department, or
+        asking to search all departments, fan out over every shard.
+
+        Args:
+            shards: Shards of the published snapshot
+            opportunity_filter: Metadata filter of the conversation
+            search_all_departments: Whether to search every department's shard
+
+        Returns:
+            ShardedRetriever: retriever merging the hits of each searched shard
+        """
+        department_id = opportunity_filter.department_id
+        if shards.legacy:
+            keys = [LEGACY_SHARD]
+        elif department_id is None or search_all_departments:
+            keys = shards.keys()
+            # Other departments' opportunities are only excluded by their shard
+            opportunity_filter = OpportunityFilter(None, opportunity_filter.opportunity_type, opportunity_filter.min_start_date)
+        else:
+            keys = [key for key in (shard_key(department_id), shard_key(None)) if key in shards]
+
+        retrievers = []
+        for key in keys:
+            index, bm25_index = shards.load(key, self.clients.embed_model)
+            # Fuse vector and BM25 keyword hits so exact tech stack terms are not missed
+            retrievers.append(HybridRetriever(
+                index=index,
+                bm25_index=bm25_index,
+                top_k=RAG_SIMILARITY_TOP_K,
+                keyword_top_k=RAG_KEYWORD_TOP_K,
+                opportunity_filter=opportunity_filter,
+            ))
+        return ShardedRetriever(retrievers, embed_model=self.clients.embed_model, top_k=RAG_SIMILARITY_TOP_K)
+
+    def chat_with_rag(self, model: str, prompt: str, chat_history: list[Messages] = [], department_id: Optional[int] = None, search_all_departments: bool = False) -> ChatResponse:
         # load index
         print("In chat_with_rag function")
-        api_key = os.environ["MISTRAL_API_KEY"]
-        llm = MistralAI(model='mistral-large-latest', api_key=api_key)
-        Settings.embed_model = MistralAIEmbedding(model_name='mistral-embed', api_key=api_key)
+        llm = self.clients.llm
 
         messages = self.messages
         messages.extend(chat_history)
@@ -291,91 +767,174 @@ class AIService:
         messages.append(UserMessage(content=prompt))
         
         try:
-            storage_context = StorageContext.from_defaults(persist_dir="./index_store")
-            index = load_index_from_storage(storage_context)
+            shards = self.load_current_shards()
         except Exception as e:
             print(str(e))
             return ChatResponse(response="Opportunities could not be loaded, there may not be any available right now. Please try again later.", chat_history=messages[1:])
         
-        response = index.as_chat_engine(llm=llm, similarity_top_k=10, chat_mode="context").chat(message=prompt, chat_history=chat_messages)
+        # Only search opportunities in the user's department, of the type they asked for, that have not started yet
+        opportunity_filter = OpportunityFilter.from_conversation(
+            department_id,
+            [message.content for message in messages if message.role == "user"],
+        )
+
+        retriever = self.build_retriever(shards, opportunity_filter, search_all_departments)
+        context_packer = ContextPacker(
+            token_budget=RAG_CONTEXT_TOKEN_BUDGET,
+            max_passages=RAG_MAX_PASSAGES,
+            max_passage_tokens=RAG_MAX_PASSAGE_TOKENS,
+        )
+        chat_engine = ContextChatEngine.from_defaults(retriever=retriever, llm=llm, node_postprocessors=[context_packer])
+        response = chat_engine.chat(message=prompt, chat_history=chat_messages)
         messages.append(AssistantMessage(content=response.response))
         return ChatResponse(response=response.response, chat_history=messages[1:])
 
 
         
-    def summarize(self, model: str, chat_history: list[Messages], db: Session):
-        if model.lower() == "mistral":
-            api_key = os.environ["MISTRAL_API_KEY"]
-            model = "mistral-large-latest"
-
-            client = Mistral(api_key=api_key)
-
-            summarize_instructions = """
-                The following message from the user will contain a series of messages from a prior conversation describing a potential engagement 
-                opportunity. It is your job to summarize these messages into a format that will be stored as an opportunity. You will include the
-                following sections in the opportunity as you understand them from the conversation.
-
-                1. Engagement Name - Name the opportunity based on the goal of the engagement and the client
-                2. Engagement Summary - Explain in a few sentences on what the engagement is about and what will get done during it
-                3. Required Resources - List out all of the roles needed for the engagement and what skills are required for each role as well as
-                rank requirements. Also include a few sentence summary for each role about what they will be doing.
-                4. Estimated Start Date and Timeline
+    def _complete(self, instructions: str, content: str) -> str:
+        chat_response = self.clients.chat_client.chat.complete(
+            model = CHAT_MODEL,
+            messages = [self.messages[0], SystemMessage(content=instructions), UserMessage(content=content)]
+        )
+        return chat_response.choices[0].message.content
 
-                Return this result as a string that can be saved into a database to later be indexed or retrieved.
-            """
+    def summarize_transcript(self, lines: List[str]) -> str:
+        """
+        Summarize a conversation transcript into the four section opportunity format.
 
-            self.messages.append(SystemMessage(content=summarize_instructions))
+        Transcripts over SUMMARIZE_CHUNK_TOKENS are split into chunks that are
+        condensed into notes in parallel, then the notes are reduced into the
+        final summary, so latency stays about two LLM calls however long the chat.
 
-            messages = self.messages
-            
-            messages.append(UserMessage(content=str(chat_history)))
+        Args:
+            lines: Transcript lines from `serialize_chat_history`
 
-            chat_response = client.chat.complete(
-                model = model,
-                messages = messages
-            )
-            messages.append(SystemMessage(content=chat_response.choices[0].message.content))
+        Returns:
+            str: opportunity summary
+        """
+        chunks = chunk_lines(lines, SUMMARIZE_CHUNK_TOKENS)
+        if len(chunks) <= 1:
+            return self._complete(SUMMARIZE_INSTRUCTIONS, chunks[0] if chunks else "")
+
+        for _ in range(SUMMARIZE_MAX_ROUNDS):
+            with ThreadPoolExecutor(max_workers=min(SUMMARIZE_MAX_PARALLEL, len(chunks))) as executor:
+                # Each call runs in a copy of the request context so its usage is attributed to the caller
+                futures = [
+                    executor.submit(contextvars.copy_context().run, self._complete, CHUNK_NOTES_INSTRUCTIONS, chunk)
+                    for chunk in chunks
+                ]
+                notes = [future.result() for future in futures]
+            chunks = chunk_lines([f"Part {i + 1} notes:\n{note}" for i, note in enumerate(notes)], SUMMARIZE_CHUNK_TOKENS)
+            if len(chunks) == 1:
+                break
+
+        return self._complete(REDUCE_INSTRUCTIONS, "\n\n".join(chunks))
+
+    def summarize(self, model: str, chat_history: list[Messages], db: Session, department_id: Optional[int] = None, user_id: Optional[int] = None):
+        if model.lower() == "mistral":
+            # Compact "Role: text" transcript instead of the repr of the message models
+            summary = self.summarize_transcript(serialize_chat_history(chat_history))
 
-            # TODO: Pass in department_id and user_id to be added to the db here
-            opportunity = dict({'details': chat_response.choices[0].message.content,
-                                'department_id': None,
-                                'user_id': None})
+            opportunity = dict({'details': summary,
+                                'department_id': department_id,
+                                'user_id': user_id})
 
-            opportunityRes = OpportunityDAO.add_opportunity(db, opportunity)
+            # Near-duplicates of an existing opportunity are merged into it or flagged
+            opportunityRes, duplicate_of = OpportunityService.add_opportunity(db, opportunity)
 
-            return SummarizeResponse(response=chat_response.choices[0].message.content)
+            return SummarizeResponse(response=summary, opportunity_id=opportunityRes.id, duplicate_of=duplicate_of)
         else:
             raise Exception("AI model is not currently supported or does not exist")
         
     def create_index(self, model: str, db: Session):
-        api_key = os.environ["MISTRAL_API_KEY"]
         data_store = 'local'
 
         try:
-            # Initialize Mistral model and embedding model
-            llm = MistralAI(model='mistral-large-latest', api_key=api_key)
-            embedding_model = MistralAIEmbedding(model_name='mistral-embed', api_key=api_key)
+            # Shared embedding model from the application scoped clients
+            embedding_model = self.clients.embed_model
 
             # Create storage context which will allow us to use Postgres as our Vector Store
             # pg_storage_context = self.getStorageContext(data_store=data_store)
 
-            # Get all opportunity objects from DB to be ingested into index
-            db_reader = self.setup_llama_db_reader()
-            query = "SELECT * FROM opportunity;"
-            documents = db_reader.load_data(query=query)
+            # Get all opportunity objects from DB to be ingested into index, with their metadata for filtering
+            opportunities = OpportunityDAO.get_all_opportunities(db, include_duplicates=False)
 
-            # Create index from db documents
+            # Create one index shard per department into a new snapshot, published once fully written
             if(data_store == 'local'):
-                index = VectorStoreIndex.from_documents(documents=documents, embed_model=embedding_model)
-                index.storage_context.persist(persist_dir="index_store")
-
-            return CreateIndexResponse(success=True, message='Index created successfully')
+                with snapshot_store.build(blocking=False) as snapshot_dir:
+                    # Resolved under the build lock, departments unchanged since this snapshot are not re-embedded
+                    previous = IndexShards.open(snapshot_store.current_dir())
+                    rebuilt = build_sharded_index(snapshot_dir, opportunities, previous, embedding_model)
+                    shard_count = len(IndexShards.open(snapshot_dir).keys())
+
+            return CreateIndexResponse(success=True, message=f'Index created successfully, rebuilt {len(rebuilt)} of {shard_count} department shards')
+        except IndexBuildInProgress as e:
+            return CreateIndexResponse(success=False, message=str(e))
         except Exception as e:
             print(str(e))
             return CreateIndexResponse(success=False, message=str(e))
 
 
 
+    def index_opportunities(self, opportunities: List[Opportunity]) -> CreateIndexResponse:
+        """
+        Add opportunities to the persisted index without rebuilding it.
+
+        Only the shards of the opportunities' departments are updated, nodes are
+        embedded in batches of the embedding model's `embed_batch_size`. The
+        updated index is written to a new snapshot, waiting for any running
+        build, and is created if none has been persisted yet.
+
+        Args:
+            opportunities: Opportunity rows to index
+
+        Returns:
+            CreateIndexResponse: whether or not the opportunities were indexed
+        """
+        if not opportunities:
+            return CreateIndexResponse(success=True, message='No opportunities to index')
+
+        try:
+            with snapshot_store.build() as snapshot_dir:
+                # Resolved under the build lock so no concurrent update is lost
+                previous = IndexShards.open(snapshot_store.current_dir())
+                update_sharded_index(snapshot_dir, opportunities, previous, self.clients.embed_model)
+
+            return CreateIndexResponse(success=True, message=f'Indexed {len(opportunities)} opportunities')
+        except Exception as e:
+            logger.exception("Error indexing opportunities")
+            return CreateIndexResponse(success=False, message=str(e))
+
+    def remove_opportunities(self, opportunity_ids: List[int]) -> CreateIndexResponse:
+        """
+        Remove opportunities from the persisted index without rebuilding it.
+
+        Only the shards holding them are rewritten, without re-embedding any
+        node, into a new snapshot published once fully written.
+
+        Args:
+            opportunity_ids: Ids of the opportunities to remove
+
+        Returns:
+            CreateIndexResponse: whether or not the opportunities were removed
+        """
+        if not opportunity_ids:
+            return CreateIndexResponse(success=True, message='No opportunities to remove')
+
+        if snapshot_store.current_dir() is None:
+            return CreateIndexResponse(success=True, message='No opportunity index has been built')
+
+        try:
+            with snapshot_store.build() as snapshot_dir:
+                # Resolved under the build lock so no concurrent update is lost
+                previous = IndexShards.open(snapshot_store.current_dir())
+                changed = remove_from_sharded_index(snapshot_dir, opportunity_ids, previous, self.clients.embed_model)
+
+            return CreateIndexResponse(success=True, message=f'Removed {len(opportunity_ids)} opportunities from {len(changed)} department shards')
+        except Exception as e:
+            logger.exception("Error removing opportunities from the index")
+            return CreateIndexResponse(success=False, message=str(e))
+
     def getStorageContext(self, data_store: str, returnVectorStore: bool = False) -> StorageContext | PGVectorStore:
         """
         Returns the storage context to persist a LlamaIndex index. This will be passed into the `VectorStoreIndex.from_documents()` function as the `storage_context` argument.
@@ -406,12 +965,7 @@ class AIService:
                         user=url.username,
                         table_name='vectorstore',
                         embed_dim=1024,
-                        hnsw_kwargs={
-                            "hnsw_m": 16,
-                            "hnsw_ef_construction": 64,
-                            "hnsw_ef_search": 40,
-                            "hnsw_dist_method": "vector_cosine_ops",
-                        }
+                        hnsw_kwargs=PGVECTOR_HNSW_SETTINGS,
                     )
 
                     if (returnVectorStore):
@@ -458,4 +1012,192 @@ class DesignationService:
         return DesignationDAO.list_designations_per_department(departmentId, db)
     @staticmethod
     def retrieve_designation_name(designationId:int, db: Session) -> str:
-        return DesignationDAO.retrieve_designation_name(designationId, db)
\ No newline at end of file
+        return DesignationDAO.retrieve_designation_name(designationId, db)
+
+class MatchService:
+    # Refreshes share the embedding caches on disk, run one at a time
+    _refresh_lock = threading.Lock()
+
+    @staticmethod
+    def staff_profile(user: User, departments: dict, designations: dict) -> str:
+        """Text embedded for a staff member: rank, department and skills"""
+        designation = designations.get(user.designation_id)
+        profile = f"{designation.title if designation else 'Staff'} in {departments.get(user.department_id, 'any department')}."
+        if user.skills:
+            profile += f" Skills: {user.skills}"
+        return profile
+
+    @staticmethod
+    def refresh_matches(db: Session, clients: AIClients, full: bool = False,
+                        rescore_staff: AbstractSet[int] = frozenset()) -> MatchRefreshResponse:
+        """
+        Bring the stored staff to opportunity matches up to date
+
+        Only staff profiles and opportunities that are new or changed since the
+        last refresh are embedded, the rest come from the on-disk embedding cache.
+        Unless `full` is set, only the rows and columns of staff and opportunities
+        the changes can affect are rescored, and only changed match rows are written.
+
+        Args:
+            db: Database session
+            clients: Application scoped AI clients, used for embeddings
+            full: Rescore every staff member against every opportunity
+            rescore_staff: Staff rescored even when their profile is unchanged, e.g. after their matches were archived
+
+        Returns:
+            Counts of staff, opportunities, texts embedded, matches rescored and rows written
+        """
+        with MatchService._refresh_lock:
+            departments = {dept.id: dept.name for dept in DepartmentDAO.list_departments(db)}
+            designations = {desig.id: desig for desig in DesignationDAO.list_designations(db)}
+
+            staff_texts = {
+                user.id: MatchService.staff_profile(user, departments, designations)
+                for user in UserDAO.list_users(db)
+            }
+            opportunity_texts = {opp.id: opp.details for opp in OpportunityDAO.get_all_opportunities(db, include_duplicates=False)}
+
+            staff_cache = EmbeddingCache(os.path.join(MATCH_STORE_DIR, "staff.npz"))
+            opportunity_cache = EmbeddingCache(os.path.join(MATCH_STORE_DIR, "opportunities.npz"))
+            changed_staff = staff_cache.changed(staff_texts) | set(rescore_staff)
+            changed_opportunities = opportunity_cache.changed(opportunity_texts)
+            staff_ids, staff_vectors, staff_embedded = staff_cache.embed(staff_texts, clients.embed_model)
+            opportunity_ids, opportunity_vectors, opportunity_embedded = opportunity_cache.embed(opportunity_texts, clients.embed_model)
+
+            # Stored matches are diffed against, they must be read where they are written
+            read_from_primary(db)
+            stored = MatchDAO.list_match_scores(db)
+            if full:
+                pairs = match_pairs(staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, k=MATCH_TOP_K)
+                existing = stored
+            else:
+                pairs, affected_staff, affected_opportunities = update_pairs(
+                    staff_ids, staff_vectors, opportunity_ids, opportunity_vectors,
+                    stored, changed_staff, changed_opportunities, k=MATCH_TOP_K,
+                )
+                existing = {
+                    key: score for key, score in stored.items()
+                    if key[0] in affected_staff or key[1] in affected_opportunities
+                }
+            changed = MatchDAO.replace_matches(db, pairs, existing)
+
+            staff_cache.save()
+            opportunity_cache.save()
+
+            return MatchRefreshResponse(
+                staff=len(staff_ids),
+                opportunities=len(opportunity_ids),
+                embedded=staff_embedded + opportunity_embedded,
+                matches=len(pairs),
+                changed=changed
+            )
+
+    @staticmethod
+    def start_background_updates(clients: AIClients):
+        """Apply staff and opportunity changes to the stored matches from a background thread"""
+        def update(rescore_staff):
+            db = SessionLocal()
+            try:
+                MatchService.refresh_matches(db, clients, rescore_staff=rescore_staff)
+            finally:
+                db.close()
+
+        match_updater.start(update)
+
+    @staticmethod
+    def matches_for_user(user_id: int, db: Session, limit: int = MATCH_TOP_K) -> List[MatchResponse]:
+        matches = MatchDAO.list_matches_for_user(db, user_id, limit)
+        return [MatchResponse(user_id=m.user_id, opportunity_id=m.opportunity_id, score=m.score) for m in matches]
+
+    @staticmethod
+    def matches_for_opportunity(opportunity_id: int, db: Session, limit: int = MATCH_TOP_K) -> List[MatchResponse]:
+        matches = MatchDAO.list_matches_for_opportunity(db, opportunity_id, limit)
+        return [MatchResponse(user_id=m.user_id, opportunity_id=m.opportunity_id, score=m.score) for m in matches]
+
+class RetentionService:
+    # Runs one at a time, a second run would archive the same opportunities
+    _retention_lock = threading.Lock()
+
+    @staticmethod
+    def archive_reasons(opportunities, today: date, archive_after_days: int = OPPORTUNITY_ARCHIVE_AFTER_DAYS) -> Dict[int, str]:
+        """
+        Opportunities due for archival, with the reason each is archived
+
+        Closed opportunities and opportunities whose start date is more than
+        `archive_after_days` days past are archived, along with opportunities
+        flagged as their duplicates. Opportunities without a parsed start date
+        only expire by being closed.
+        """
+        cutoff = today - timedelta(days=archive_after_days)
+        reasons = {}
+        for opp in opportunities:
+            if opp.closed_at is not None:
+                reasons[opp.id] = "closed"
+                continue
+            start_date = parse_start_date(opp.details)
+            if start_date is not None and start_date < cutoff:
+                reasons[opp.id] = "expired"
+
+        for opp in opportunities:
+            if opp.id not in reasons and opp.duplicate_of in reasons:
+                reasons[opp.id] = "duplicate"
+        return reasons
+
+    @staticmethod
+    def archive_stale_opportunities(db: Session, ai_service: AIService) -> RetentionResponse:
+        """
+        Move expired and closed opportunities to the archive and out of the index
+
+        The archive is written first as the source of truth. If the index
+        cannot be updated, the next index build drops the archived
+        opportunities from the shards that held them.
+
+        Args:
+            db: Database session
+            ai_service: Service owning the opportunity index
+
+        Returns:
+            Counts of archived opportunities per reason and purged archive rows
+        """
+        with RetentionService._retention_lock:
+            # Rows are copied to the archive and deleted as read, so read them from the primary
+            read_from_primary(db)
+            reasons = RetentionService.archive_reasons(OpportunityDAO.list_opportunity_lifecycles(db), date.today())
+            # Archival deletes their matches, these staff are rescored against the remaining opportunities
+            matched_staff = MatchDAO.list_staff_matched_to(db, sorted(reasons))
+            archived = OpportunityDAO.archive_opportunities(db, reasons)
+            if reasons:
+                match_updater.request(matched_staff)
+
+            # add_opportunity reads signatures under this lock while matching candidates
+            with duplicate_index.lock:
+                for opportunity_id in reasons:
+                    duplicate_index.remove(opportunity_id)
+            index_response = ai_service.remove_opportunities(list(reasons))
+
+            purged = 0
+            if OPPORTUNITY_ARCHIVE_RETENTION_DAYS > 0:
+                cutoff = datetime.now(timezone.utc) - timedelta(days=OPPORTUNITY_ARCHIVE_RETENTION_DAYS)
+                purged = OpportunityDAO.purge_archived_before(db, cutoff)
+
+            counts = {reason: sum(1 for value in reasons.values() if value == reason) for reason in ("expired", "closed", "duplicate")}
+            return RetentionResponse(
+                archived=archived,
+                expired=counts["expired"],
+                closed=counts["closed"],
+                duplicates=counts["duplicate"],
+                purged=purged,
+                indexed=index_response.success,
+                message=index_response.message,
+            )
+
+    @staticmethod
+    def list_archived(db: Session, department_id: Optional[int] = None, limit: int = 100, offset: int = 0) -> List[ArchivedOpportunityResponse]:
+        return [
+            ArchivedOpportunityResponse(
+                id=opp.id, details=opp.details, department_id=opp.department_id, user_id=opp.user_id,
+                created_at=opp.created_at, closed_at=opp.closed_at, duplicate_of=opp.duplicate_of,
+                archive_reason=opp.archive_reason, archived_at=opp.archived_at,
+            )
+            for opp in OpportunityDAO.list_archived_opportunities(db, department_id, limit, offset)
+        ]
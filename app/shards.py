@@ -0,0 +1,239 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from llama_index.core import Settings, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from app.index_format import load_index, save_index
+from app.retrieval import BM25Index, build_opportunity_document
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Lists the shards of a snapshot and the documents each was built from
+SHARDS_FILE_NAME = "shards.json"
+
+# Department shards built concurrently, embedding calls dominate so threads suffice
+INDEX_BUILD_WORKERS = int(os.getenv("INDEX_BUILD_WORKERS", "4"))
+
+# Shard of a snapshot persisted before department shards, holding every opportunity
+LEGACY_SHARD = "all"
+
+
+def shard_key(department_id: Optional[int]) -> str:
+    """Shard holding the opportunities of a department, opportunities without one share a shard"""
+    return f"department-{department_id if department_id is not None else 'none'}"
+
+
+def document_hash(opportunity) -> str:
+    """Hash of everything an opportunity's indexed document is built from"""
+    content = f"{opportunity.details}\x1f{opportunity.user_id}\x1f{opportunity.created_at}"
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+
+def group_by_shard(opportunities: Iterable) -> Dict[str, list]:
+    shards: Dict[str, list] = {}
+    for opportunity in opportunities:
+        shards.setdefault(shard_key(opportunity.department_id), []).append(opportunity)
+    return shards
+
+
+class IndexShards:
+    """
+    Department shards of one published snapshot, each a vector index and a BM25 index.
+
+    Shards are loaded on first use, so a worker only holds the departments it
+    is asked about. A snapshot persisted before sharding is one LEGACY_SHARD.
+    """
+
+    def __init__(self, snapshot_dir: str, documents: Dict[str, Dict[str, str]], legacy: bool = False):
+        self.snapshot_dir = snapshot_dir
+        self.documents = documents
+        self.legacy = legacy
+        self._loaded: Dict[str, Tuple[VectorStoreIndex, BM25Index]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, snapshot_dir: Optional[str]) -> Optional["IndexShards"]:
+        if snapshot_dir is None:
+            return None
+        path = os.path.join(snapshot_dir, SHARDS_FILE_NAME)
+        if not os.path.exists(path):
+            return cls(snapshot_dir, {LEGACY_SHARD: {}}, legacy=True)
+        with open(path) as f:
+            return cls(snapshot_dir, json.load(f)["shards"])
+
+    def keys(self) -> List[str]:
+        return list(self.documents)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.documents
+
+    def shard_dir(self, key: str) -> str:
+        return self.snapshot_dir if self.legacy else os.path.join(self.snapshot_dir, "shards", key)
+
+    def load(self, key: str, embed_model: BaseEmbedding) -> Tuple[VectorStoreIndex, BM25Index]:
+        with self._lock:
+            if key not in self._loaded:
+                shard_dir = self.shard_dir(key)
+                self._loaded[key] = (load_index(shard_dir, embed_model=embed_model), BM25Index.load(shard_dir))
+            return self._loaded[key]
+
+
+def _link_shard(source_dir: str, target_dir: str):
+    """Hard link an unchanged shard into the new snapshot, files are never modified in place"""
+    os.makedirs(target_dir)
+    for name in os.listdir(source_dir):
+        try:
+            os.link(os.path.join(source_dir, name), os.path.join(target_dir, name))
+        except OSError:
+            shutil.copy2(os.path.join(source_dir, name), os.path.join(target_dir, name))
+
+
+def _build_shard(shard_dir: str, opportunities: list, embed_model: BaseEmbedding, previous_dir: Optional[str] = None):
+    """Index opportunities into a shard, on top of the previous version of the shard when given"""
+    documents = [build_opportunity_document(opp) for opp in opportunities]
+    nodes = Settings.node_parser.get_nodes_from_documents(documents)
+
+    if previous_dir is not None:
+        index = load_index(previous_dir, embed_model=embed_model)
+        index.insert_nodes(nodes)
+        bm25_index = BM25Index.load(previous_dir)
+    else:
+        index = VectorStoreIndex(nodes, embed_model=embed_model)
+        bm25_index = BM25Index()
+    save_index(index, shard_dir)
+
+    # Keyword index over the same nodes, fused with vector hits at query time
+    for node in nodes:
+        bm25_index.add(node.node_id, node.get_content())
+    bm25_index.persist(shard_dir)
+
+
+def _run_parallel(tasks: List[Callable[[], None]]):
+    if not tasks:
+        return
+    with ThreadPoolExecutor(max_workers=min(INDEX_BUILD_WORKERS, len(tasks))) as executor:
+        # Each build runs in a copy of the caller's context so its embedding usage is attributed to the caller
+        futures = [executor.submit(contextvars.copy_context().run, task) for task in tasks]
+        for future in futures:
+            future.result()
+
+
+def _write_manifest(snapshot_dir: str, documents: Dict[str, Dict[str, str]]):
+    with open(os.path.join(snapshot_dir, SHARDS_FILE_NAME), "w") as f:
+        json.dump({"shards": documents}, f)
+
+
+def build_sharded_index(snapshot_dir: str, opportunities: Iterable, previous: Optional[IndexShards], embed_model: BaseEmbedding) -> List[str]:
+    """
+    Build one shard per department into a snapshot directory.
+
+    Shards whose documents are unchanged since the previous snapshot are
+    linked from it, the others are rebuilt in parallel.
+
+    Returns:
+        List[str]: keys of the rebuilt shards
+    """
+    documents, tasks, rebuilt = {}, [], []
+    for key, shard_opportunities in group_by_shard(opportunities).items():
+        documents[key] = {str(opp.id): document_hash(opp) for opp in shard_opportunities}
+        shard_dir = os.path.join(snapshot_dir, "shards", key)
+
+        if previous is not None and not previous.legacy and previous.documents.get(key) == documents[key]:
+            _link_shard(previous.shard_dir(key), shard_dir)
+        else:
+            rebuilt.append(key)
+            tasks.append(lambda shard_dir=shard_dir, shard_opportunities=shard_opportunities: _build_shard(shard_dir, shard_opportunities, embed_model))
+
+    _run_parallel(tasks)
+    _write_manifest(snapshot_dir, documents)
+    return rebuilt
+
+
+def update_sharded_index(snapshot_dir: str, opportunities: Iterable, previous: Optional[IndexShards], embed_model: BaseEmbedding) -> List[str]:
+    """
+    Add opportunities to the shards of their departments, linking every other shard from the previous snapshot.
+
+    Returns:
+        List[str]: keys of the updated shards
+    """
+    if previous is not None and previous.legacy:
+        raise Exception("The index predates department shards, rebuild it before adding opportunities")
+
+    documents = {key: dict(shard_documents) for key, shard_documents in (previous.documents if previous else {}).items()}
+    added = group_by_shard(opportunities)
+
+    tasks = []
+    for key in documents:
+        if key not in added:
+            _link_shard(previous.shard_dir(key), os.path.join(snapshot_dir, "shards", key))
+    for key, shard_opportunities in added.items():
+        previous_dir = previous.shard_dir(key) if previous is not None and key in previous else None
+        documents.setdefault(key, {}).update({str(opp.id): document_hash(opp) for opp in shard_opportunities})
+        tasks.append(lambda key=key, shard_opportunities=shard_opportunities, previous_dir=previous_dir: _build_shard(
+            os.path.join(snapshot_dir, "shards", key), shard_opportunities, embed_model, previous_dir
+        ))
+
+    _run_parallel(tasks)
+    _write_manifest(snapshot_dir, documents)
+    return list(added)
+
+
+def _remove_from_shard(shard_dir: str, previous_dir: str, opportunity_ids: List[str], embed_model: BaseEmbedding):
+    """Copy a shard without the nodes of the given opportunities, nothing is re-embedded"""
+    index = load_index(previous_dir, embed_model=embed_model)
+    ref_doc_ids = [f"opportunity-{opportunity_id}" for opportunity_id in opportunity_ids]
+    node_ids = [
+        node_id for ref_doc_id in ref_doc_ids
+        for node_id in getattr(index.docstore.get_ref_doc_info(ref_doc_id), "node_ids", [])
+    ]
+
+    # One pass over the vectors and postings, rather than one per opportunity as delete_ref_doc would
+    index.vector_store.delete_nodes(node_ids)
+    for node_id in node_ids:
+        index.index_struct.delete(node_id)
+    for ref_doc_id in ref_doc_ids:
+        index.docstore.delete_ref_doc(ref_doc_id, raise_error=False)
+    save_index(index, shard_dir)
+
+    bm25_index = BM25Index.load(previous_dir)
+    bm25_index.remove_many(node_ids)
+    bm25_index.persist(shard_dir)
+
+
+def remove_from_sharded_index(snapshot_dir: str, opportunity_ids: Iterable[int], previous: IndexShards, embed_model: BaseEmbedding) -> List[str]:
+    """
+    Remove opportunities from the shards holding them, linking every other shard from the previous snapshot.
+
+    Shards left without opportunities are dropped.
+
+    Returns:
+        List[str]: keys of the shards opportunities were removed from
+    """
+    if previous.legacy:
+        raise Exception("The index predates department shards, rebuild it before removing opportunities")
+
+    removed_ids = {str(opportunity_id) for opportunity_id in opportunity_ids}
+    documents, tasks, changed = {}, [], []
+    for key, shard_documents in previous.documents.items():
+        removed = [opportunity_id for opportunity_id in shard_documents if opportunity_id in removed_ids]
+        shard_dir = os.path.join(snapshot_dir, "shards", key)
+        if not removed:
+            documents[key] = shard_documents
+            _link_shard(previous.shard_dir(key), shard_dir)
+            continue
+
+        changed.append(key)
+        remaining = {opportunity_id: digest for opportunity_id, digest in shard_documents.items() if opportunity_id not in removed_ids}
+        if remaining:
+            documents[key] = remaining
+            tasks.append(lambda shard_dir=shard_dir, key=key, removed=removed: _remove_from_shard(shard_dir, previous.shard_dir(key), removed, embed_model))
+
+    _run_parallel(tasks)
+    _write_manifest(snapshot_dir, documents)
+    return changed
@@ -0,0 +1,117 @@
+from typing import Iterable, List
+from llama_index.core import Settings
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Transcript tokens summarized per LLM call, longer conversations are split into chunks of this size
+SUMMARIZE_CHUNK_TOKENS = int(os.getenv("SUMMARIZE_CHUNK_TOKENS", "6000"))
+
+# Chunks summarized concurrently, and how many times notes are condensed again before the final summary
+SUMMARIZE_MAX_PARALLEL = int(os.getenv("SUMMARIZE_MAX_PARALLEL", "4"))
+SUMMARIZE_MAX_ROUNDS = int(os.getenv("SUMMARIZE_MAX_ROUNDS", "3"))
+
+OPPORTUNITY_SECTIONS = """
+    1. Engagement Name - Name the opportunity based on the goal of the engagement and the client
+    2. Engagement Summary - Explain in a few sentences on what the engagement is about and what will get done during it
+    3. Required Resources - List out all of the roles needed for the engagement and what skills are required for each role as well as
+    rank requirements. Also include a few sentence summary for each role about what they will be doing.
+    4. Estimated Start Date and Timeline
+
+    Return this result as a string that can be saved into a database to later be indexed or retrieved.
+"""
+
+SUMMARIZE_INSTRUCTIONS = """
+    The following message from the user will contain a series of messages from a prior conversation describing a potential engagement
+    opportunity. It is your job to summarize these messages into a format that will be stored as an opportunity. You will include the
+    following sections in the opportunity as you understand them from the conversation.
+""" + OPPORTUNITY_SECTIONS
+
+REDUCE_INSTRUCTIONS = """
+    The following message from the user will contain notes taken from consecutive parts of a prior conversation describing a potential
+    engagement opportunity. Later parts of the conversation take precedence when notes disagree. It is your job to combine these notes into
+    a format that will be stored as an opportunity. You will include the following sections in the opportunity as you understand them.
+""" + OPPORTUNITY_SECTIONS
+
+CHUNK_NOTES_INSTRUCTIONS = """
+    The following message from the user will contain one part of a longer conversation describing a potential engagement opportunity.
+    Write concise notes of every detail it gives about the engagement: the opportunity name and type, the client and goal, each role with
+    its rank, count and required skills, the start date, duration and timeline. Leave out greetings and anything unrelated. If the part
+    gives no such details, answer with "No details".
+"""
+
+
+def count_tokens(text: str) -> int:
+    return len(Settings.tokenizer(text))
+
+
+def _message_text(content) -> str:
+    if isinstance(content, str):
+        return content
+    # Content chunks, only text chunks carry conversation text
+    return " ".join(getattr(chunk, "text", "") for chunk in content or [] if getattr(chunk, "text", None))
+
+
+def serialize_chat_history(chat_history: Iterable) -> List[str]:
+    """
+    One "Role: text" line per user and assistant message, dropping system prompts and empty messages.
+
+    Args:
+        chat_history: mistralai messages
+
+    Returns:
+        List[str]: transcript lines
+    """
+    lines = []
+    for message in chat_history:
+        if message.role not in ("user", "assistant"):
+            continue
+        text = " ".join(_message_text(message.content).split())
+        if text:
+            lines.append(f"{message.role.capitalize()}: {text}")
+    return lines
+
+
+def _split_line(line: str, max_tokens: int) -> List[str]:
+    """Split a line longer than max_tokens at word boundaries"""
+    pieces, words, tokens = [], [], 0
+    for word in line.split(" "):
+        word_tokens = count_tokens(" " + word)
+        if words and tokens + word_tokens > max_tokens:
+            pieces.append(" ".join(words))
+            words, tokens = [], 0
+        words.append(word)
+        tokens += word_tokens
+    if words:
+        pieces.append(" ".join(words))
+    return pieces
+
+
+def chunk_lines(lines: List[str], max_tokens: int = SUMMARIZE_CHUNK_TOKENS) -> List[str]:
+    """
+    Group consecutive lines into chunks of at most max_tokens tokens.
+
+    Lines are never reordered, and a single line over the budget is split on its own.
+
+    Args:
+        lines: Transcript lines or notes
+        max_tokens: Token budget of each chunk
+
+    Returns:
+        List[str]: chunks, lines joined by newlines
+    """
+    chunks, current, current_tokens = [], [], 0
+    for line in lines:
+        line_tokens = count_tokens(line) + 1
+        pieces = [line] if line_tokens <= max_tokens else _split_line(line, max_tokens)
+        for piece in pieces:
+            piece_tokens = line_tokens if len(pieces) == 1 else count_tokens(piece) + 1
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
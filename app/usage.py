@@ -0,0 +1,189 @@
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+from fastapi import Request
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from app.admission import client_key
+from app.database import SessionLocal
+from app.models import LlmUsage
+import httpx
+import logging
+import os
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Records buffered in memory at most, new records are dropped while the buffer is full
+USAGE_BUFFER_MAX_RECORDS = int(os.getenv("USAGE_BUFFER_MAX_RECORDS", "10000"))
+
+# The buffer is flushed when it holds this many records, or this many seconds after the last flush
+USAGE_FLUSH_SIZE = int(os.getenv("USAGE_FLUSH_SIZE", "500"))
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "10"))
+
+# Mistral API paths whose responses carry token usage, by operation name
+USAGE_OPERATIONS = {
+    "/v1/chat/completions": "chat",
+    "/v1/embeddings": "embeddings",
+}
+
+# (caller, endpoint) of the request the current LLM call is made for
+usage_context: ContextVar[Optional[Tuple[str, str]]] = ContextVar("usage_context", default=None)
+
+
+@dataclass(slots=True)
+class UsageRecord:
+    user_key: Optional[str]
+    endpoint: Optional[str]
+    operation: str
+    model: Optional[str]
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    latency_ms: float
+    created_at: datetime
+
+
+class UsageBuffer:
+    """
+    Write-behind buffer of LLM usage records.
+
+    `record` only appends to memory. A background thread inserts the buffered
+    records in one batch when `flush_size` records are waiting or every
+    `flush_interval` seconds, and `stop` flushes what is left at shutdown.
+    At most `max_records` records are held, including batches waiting to be
+    retried after a failed insert.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        max_records: int = USAGE_BUFFER_MAX_RECORDS,
+        flush_size: int = USAGE_FLUSH_SIZE,
+        flush_interval: float = USAGE_FLUSH_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.max_records = max_records
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._records: List[UsageRecord] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def record(self, usage: UsageRecord):
+        with self._lock:
+            if len(self._records) >= self.max_records:
+                self.dropped += 1
+                return
+            self._records.append(usage)
+            if len(self._records) >= self.flush_size:
+                self._wake.set()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def flush(self) -> int:
+        """Insert every buffered record in one batch, returns the number of records written"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._records = self._records, []
+            if not batch:
+                return 0
+
+            db = self.session_factory()
+            try:
+                db.execute(insert(LlmUsage), [asdict(usage) for usage in batch])
+                db.commit()
+                return len(batch)
+            except Exception:
+                db.rollback()
+                logger.exception("Could not write %d usage records, keeping them for the next flush", len(batch))
+                with self._lock:
+                    room = max(self.max_records - len(self._records), 0)
+                    self.dropped += max(len(batch) - room, 0)
+                    self._records = batch[:room] + self._records
+                return 0
+            finally:
+                db.close()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and write the remaining records"""
+        if self._thread is not None:
+            self._stopping.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        if self.dropped:
+            logger.warning("Dropped %d usage records while the buffer was full", self.dropped)
+
+
+usage_buffer = UsageBuffer(SessionLocal)
+
+_request_started: "weakref.WeakKeyDictionary[httpx.Request, float]" = weakref.WeakKeyDictionary()
+
+
+def on_request(request: httpx.Request):
+    """httpx request hook stamping the start time of Mistral API calls"""
+    if request.url.path in USAGE_OPERATIONS:
+        _request_started[request] = time.perf_counter()
+
+
+def on_response(response: httpx.Response):
+    """httpx response hook buffering the token usage of successful Mistral API calls"""
+    operation = USAGE_OPERATIONS.get(response.request.url.path)
+    started = _request_started.pop(response.request, None)
+    if operation is None or started is None or response.status_code != 200:
+        return
+
+    response.read()
+    latency_ms = (time.perf_counter() - started) * 1000
+    try:
+        body = response.json()
+    except ValueError:
+        return
+    if not isinstance(body, dict):
+        return
+
+    usage = body.get("usage") or {}
+    user_key, endpoint = usage_context.get() or (None, None)
+    usage_buffer.record(UsageRecord(
+        user_key=user_key,
+        endpoint=endpoint,
+        operation=operation,
+        model=body.get("model"),
+        prompt_tokens=usage.get("prompt_tokens") or 0,
+        completion_tokens=usage.get("completion_tokens") or 0,
+        total_tokens=usage.get("total_tokens") or 0,
+        latency_ms=latency_ms,
+        created_at=datetime.now(timezone.utc),
+    ))
+
+
+async def track_usage(request: Request):
+    """
+    Dependency attributing the LLM calls made while handling the request to its caller and endpoint.
+
+    Async so the context is set on the request's own task and copied into the threadpool running the endpoint.
+    """
+    usage_context.set((client_key(request), request.url.path))
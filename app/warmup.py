@@ -0,0 +1,142 @@
+from typing import Callable, Dict, List, Optional
+from fastapi import FastAPI
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from app.auth import get_password_hash, verify_password
+from app.clients import AIClients
+from app.dao import DepartmentDAO, DesignationDAO, OptionDAO
+from app.index_store import snapshot_store
+import app.database as database
+import asyncio
+import httpx
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Database connections opened at startup, capped by the engine's pool size
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "5"))
+
+# Read-only paths requested once through the app before it reports ready
+WARMUP_PATHS = [path.strip() for path in os.getenv("WARMUP_PATHS", "/onboarding,/department,/opportunities").split(",") if path.strip()]
+
+# Delay before warm-up is retried after a required step failed
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "5"))
+
+
+class Readiness:
+    """Warm-up progress of one worker, reported by /ready"""
+
+    def __init__(self):
+        self.ready = False
+        self.steps: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    def run_step(self, name: str, step: Callable[[], object], required: bool = False) -> bool:
+        """Run one warm-up step, recording its duration in ms or its error"""
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning("Warm-up step %s failed: %s", name, e)
+            self.errors[name] = str(e)
+            return not required
+        self.errors.pop(name, None)
+        self.steps[name] = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    def report(self) -> dict:
+        return {"ready": self.ready, "steps": self.steps, "errors": self.errors}
+
+
+def open_pool(engine: Engine, size: int):
+    """Open `size` connections at once and return them to the pool so later requests reuse them"""
+    # Connections beyond the pool size are overflow and would be closed again on return
+    if isinstance(engine.pool, QueuePool):
+        size = min(size, engine.pool.size())
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+
+
+def open_database_pools():
+    open_pool(database.engine, DATABASE_POOL_MIN_SIZE)
+    for replica in database.replicas.engines:
+        open_pool(replica, DATABASE_POOL_MIN_SIZE)
+
+
+def load_reference_data():
+    db = database.SessionLocal()
+    try:
+        DepartmentDAO.list_departments(db)
+        DesignationDAO.list_designations(db)
+        OptionDAO.list_initial_options(db)
+    finally:
+        db.close()
+
+
+def warm_password_hashing():
+    verify_password("warm-up", get_password_hash("warm-up"))
+
+
+def load_opportunity_index(ai_clients: AIClients):
+    # Imported here so the llama-index import cost is also paid during warm-up
+    from app.service import AIService
+    if snapshot_store.current_dir() is not None:
+        ai_service = AIService(ai_clients)
+        shards = ai_service.load_current_shards()
+        for key in shards.keys():
+            shards.load(key, ai_clients.embed_model)
+
+
+def prewarm_resources(readiness: Readiness, ai_clients: Optional[AIClients]) -> bool:
+    """Blocking warm-up steps, returns False when a required step failed"""
+    ok = readiness.run_step("database_pool", open_database_pools, required=True)
+    ok = readiness.run_step("reference_data", load_reference_data, required=True) and ok
+    readiness.run_step("password_hashing", warm_password_hashing)
+    if ai_clients is not None:
+        readiness.run_step("opportunity_index", lambda: load_opportunity_index(ai_clients))
+    return ok
+
+
+async def warm_paths(app: FastAPI, paths: List[str]):
+    """Request each path once through the ASGI app, without going over the network"""
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://warmup") as client:
+        for path in paths:
+            response = await client.get(path)
+            if response.status_code >= 500:
+                raise Exception(f"GET {path} returned {response.status_code}")
+
+
+async def prewarm(app: FastAPI, readiness: Readiness, paths: List[str] = WARMUP_PATHS):
+    """
+    Warm the worker up, then mark it ready.
+
+    Runs after startup so /healthz answers immediately, while /ready reports
+    503 until the connection pool, reference data, password hashing, index
+    and every warm-up path have been exercised. Failed required steps are
+    retried every WARMUP_RETRY_SECONDS.
+    """
+    ai_clients = getattr(app.state, "ai_clients", None)
+    while not await asyncio.to_thread(prewarm_resources, readiness, ai_clients):
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+    started = time.perf_counter()
+    try:
+        await warm_paths(app, paths)
+        readiness.steps["warmup_requests"] = round((time.perf_counter() - started) * 1000, 1)
+    except Exception as e:
+        logger.warning("Warm-up requests failed: %s", e)
+        readiness.errors["warmup_requests"] = str(e)
+
+    readiness.ready = True
+    logger.info("Worker warmed up: %s", readiness.steps)
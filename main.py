@@ -1,19 +1,58 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from brotli_asgi import BrotliMiddleware
 from app.controller import router as auth_router
+from app.auth import shutdown_hash_pool
+from app.clients import build_ai_clients
+from app.resilience import CircuitOpenError
+from app.matching import match_updater
+from app.service import MatchService
+from app.usage import usage_buffer
+from app.warmup import Readiness, prewarm
 from app.models import Base
 from app.database import engine
+import asyncio
+import math
+import os
 
 # Create tables in the database
 Base.metadata.create_all(bind=engine)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared LLM and embedding clients, reused across requests
+    app.state.ai_clients = build_ai_clients()
+    # Usage records are written in batches by a background thread, and flushed on shutdown
+    usage_buffer.start()
+    # Registrations, opportunity saves and archival update the stored matches from a background thread
+    if app.state.ai_clients is not None:
+        MatchService.start_background_updates(app.state.ai_clients)
+    # Pool, reference data, index and hot paths are warmed in the background, /ready reports when done
+    app.state.readiness = Readiness()
+    warmup = asyncio.create_task(prewarm(app, app.state.readiness))
+    yield
+    warmup.cancel()
+    match_updater.stop()
+    if app.state.ai_clients is not None:
+        app.state.ai_clients.close()
+    usage_buffer.stop()
+    shutdown_hash_pool()
+
 # Initialize FastAPI application
 app = FastAPI(
     title="AI Opporturniy Holder App",
     description="API for user registration and authentication",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Compress responses above this many bytes, brotli when accepted, gzip otherwise
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.getenv("RESPONSE_COMPRESSION_MIN_SIZE", "1024"))
+app.add_middleware(BrotliMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE, gzip_fallback=True)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -26,10 +65,30 @@ app.add_middleware(
 # Include routers
 app.include_router(auth_router)
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open(request: Request, exc: CircuitOpenError):
+    """The model provider is failing, answer right away instead of waiting on it"""
+    return ORJSONResponse(
+        {"detail": "The AI service is temporarily unavailable, please retry later"},
+        status_code=503,
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
 @app.get("/")
 async def root():
     return {"message": "Opportunity Collector App is running"}
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness, the process is up and serving"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready(request: Request):
+    """Readiness, 503 until this worker finished warming up"""
+    readiness = request.app.state.readiness
+    return ORJSONResponse(readiness.report(), status_code=200 if readiness.ready else 503)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -4,6 +4,12 @@ DROP SCHEMA IF EXISTS bench_management CASCADE;
 -- Create the schema
 CREATE SCHEMA IF NOT EXISTS bench_management;
 
+-- Drop 'opportunity_match' table if it exists
+DROP TABLE IF EXISTS opportunity_match;
+
+-- Drop 'llm_usage' table if it exists
+DROP TABLE IF EXISTS llm_usage;
+
 -- Drop 'users' table if it exists
 DROP TABLE IF EXISTS users;
 
@@ -13,6 +19,9 @@ DROP TABLE IF EXISTS message;
 -- Drop 'conversation' table if it exists
 DROP TABLE IF EXISTS conversation;
 
+-- Drop 'opportunity_archive' table if it exists
+DROP TABLE IF EXISTS opportunity_archive;
+
 -- Drop 'opportunity' table if it exists
 DROP TABLE IF EXISTS opportunity;
 
@@ -54,6 +63,7 @@ CREATE TABLE IF NOT EXISTS users (
     password VARCHAR(255) NOT NULL,
     department_id INT REFERENCES department(id),
     designation_id INT REFERENCES designation(id),
+    skills TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -84,11 +94,66 @@ CREATE TABLE IF NOT EXISTS opportunity (
     details TEXT NOT NULL,
     department_id INT REFERENCES department(id),
     user_id INT references users(id),
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    duplicate_of INT REFERENCES opportunity(id),
+    closed_at TIMESTAMP
 );
 
 
 
+-- Create the opportunity_archive table within the schema
+-- Expired and closed opportunities moved out of the opportunity table by the retention job
+CREATE TABLE IF NOT EXISTS opportunity_archive (
+    id INT PRIMARY KEY,
+    details TEXT NOT NULL,
+    department_id INT,
+    user_id INT,
+    created_at TIMESTAMP NOT NULL,
+    closed_at TIMESTAMP,
+    duplicate_of INT,
+    archive_reason VARCHAR(20) NOT NULL,
+    archived_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_opportunity_archive_department ON opportunity_archive(department_id);
+CREATE INDEX IF NOT EXISTS idx_opportunity_archive_archived_at ON opportunity_archive(archived_at);
+
+
+
+-- Create the opportunity_match table within the schema
+-- Precomputed top-k staff/opportunity pairs from the matching engine
+CREATE TABLE IF NOT EXISTS opportunity_match (
+    user_id INT REFERENCES users(id),
+    opportunity_id INT REFERENCES opportunity(id),
+    score REAL NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, opportunity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_opportunity_match_opportunity ON opportunity_match(opportunity_id);
+
+
+
+-- Create the llm_usage table within the schema
+-- Token usage and latency of each LLM and embedding call, written in batches
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id SERIAL PRIMARY KEY,
+    user_key VARCHAR(100),
+    endpoint VARCHAR(100),
+    operation VARCHAR(50) NOT NULL,
+    model VARCHAR(100),
+    prompt_tokens INT NOT NULL DEFAULT 0,
+    completion_tokens INT NOT NULL DEFAULT 0,
+    total_tokens INT NOT NULL DEFAULT 0,
+    latency_ms REAL NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_usage_user_key ON llm_usage(user_key);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage(created_at);
+
+
+
 -- Create the option table within the schema
 CREATE TABLE IF NOT EXISTS option (
     id SERIAL PRIMARY KEY,
@@ -0,0 +1,87 @@
+"""
+Benchmark comparing llama-index's default JSON persistence with the compact index format
+
+Builds an index of synthetic opportunities with random embeddings, persists it in
+each format and reports size on disk, load time and the time of a first query.
+
+Usage: python scripts/benchmark_index_format.py [documents] [dimensions]
+"""
+import os
+import sys
+import tempfile
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from llama_index.core import Document, StorageContext, VectorStoreIndex, load_index_from_storage
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from app.index_format import load_index, save_index
+
+class RandomEmbedding(BaseEmbedding):
+    """Random embedding seeded by the text, so repeated texts embed identically"""
+
+    dimensions: int = 1024
+
+    def _embed(self, text: str) -> List[float]:
+        return np.random.default_rng(abs(hash(text))).standard_normal(self.dimensions).astype(np.float32).tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+def load_default(path, embed_model):
+    return load_index_from_storage(StorageContext.from_defaults(persist_dir=path), embed_model=embed_model)
+
+if __name__ == "__main__":
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dimensions = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+    embed_model = RandomEmbedding(dimensions=dimensions)
+
+    index = VectorStoreIndex.from_documents(
+        [
+            Document(
+                text=f"Engagement Name: Opportunity {i}\nEngagement Summary: " + "Migration and delivery work. " * 40,
+                id_=f"opportunity-{i}",
+                metadata={"opportunity_id": i, "department_id": i % 8},
+            )
+            for i in range(documents)
+        ],
+        embed_model=embed_model,
+    )
+
+    with tempfile.TemporaryDirectory() as root:
+        formats = {
+            "json": (lambda path: index.storage_context.persist(persist_dir=path), load_default),
+            "compact": (lambda path: save_index(index, path, compression="none"), load_index),
+            "compact+zstd": (lambda path: save_index(index, path, compression="zstd"), load_index),
+        }
+
+        print(f"{documents} documents, {dimensions} dimensions")
+        for name, (save, load) in formats.items():
+            path = os.path.join(root, name)
+            started = time.perf_counter()
+            save(path)
+            save_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            loaded = load(path, embed_model)
+            load_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            loaded.as_retriever(similarity_top_k=10).retrieve("Opportunity 42")
+            query_ms = (time.perf_counter() - started) * 1000
+
+            print(
+                f"{name:>14}: {directory_size(path) / 1e6:8.1f} MB"
+                f"  save {save_ms:8.1f} ms  load {load_ms:8.1f} ms  first query {query_ms:7.1f} ms"
+            )
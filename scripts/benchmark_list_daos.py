@@ -0,0 +1,51 @@
+"""
+Micro-benchmark comparing full ORM hydration with the column-projected list DAOs
+
+Runs against an in-memory SQLite database, or DATABASE_URL when --database is passed.
+
+Usage: python scripts/benchmark_list_daos.py [rows] [--database]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.dao import OpportunityDAO, OpportunityDTO
+from app.models import Base, Opportunity
+
+def orm_opportunities(db):
+    """Previous read path: hydrate ORM objects, then copy them into DTOs"""
+    opportunities = db.query(Opportunity).all()
+    return [OpportunityDTO(opp.id, opp.details, opp.department_id, opp.user_id, opp.created_at) for opp in opportunities]
+
+def projected_opportunities(db):
+    return OpportunityDAO.get_all_opportunities(db)
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 20000
+    use_database = "--database" in sys.argv
+
+    if use_database:
+        engine = create_engine(os.environ["DATABASE_URL"])
+    else:
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(bind=engine)
+        with sessionmaker(bind=engine)() as db:
+            db.add_all(Opportunity(details=f"Engagement {i}: " + "details " * 50, department_id=1) for i in range(rows))
+            db.commit()
+
+    SessionLocal = sessionmaker(bind=engine)
+
+    def run(read):
+        db = SessionLocal()
+        try:
+            read(db)
+        finally:
+            db.close()
+
+    for name, read in [("orm", orm_opportunities), ("projected", projected_opportunities)]:
+        timings = timeit.repeat(lambda: run(read), number=5, repeat=3)
+        print(f"{name:>10}: {min(timings) / 5 * 1000:.1f} ms per call")
@@ -2,6 +2,7 @@
 Utility script to generate bcrypt password hashes for sample data
 """
 from passlib.context import CryptContext
+from concurrent.futures import ProcessPoolExecutor
 import sys
 
 # Password hashing
@@ -13,11 +14,15 @@ def get_password_hash(password):
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
-        password = sys.argv[1]
+        passwords = sys.argv[1:]
     else:
-        password = "password123"  # Default password
-    
-    hashed_password = get_password_hash(password)
-    print(f"Password: {password}")
-    print(f"Hashed: {hashed_password}")
-    print(f"SQL-ready: '{hashed_password}'")
\ No newline at end of file
+        passwords = ["password123"]  # Default password
+
+    # Hash several passwords in parallel across CPU cores
+    with ProcessPoolExecutor() as executor:
+        hashed_passwords = list(executor.map(get_password_hash, passwords))
+
+    for password, hashed_password in zip(passwords, hashed_passwords):
+        print(f"Password: {password}")
+        print(f"Hashed: {hashed_password}")
+        print(f"SQL-ready: '{hashed_password}'")
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Utility script to bulk provision users from a CSV or JSONL file
+
+Each row needs first_name, last_name, email, password, department_id and designation_id.
+
+Usage: python scripts/provision_users.py users.csv
+"""
+import csv
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.service import UserService
+
+def read_rows(path):
+    """Read raw rows from a CSV or JSONL file"""
+    with open(path, newline="") as f:
+        if path.lower().endswith(".csv"):
+            return list(csv.DictReader(f))
+        return [json.loads(line) for line in f if line.strip()]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/provision_users.py <users.csv|users.jsonl>")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        result = UserService.bulk_register_users(db, read_rows(sys.argv[1]))
+    finally:
+        db.close()
+
+    print(f"Created: {result.created}")
+    print(f"Failed: {result.failed}")
+    for error in result.errors:
+        print(f"  row {error.row}: {error.error}")
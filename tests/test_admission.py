@@ -0,0 +1,62 @@
+import threading
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+def test_user_bucket_rejects_after_burst():
+    """Test a user over their burst is rejected while other users are admitted"""
+    controller = AdmissionController(user_rate=0.01, user_burst=1, global_rate=100, global_burst=100)
+
+    controller.acquire("user:1")
+    controller.release()
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("user:1")
+    assert excinfo.value.reason == "user_rate"
+    assert excinfo.value.retry_after > 1
+
+    controller.acquire("user:2")
+    controller.release()
+    assert controller.stats()["rejected"]["user_rate"] == 1
+
+def test_global_bucket_limits_all_users():
+    """Test the global bucket caps requests across users"""
+    controller = AdmissionController(user_rate=100, user_burst=100, global_rate=0.01, global_burst=1)
+    controller.acquire("user:1")
+    controller.release()
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("user:2")
+    assert excinfo.value.reason == "global_rate"
+
+def test_concurrency_limit_queues_then_times_out():
+    """Test requests beyond the concurrency limit wait, then fail when the queue is full or times out"""
+    controller = AdmissionController(
+        user_rate=100, user_burst=100, global_rate=100, global_burst=100,
+        max_concurrency=1, max_queue=1, queue_timeout=0.2
+    )
+    controller.acquire("user:1")
+
+    errors = []
+    def waiting_request():
+        try:
+            controller.acquire("user:2")
+        except AdmissionRejected as e:
+            errors.append(e.reason)
+
+    waiter = threading.Thread(target=waiting_request)
+    waiter.start()
+    while controller.stats()["queued"] == 0:
+        pass
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("user:3")
+    assert excinfo.value.reason == "queue_full"
+
+    waiter.join()
+    assert errors == ["queue_timeout"]
+
+    controller.release()
+    controller.acquire("user:4")
+    controller.release()
+    assert controller.stats()["in_flight"] == 0
@@ -0,0 +1,101 @@
+import io
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.dao import OpportunityDAO
+from app.models import Opportunity
+from app.service import CreateIndexResponse, OpportunityService, parse_opportunity_rows
+
+# Create in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """Session on freshly created tables"""
+    Opportunity.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Opportunity.metadata.drop_all(bind=engine)
+
+class FakeAIService:
+    def __init__(self):
+        self.indexed = []
+
+    def index_opportunities(self, opportunities):
+        self.indexed.extend(opportunities)
+        return CreateIndexResponse(success=True, message=f"Indexed {len(opportunities)} opportunities")
+
+def test_parse_jsonl_rows_reports_bad_rows():
+    """Test JSONL parsing yields valid rows and per-row errors"""
+    stream = io.StringIO(
+        '{"details": "SAP migration", "department_id": 1}\n'
+        '\n'
+        '{"department_id": 1}\n'
+        'not json\n'
+        '{"details": "Java work", "user_id": "x"}\n'
+    )
+    rows = list(parse_opportunity_rows(stream, "jsonl"))
+
+    assert rows[0] == (1, {"details": "SAP migration", "department_id": 1, "user_id": None}, None)
+    assert [(row_number, error is not None) for row_number, _, error in rows[1:]] == [(3, True), (4, True), (5, True)]
+
+def test_parse_csv_rows():
+    """Test CSV parsing treats empty ids as null"""
+    stream = io.StringIO('details,department_id,user_id\n"Salesforce, Apex",2,\n')
+    rows = list(parse_opportunity_rows(stream, "csv"))
+    assert rows == [(1, {"details": "Salesforce, Apex", "department_id": 2, "user_id": None}, None)]
+
+def test_bulk_ingest_inserts_in_batches_and_indexes(db_session, monkeypatch):
+    """Test bulk ingest inserts valid rows across batches and indexes them"""
+    monkeypatch.setattr("app.service.BULK_INGEST_BATCH_SIZE", 2)
+    stream = io.StringIO("".join(f'{{"details": "Opportunity {i}"}}\n' for i in range(5)) + '{"details": ""}\n')
+    ai_service = FakeAIService()
+
+    result = OpportunityService.bulk_ingest(db_session, stream, "jsonl", ai_service)
+
+    assert result.inserted == 5
+    assert result.failed == 1
+    assert result.errors[0].row == 6
+    assert result.indexed
+    assert [opp.details for opp in ai_service.indexed] == [f"Opportunity {i}" for i in range(5)]
+    assert db_session.query(Opportunity).count() == 5
+
+def test_bulk_add_returns_only_its_own_rows(db_session):
+    """Test the rows returned for indexing are exactly the batch, not other rows in the table"""
+    db_session.add_all([Opportunity(details="existing 1"), Opportunity(details="existing 2")])
+    db_session.commit()
+
+    inserted = OpportunityDAO.bulk_add_opportunities(db_session, [{"details": "new A"}, {"details": "new B", "department_id": 3}])
+
+    assert [(opp.details, opp.department_id) for opp in inserted] == [("new A", None), ("new B", 3)]
+    assert db_session.query(Opportunity).count() == 4
+
+def test_bulk_ingest_does_not_reload_inserted_rows(db_session, monkeypatch):
+    """Test each batch costs one INSERT and indexing the inserted rows issues no further queries"""
+    monkeypatch.setattr("app.service.BULK_INGEST_BATCH_SIZE", 50)
+    stream = io.StringIO("".join(f'{{"details": "Opportunity {i}", "department_id": {i % 3}}}\n' for i in range(200)))
+    ai_service = FakeAIService()
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        result = OpportunityService.bulk_ingest(db_session, stream, "jsonl", ai_service)
+        indexed = [(opp.id, opp.details, opp.department_id, opp.user_id, opp.created_at) for opp in ai_service.indexed]
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert result.inserted == 200 and len(indexed) == 200
+    assert [statement.split()[0] for statement in statements] == ["INSERT"] * 4
+    assert indexed[-1][1:3] == ("Opportunity 199", 1) and indexed[-1][4] is not None
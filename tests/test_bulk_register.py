@@ -0,0 +1,110 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models import Base, Department, Designation, User
+from app.auth import create_access_token, verify_password
+from app.controller import router
+from app.database import get_db
+from app.service import UserCreate, UserService
+
+# Create in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """Session with one department and designation loaded"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    db.add_all([
+        Department(id=1, name="Digital Engineering"),
+        Department(id=2, name="AI & Data"),
+        Designation(id=1, department_id=1, title="Staff"),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def make_user(email, department_id=1, designation_id=1):
+    return UserCreate(
+        first_name="Bulk",
+        last_name="User",
+        email=email,
+        password="bulkpassword",
+        department_id=department_id,
+        designation_id=designation_id
+    )
+
+def test_bulk_register_users_reports_invalid_rows(db_session, monkeypatch):
+    """Test valid users are saved across batches and invalid rows are reported"""
+    monkeypatch.setattr("app.service.BULK_REGISTER_BATCH_SIZE", 2)
+    users = [make_user(f"bulk{i}@example.com") for i in range(5)] + [
+        make_user("bulk0@example.com"),
+        make_user("bad.department@example.com", department_id=9),
+        make_user("bad.designation@example.com", designation_id=9),
+        make_user("wrong.department@example.com", department_id=2),
+    ]
+
+    result = UserService.bulk_register_users(db_session, users)
+
+    assert result.created == 5
+    assert [user.email for user in result.users] == [f"bulk{i}@example.com" for i in range(5)]
+    assert result.users[0].department == "Digital Engineering"
+    assert result.users[0].designation == "Staff"
+    assert [error.row for error in result.errors] == [6, 7, 8, 9]
+
+    saved = db_session.query(User).filter(User.email == "bulk3@example.com").first()
+    assert verify_password("bulkpassword", saved.password)
+
+def test_bulk_register_users_skips_existing_email(db_session):
+    """Test an already registered email is reported without failing the rest"""
+    UserService.bulk_register_users(db_session, [make_user("existing@example.com")])
+    result = UserService.bulk_register_users(db_session, [make_user("existing@example.com"), make_user("new@example.com")])
+
+    assert result.created == 1
+    assert result.errors[0].row == 1
+    assert result.errors[0].error == "Email already registered"
+
+def test_bulk_register_users_validates_raw_rows(db_session):
+    """Test malformed raw rows are reported per row while the valid ones are saved"""
+    rows = [
+        make_user("raw@example.com").dict(),
+        {**make_user("placeholder@example.com").dict(), "email": "not an email"},
+        {"first_name": "Missing", "email": "missing@example.com"},
+        "not an object",
+    ]
+    result = UserService.bulk_register_users(db_session, rows)
+
+    assert result.created == 1 and result.failed == 3
+    assert [error.row for error in result.errors] == [2, 3, 4]
+    assert result.errors[1].error.startswith("last_name: Field required")
+
+def test_bulk_register_endpoint_requires_auth_and_caps_rows(db_session, monkeypatch):
+    """Test the endpoint rejects anonymous callers and oversized batches, and reports bad rows per row"""
+    monkeypatch.setattr("app.controller.BULK_REGISTER_MAX_ROWS", 2)
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: db_session
+    client = TestClient(app)
+
+    admin = UserService.bulk_register_users(db_session, [make_user("admin@example.com")]).users[0]
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(admin.id)})}"}
+
+    assert client.post("/register/bulk", json=[]).status_code == 401
+    assert client.post("/register/bulk", json=[{}] * 3, headers=headers).status_code == 413
+
+    response = client.post("/register/bulk", json=[make_user("ok@example.com").dict(), {"email": "bad"}], headers=headers)
+    assert response.status_code == 200
+    assert response.json()["created"] == 1 and [error["row"] for error in response.json()["errors"]] == [2]
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.dao import (
+    DepartmentDAO, DepartmentDTO, DesignationDAO, DesignationDTO, OpportunityDAO, OpportunityDTO,
+    OptionDAO, OptionDTO, QueryDAO, QueryDTO,
+)
+from app.models import Base, Department, Designation, Opportunity, Option, Query
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """Reference data for two departments, onboarding options and one flagged duplicate"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    db.add_all([Department(id=1, name="Technology"), Department(id=2, name="Finance")])
+    db.add_all([
+        Designation(id=1, department_id=1, title="Analyst"),
+        Designation(id=2, department_id=1, title="Manager"),
+        Designation(id=3, department_id=2, title="Consultant"),
+    ])
+    db.add_all([Option(id=1, initial_option="Find work"), Option(id=2, initial_option="Staff an engagement")])
+    db.add_all([
+        Query(option_id=1, ask="What is your rank?", order_num=2),
+        Query(option_id=1, ask="What are your skills?", order_num=1),
+        Query(option_id=2, ask="Which engagement?", order_num=1),
+    ])
+    db.add_all([
+        Opportunity(id=1, details="SAP FICO migration", department_id=2, user_id=7),
+        Opportunity(id=2, details="Java platform rebuild"),
+        Opportunity(id=3, details="SAP FICO migration, reposted", department_id=2, user_id=8, duplicate_of=1),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def test_list_initial_options(db_session):
+    """Test options are projected into OptionDTOs"""
+    options = OptionDAO.list_initial_options(db_session)
+    assert sorted(options, key=lambda option: option.id) == [OptionDTO(1, "Find work"), OptionDTO(2, "Staff an engagement")]
+
+def test_list_queries_per_option(db_session):
+    """Test only the option's queries are projected into QueryDTOs"""
+    queries = QueryDAO.list_queries_per_option(1, db_session)
+    assert sorted(queries, key=lambda query: query.order_num) == [
+        QueryDTO(1, "What are your skills?", 1),
+        QueryDTO(1, "What is your rank?", 2),
+    ]
+    assert QueryDAO.list_queries_per_option(3, db_session) == []
+
+def test_get_all_opportunities(db_session):
+    """Test every column of OpportunityDTO is filled, and duplicates can be left out"""
+    opportunities = sorted(OpportunityDAO.get_all_opportunities(db_session), key=lambda opportunity: opportunity.id)
+
+    assert all(isinstance(opportunity, OpportunityDTO) for opportunity in opportunities)
+    assert [(opp.id, opp.details, opp.department_id, opp.user_id, opp.duplicate_of) for opp in opportunities] == [
+        (1, "SAP FICO migration", 2, 7, None),
+        (2, "Java platform rebuild", None, None, None),
+        (3, "SAP FICO migration, reposted", 2, 8, 1),
+    ]
+    assert all(opportunity.created_at is not None for opportunity in opportunities)
+    assert sorted(opp.id for opp in OpportunityDAO.get_all_opportunities(db_session, include_duplicates=False)) == [1, 2]
+
+def test_list_departments_and_designations(db_session):
+    """Test departments and designations are projected into their DTOs"""
+    assert sorted(DepartmentDAO.list_departments(db_session), key=lambda dept: dept.id) == [
+        DepartmentDTO(1, "Technology"),
+        DepartmentDTO(2, "Finance"),
+    ]
+    assert sorted(DesignationDAO.list_designations(db_session), key=lambda desig: desig.id) == [
+        DesignationDTO(1, 1, "Analyst"),
+        DesignationDTO(2, 1, "Manager"),
+        DesignationDTO(3, 2, "Consultant"),
+    ]
+    assert sorted(DesignationDAO.list_designations_per_department(1, db_session), key=lambda desig: desig.id) == [
+        DesignationDTO(1, 1, "Analyst"),
+        DesignationDTO(2, 1, "Manager"),
+    ]
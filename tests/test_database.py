@@ -0,0 +1,101 @@
+import time
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+import app.database as database
+from app.database import LAST_WRITE_COOKIE, ReplicaPool, SessionLocal, get_db, read_from_primary
+from app.models import Base, Option
+
+def make_engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+@pytest.fixture
+def routing(monkeypatch):
+    """Primary and two replicas, each holding a differently named option"""
+    primary, replica_a, replica_b = make_engine(), make_engine(), make_engine()
+    for engine, name in [(primary, "primary"), (replica_a, "replica_a"), (replica_b, "replica_b")]:
+        with engine.begin() as connection:
+            connection.execute(Option.__table__.insert(), {"initial_option": name})
+
+    monkeypatch.setattr(database, "engine", primary)
+    monkeypatch.setattr(database, "replicas", ReplicaPool([replica_a, replica_b]))
+    return primary, replica_a, replica_b
+
+def read_option_names(session):
+    return [option.initial_option for option in session.query(Option).filter(Option.id == 1)]
+
+def test_sessions_round_robin_and_stay_on_one_replica(routing):
+    """Test each session reads from one replica for its lifetime, and sessions alternate between replicas"""
+    names = set()
+    for _ in range(4):
+        db = SessionLocal()
+        session_names = {read_option_names(db)[0] for _ in range(3)}
+        db.close()
+        assert len(session_names) == 1
+        names |= session_names
+    assert names == {"replica_a", "replica_b"}
+
+def test_reads_skip_replica_marked_down(routing):
+    """Test a replica marked down stops receiving reads"""
+    _, replica_a, _ = routing
+    database.replicas.mark_down(replica_a)
+
+    for _ in range(4):
+        db = SessionLocal()
+        assert read_option_names(db) == ["replica_b"]
+        db.close()
+
+def test_reads_before_a_write_can_be_sent_to_the_primary(routing):
+    """Test a session reads from the primary once it wrote or asked for it"""
+    db = SessionLocal()
+    read_from_primary(db)
+    assert read_option_names(db) == ["primary"]
+    db.close()
+
+    db = SessionLocal()
+    db.add(Option(initial_option="new option"))
+    db.commit()
+    assert read_option_names(db) == ["primary"]
+    db.close()
+
+def test_text_statements_go_to_the_primary(routing):
+    """Test a raw text write reaches the primary, and reading the configured dialect does not pin the session there"""
+    db = SessionLocal()
+    db.bind.dialect.name
+    assert read_option_names(db)[0].startswith("replica")
+    db.execute(text("INSERT INTO option (initial_option) VALUES ('raw')"))
+    db.commit()
+    assert read_option_names(db) == ["primary"]
+    db.close()
+
+    primary, _, _ = routing
+    with primary.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM option")).scalar() == 2
+
+def test_write_cookie_keeps_the_client_on_the_primary(routing):
+    """Test a client's requests read from the primary while its last write cookie is fresh, on any worker"""
+    app = FastAPI()
+
+    @app.post("/options")
+    def add_option(db: Session = Depends(get_db)):
+        db.add(Option(initial_option="new option"))
+        db.commit()
+        return {}
+
+    @app.get("/options/1")
+    def read_option(db: Session = Depends(get_db)):
+        return read_option_names(db)
+
+    writer, reader = TestClient(app), TestClient(app)
+    assert writer.post("/options").cookies.get(LAST_WRITE_COOKIE)
+    assert writer.get("/options/1").json() == ["primary"]
+    assert reader.get("/options/1").json()[0].startswith("replica")
+
+    writer.cookies.set(LAST_WRITE_COOKIE, str(time.time() - database.READ_YOUR_WRITES_SECONDS - 1))
+    assert writer.get("/options/1").json()[0].startswith("replica")
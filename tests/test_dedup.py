@@ -0,0 +1,82 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.dedup import DuplicateIndex
+from app.models import Base, Opportunity
+import app.service as service
+from app.service import OpportunityService
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+SAP = """Engagement Name: SAP S/4HANA finance migration for a retail client
+Engagement Summary: Move the client's finance processes from ECC to S/4HANA over two releases, covering general ledger, payables and reporting.
+Required Resources: 2 Senior consultants with SAP FICO skills, 1 Manager with migration delivery experience, 3 Staff for data validation.
+Estimated Start Date and Timeline: 06/15/2025, 24 weeks"""
+
+SAP_RETRY = SAP.replace("over two releases", "in two releases")
+
+SALESFORCE = """Engagement Name: Salesforce service cloud rollout for an insurer
+Engagement Summary: Configure case management and customer portals, integrate with the policy system.
+Required Resources: 3 Staff with Salesforce and Apex experience, 1 Senior architect.
+Estimated Start Date and Timeline: 09/01/2025, 16 weeks"""
+
+@pytest.fixture
+def db_session(monkeypatch):
+    """Session on freshly created tables and an empty duplicate index"""
+    monkeypatch.setattr("app.service.duplicate_index", DuplicateIndex(threshold=0.7))
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def test_duplicate_index_finds_near_duplicates_only():
+    """Test a lightly edited opportunity is found and an unrelated one is not"""
+    index = DuplicateIndex(threshold=0.7)
+    index.add(1, SAP)
+    index.add(2, SALESFORCE)
+
+    duplicate_id, similarity = index.find(SAP_RETRY)
+    assert duplicate_id == 1 and similarity >= 0.7
+    assert index.find("Engagement Name: Java platform build for a bank") is None
+
+    index.remove(1)
+    assert index.find(SAP_RETRY) is None
+
+def test_add_opportunity_merges_duplicates(db_session):
+    """Test a near-duplicate is not saved and the existing opportunity is returned"""
+    original, duplicate_of = OpportunityService.add_opportunity(db_session, {"details": SAP, "department_id": None, "user_id": None})
+    assert duplicate_of is None
+
+    merged, duplicate_of = OpportunityService.add_opportunity(db_session, {"details": SAP_RETRY, "department_id": None, "user_id": None}, policy="merge")
+    assert merged.id == original.id and duplicate_of == original.id
+    assert db_session.query(Opportunity).count() == 1
+
+def test_add_opportunity_flags_duplicates_written_elsewhere(db_session):
+    """Test opportunities saved by another worker are caught up before checking, and duplicates are flagged"""
+    db_session.add(Opportunity(details=SAP))
+    db_session.commit()
+
+    flagged, duplicate_of = OpportunityService.add_opportunity(db_session, {"details": SAP_RETRY}, policy="flag")
+    assert flagged.duplicate_of == duplicate_of == 1
+
+    unique, duplicate_of = OpportunityService.add_opportunity(db_session, {"details": SALESFORCE}, policy="flag")
+    assert duplicate_of is None
+    assert db_session.query(Opportunity).count() == 3
+
+def test_add_opportunity_skips_candidates_archived_elsewhere(db_session):
+    """Test a candidate deleted by another worker is dropped from the index instead of being referenced"""
+    db_session.add(Opportunity(id=50, details=SAP))
+    db_session.commit()
+    OpportunityService.add_opportunity(db_session, {"details": SALESFORCE}, policy="flag")
+    db_session.query(Opportunity).filter(Opportunity.id == 50).delete()
+    db_session.commit()
+
+    saved, duplicate_of = OpportunityService.add_opportunity(db_session, {"details": SAP_RETRY}, policy="flag")
+    assert duplicate_of is None and saved.duplicate_of is None
+    assert 50 not in service.duplicate_index.signatures
@@ -0,0 +1,75 @@
+import os
+from typing import List
+import pytest
+from llama_index.core import Document, VectorStoreIndex
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import QueryBundle
+
+from app.index_format import LazyNodeMapping, load_index, save_index
+from app.retrieval import BM25Index, HybridRetriever, OpportunityFilter
+
+class LetterEmbedding(BaseEmbedding):
+    """Deterministic embedding counting letters, so similar words score close"""
+
+    def _embed(self, text: str) -> List[float]:
+        return [float(text.lower().count(letter)) + 0.01 for letter in "abcdefghijklmnopqrstuvwxyz"]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._embed(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed(text)
+
+def build_documents():
+    texts = ["SAP FICO migration", "Salesforce Apex rollout", "Java Spring Boot asset", "Kubernetes platform build"]
+    return [
+        Document(text=text, id_=f"opportunity-{i}", metadata={"department_id": i % 2})
+        for i, text in enumerate(texts)
+    ]
+
+def retrieved_ids(index, query):
+    return [hit.node.node_id for hit in index.as_retriever(similarity_top_k=2).retrieve(query)]
+
+@pytest.mark.parametrize("compression", ["zstd", "none"])
+def test_compact_round_trip_matches_default_index(tmp_path, compression):
+    """Test a reloaded compact index retrieves the same nodes without decoding them up front"""
+    embed_model = LetterEmbedding()
+    index = VectorStoreIndex.from_documents(build_documents(), embed_model=embed_model)
+    save_index(index, str(tmp_path), compression=compression)
+
+    loaded = load_index(str(tmp_path), embed_model=embed_model)
+    nodes = loaded.docstore._kvstore._collections_mappings[loaded.docstore._node_collection]
+    assert isinstance(nodes, LazyNodeMapping)
+    assert not nodes._decoded
+    assert not os.path.exists(tmp_path / "docstore.json")
+
+    for query in ["salesforce", "spring java"]:
+        assert retrieved_ids(loaded, query) == retrieved_ids(index, query)
+
+def test_insert_into_loaded_index_and_save_again(tmp_path):
+    """Test nodes inserted into a loaded index are persisted alongside the copied records"""
+    embed_model = LetterEmbedding()
+    documents = build_documents()
+    save_index(VectorStoreIndex.from_documents(documents[:3], embed_model=embed_model), str(tmp_path / "v1"))
+
+    index = load_index(str(tmp_path / "v1"), embed_model=embed_model)
+    index.insert(documents[3])
+    save_index(index, str(tmp_path / "v2"))
+
+    reloaded = load_index(str(tmp_path / "v2"), embed_model=embed_model)
+    assert len(reloaded.docstore.docs) == 4
+    assert retrieved_ids(reloaded, "kubernetes platform")[0] in reloaded.docstore.get_ref_doc_info("opportunity-3").node_ids
+
+def test_hybrid_retriever_filters_loaded_index(tmp_path):
+    """Test the department filter applies to a compact index"""
+    embed_model = LetterEmbedding()
+    save_index(VectorStoreIndex.from_documents(build_documents(), embed_model=embed_model), str(tmp_path))
+    index = load_index(str(tmp_path), embed_model=embed_model)
+
+    retriever = HybridRetriever(index, BM25Index(), top_k=4, opportunity_filter=OpportunityFilter(department_id=1))
+    hits = retriever.retrieve(QueryBundle("salesforce"))
+    assert hits
+    assert all(hit.node.metadata["department_id"] == 1 for hit in hits)
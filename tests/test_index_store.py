@@ -0,0 +1,58 @@
+import os
+import pytest
+
+from app.index_store import SUPERSEDED_MARKER_FILE, IndexBuildInProgress, IndexSnapshotStore
+
+def write_snapshot(store, content):
+    with store.build() as snapshot_dir:
+        with open(os.path.join(snapshot_dir, "docstore.json"), "w") as f:
+            f.write(content)
+    return snapshot_dir
+
+def test_build_publishes_complete_snapshot(tmp_path):
+    """Test readers see the previous snapshot until a build finishes, and never a failed build"""
+    store = IndexSnapshotStore(str(tmp_path), keep=3, grace_seconds=0)
+    assert store.current_dir() is None
+
+    first = write_snapshot(store, "first")
+    assert store.current_dir() == os.path.realpath(first)
+
+    with pytest.raises(RuntimeError):
+        with store.build() as snapshot_dir:
+            assert store.current_dir() == os.path.realpath(first)
+            raise RuntimeError("embedding failed")
+    assert not os.path.exists(snapshot_dir)
+    assert store.current_dir() == os.path.realpath(first)
+
+def test_concurrent_build_is_rejected(tmp_path):
+    """Test a non-blocking build fails while another build holds the lock"""
+    store = IndexSnapshotStore(str(tmp_path))
+    with store.build():
+        with pytest.raises(IndexBuildInProgress):
+            with IndexSnapshotStore(str(tmp_path)).build(blocking=False):
+                pass
+
+def test_garbage_collection_keeps_newest_snapshots(tmp_path):
+    """Test old snapshots are removed while the newest and current ones are kept"""
+    store = IndexSnapshotStore(str(tmp_path), keep=2, grace_seconds=0)
+    snapshots = [write_snapshot(store, str(i)) for i in range(4)]
+
+    assert sorted(os.listdir(store.snapshots_dir)) == sorted(os.path.basename(path) for path in snapshots[-2:])
+    with open(os.path.join(store.current_dir(), "docstore.json")) as f:
+        assert f.read() == "3"
+
+def test_grace_period_starts_when_a_snapshot_is_superseded(tmp_path):
+    """Test a long-lived snapshot is kept for the grace period after it stops being current, not after it was built"""
+    store = IndexSnapshotStore(str(tmp_path), keep=1, grace_seconds=300)
+    first = write_snapshot(store, "first")
+    os.utime(first, (0, 0))
+
+    second = write_snapshot(store, "second")
+    assert os.path.exists(first)
+
+    marker = os.path.join(first, SUPERSEDED_MARKER_FILE)
+    os.utime(marker, (0, 0))
+    os.utime(second, (0, 0))
+    write_snapshot(store, "third")
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
@@ -0,0 +1,186 @@
+import numpy as np
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.dao import MatchDAO
+from app.matching import EmbeddingCache, MatchUpdater, match_pairs, normalize, top_k_per_row, update_pairs
+from app.models import OpportunityMatch
+
+# Create in-memory SQLite database for testing
+SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """Session on freshly created tables"""
+    OpportunityMatch.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        OpportunityMatch.metadata.drop_all(bind=engine)
+
+def random_vectors(count, dim=16, seed=0):
+    return normalize(np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32))
+
+def test_top_k_per_row_matches_brute_force():
+    """Test chunked top-k equals sorting the full score matrix"""
+    queries = random_vectors(25, seed=1)
+    targets = random_vectors(40, seed=2)
+    expected = np.argsort(-(queries @ targets.T), axis=1)[:, :5]
+
+    results = list(top_k_per_row(queries, targets, k=5, chunk_size=7))
+
+    assert [row for row, _, _ in results] == list(range(25))
+    for row, top, scores in results:
+        assert list(top) == list(expected[row])
+        assert list(scores) == sorted(scores, reverse=True)
+
+def test_match_pairs_keeps_top_k_for_both_sides():
+    """Test every person and every opportunity keeps k matches"""
+    staff_ids = np.arange(100, 130)
+    opportunity_ids = np.arange(1, 6)
+    pairs = match_pairs(staff_ids, random_vectors(30, seed=3), opportunity_ids, random_vectors(5, seed=4), k=2)
+
+    for user_id in staff_ids:
+        assert sum(1 for (u, _) in pairs if u == user_id) >= 2
+    for opportunity_id in opportunity_ids:
+        assert sum(1 for (_, o) in pairs if o == opportunity_id) >= 2
+
+class CountingEmbedding(MockEmbedding):
+    calls: int = 0
+
+    def _get_text_embeddings(self, texts):
+        self.calls += len(texts)
+        return super()._get_text_embeddings(texts)
+
+def test_embedding_cache_only_embeds_changed_texts(tmp_path):
+    """Test cached embeddings are reused and removed ids are dropped"""
+    path = str(tmp_path / "staff.npz")
+    embed_model = CountingEmbedding(embed_dim=8)
+
+    cache = EmbeddingCache(path)
+    ids, vectors, embedded = cache.embed({1: "Java", 2: "SAP", 3: "Salesforce"}, embed_model)
+    assert embedded == 3
+    assert vectors.shape == (3, 8)
+    cache.save()
+
+    cache = EmbeddingCache(path)
+    ids, vectors, embedded = cache.embed({1: "Java", 2: "SAP FICO"}, embed_model)
+    assert embedded == 1
+    assert sorted(ids) == [1, 2]
+    assert embed_model.calls == 4
+
+def apply_update(stored, pairs, affected_staff, affected_opportunities):
+    """Stored matches after the rescored rows and columns are replaced"""
+    kept = {key: score for key, score in stored.items()
+            if key[0] not in affected_staff and key[1] not in affected_opportunities}
+    return {**kept, **pairs}
+
+def test_update_pairs_equals_full_recompute():
+    """Test an incremental update after staff and opportunity changes stores what a full refresh would"""
+    staff_ids = np.arange(100, 160)
+    staff_vectors = random_vectors(60, seed=5)
+    opportunity_ids = np.arange(1, 41)
+    opportunity_vectors = random_vectors(40, seed=6)
+    stored = match_pairs(staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, k=3)
+
+    # Two staff join, opportunity 5 is edited, 7 and 8 are removed and 41 is added
+    staff_ids = np.concatenate([staff_ids, [160, 161]])
+    staff_vectors = np.concatenate([staff_vectors, random_vectors(2, seed=7)])
+    opportunity_vectors = opportunity_vectors.copy()
+    opportunity_vectors[4] = random_vectors(1, seed=8)[0]
+    keep = ~np.isin(opportunity_ids, [7, 8])
+    opportunity_ids = np.concatenate([opportunity_ids[keep], [41]])
+    opportunity_vectors = np.concatenate([opportunity_vectors[keep], random_vectors(1, seed=9)])
+
+    pairs, affected_staff, affected_opportunities = update_pairs(
+        staff_ids, staff_vectors, opportunity_ids, opportunity_vectors,
+        stored, {160, 161}, {5, 7, 8, 41}, k=3, chunk_size=7,
+    )
+
+    expected = match_pairs(staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, k=3)
+    updated = apply_update(stored, pairs, affected_staff, affected_opportunities)
+    assert updated.keys() == expected.keys()
+    assert all(abs(updated[key] - expected[key]) < 1e-5 for key in expected)
+    assert len(affected_staff) < len(staff_ids)
+    assert len(affected_opportunities) < len(opportunity_ids)
+
+def test_update_pairs_without_changes_rescores_nothing():
+    """Test an update with no changes and complete stored matches touches no rows"""
+    staff_ids = np.arange(100, 120)
+    staff_vectors = random_vectors(20, seed=10)
+    opportunity_ids = np.arange(1, 11)
+    opportunity_vectors = random_vectors(10, seed=11)
+    stored = match_pairs(staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, k=3)
+
+    pairs, affected_staff, affected_opportunities = update_pairs(
+        staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, stored, set(), set(), k=3,
+    )
+    assert (pairs, affected_staff, affected_opportunities) == ({}, set(), set())
+
+def test_update_pairs_from_empty_store_computes_everything():
+    """Test staff and opportunities without stored matches are all scored"""
+    staff_ids = np.arange(100, 110)
+    staff_vectors = random_vectors(10, seed=12)
+    opportunity_ids = np.arange(1, 6)
+    opportunity_vectors = random_vectors(5, seed=13)
+
+    pairs, _, _ = update_pairs(staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, {}, set(), set(), k=2)
+    assert pairs.keys() == match_pairs(staff_ids, staff_vectors, opportunity_ids, opportunity_vectors, k=2).keys()
+
+def test_replace_matches_writes_with_bulk_statements(db_session):
+    """Test new and rescored pairs are upserted in one statement and stale pairs deleted in one"""
+    MatchDAO.replace_matches(db_session, {(1, 1): 0.5, (1, 2): 0.4, (2, 1): 0.3}, {})
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    stored = MatchDAO.list_match_scores(db_session)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        changed = MatchDAO.replace_matches(db_session, {(1, 1): 0.5, (1, 2): 0.9, (3, 1): 0.7}, stored)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert changed == 3
+    assert [statement.split()[0] for statement in statements] == ["INSERT", "DELETE"]
+    assert "ON CONFLICT" in statements[0]
+    assert MatchDAO.list_match_scores(db_session) == {(1, 1): 0.5, (1, 2): 0.9, (3, 1): 0.7}
+
+def test_match_updater_runs_once_per_burst():
+    """Test requests made before the update runs share it, with their staff ids merged"""
+    calls = []
+    updater = MatchUpdater(delay=0)
+    updater._update = calls.append
+
+    assert not updater.run_pending()
+    updater.request()
+    updater.request([3])
+    updater.request([4])
+    assert updater.run_pending()
+    assert not updater.run_pending()
+    assert calls == [{3, 4}]
+
+def test_match_updater_keeps_staff_after_failure():
+    """Test a failed update is retried with the same staff ids"""
+    calls = []
+    def update(staff):
+        calls.append(staff)
+        if len(calls) == 1:
+            raise RuntimeError("database unavailable")
+
+    updater = MatchUpdater(delay=0)
+    updater._update = update
+    updater.request([7])
+    assert not updater.run_pending()
+    assert updater.run_pending()
+    assert calls == [{7}, {7}]
@@ -0,0 +1,54 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.controller import router
+from app.dao import OptionDAO
+from app.database import get_db
+from app.models import Base, Option, Query
+from app.service import OptionService
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """Two options, one with queries stored out of order and one without queries"""
+    Base.metadata.create_all(bind=engine)
+    OptionService.clear_onboarding_cache()
+    db = TestingSessionLocal()
+    db.add_all([Option(id=1, initial_option="Find work"), Option(id=2, initial_option="Staff an engagement")])
+    db.add_all([
+        Query(option_id=1, ask="What is your rank?", order_num=2),
+        Query(option_id=1, ask="What are your skills?", order_num=1),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def test_options_with_queries_are_grouped_in_order(db_session):
+    """Test one joined read returns every option with its queries ordered"""
+    options = OptionDAO.list_options_with_queries(db_session)
+    assert [(option.id, [query.order_num for query in option.queries]) for option in options] == [(1, [1, 2]), (2, [])]
+
+def test_onboarding_endpoint_revalidates_with_etag(db_session):
+    """Test the bundle is served with an ETag and a matching If-None-Match gets 304"""
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: db_session
+    client = TestClient(app)
+
+    response = client.get("/onboarding")
+    assert response.status_code == 200
+    assert response.json()[0]["queries"][0]["ask"] == "What are your skills?"
+
+    etag = response.headers["ETag"]
+    revalidated = client.get("/onboarding", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
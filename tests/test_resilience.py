@@ -0,0 +1,114 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import httpx
+import pytest
+from mistralai import Mistral
+
+from app.resilience import CircuitBreaker, CircuitOpenError, ResilientTransport
+
+COMPLETION = {
+    "id": "cmpl-1", "object": "chat.completion", "created": 0, "model": "mistral-large-latest",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "Hello"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 1, "total_tokens": 4},
+}
+
+class FakeMistral(ThreadingHTTPServer):
+    """Local server answering each request with the next scripted (status, delay) reply, 200 once the script runs out"""
+    daemon_threads = True
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+        self.lock = threading.Lock()
+        super().__init__(("127.0.0.1", 0), FakeHandler)
+
+    def next_reply(self):
+        with self.lock:
+            self.requests += 1
+            return self.script.pop(0) if self.script else (200, 0)
+
+class FakeHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, delay = self.server.next_reply()
+        time.sleep(delay)
+        body = json.dumps(COMPLETION if status == 200 else {"message": "error"}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            if status == 429:
+                self.send_header("Retry-After", "0")
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+@pytest.fixture
+def fake_server(request):
+    server = FakeMistral(getattr(request, "param", []))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_client(server, **options):
+    transport = ResilientTransport(httpx.HTTPTransport(), base_delay=0.01, max_delay=0.05, **options)
+    return httpx.Client(transport=transport, base_url=f"http://127.0.0.1:{server.server_port}"), transport
+
+@pytest.mark.parametrize("fake_server", [[(503, 0), (429, 0)]], indirect=True)
+def test_retries_throttled_and_failed_calls_through_the_sdk(fake_server):
+    """Test a Mistral SDK call succeeds after a 503 and a 429 are retried"""
+    client, transport = make_client(fake_server)
+    mistral = Mistral(api_key="test", client=client, server_url=f"http://127.0.0.1:{fake_server.server_port}")
+
+    response = mistral.chat.complete(model="mistral-large-latest", messages=[{"role": "user", "content": "Hi"}])
+    assert response.choices[0].message.content == "Hello"
+    assert fake_server.requests == 3
+    assert transport.stats()["retries"] == 2 and transport.breaker.state == "closed"
+
+@pytest.mark.parametrize("fake_server", [[(200, 2)]], indirect=True)
+def test_deadline_bounds_a_slow_call(fake_server):
+    """Test a call slower than its deadline fails at the deadline instead of waiting for the provider"""
+    client, transport = make_client(fake_server, deadline=0.3, max_retries=5)
+    started = time.monotonic()
+    with pytest.raises(httpx.TimeoutException):
+        client.post("/v1/chat/completions", json={})
+    assert time.monotonic() - started < 1
+    assert transport.stats()["deadline_exceeded"] == 1
+
+@pytest.mark.parametrize("fake_server", [[(200, 0), (200, 2)]], indirect=True)
+def test_hedged_request_answers_a_slow_call(fake_server):
+    """Test a duplicate request is sent once a call is slower than the tracked latency and the first answer wins"""
+    client, transport = make_client(fake_server, hedge=True, hedge_min_delay=0.1, hedge_min_samples=1)
+    client.post("/v1/chat/completions", json={})
+
+    started = time.monotonic()
+    assert client.post("/v1/chat/completions", json={}).json()["choices"][0]["message"]["content"] == "Hello"
+    assert time.monotonic() - started < 1
+    assert transport.stats()["hedges"] == 1 and transport.stats()["hedge_wins"] == 1
+
+@pytest.mark.parametrize("fake_server", [[(500, 0)] * 4], indirect=True)
+def test_breaker_fails_fast_then_recovers(fake_server):
+    """Test the breaker opens after consecutive failures, rejects without calling, and closes after a good probe"""
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=lambda: now[0])
+    client, transport = make_client(fake_server, max_retries=1, breaker=breaker)
+
+    for _ in range(2):
+        assert client.post("/v1/chat/completions", json={}).status_code == 500
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        client.post("/v1/chat/completions", json={})
+    assert fake_server.requests == 4
+    assert transport.stats()["breaker"]["rejected"] == 1
+
+    now[0] = 31
+    assert client.post("/v1/chat/completions", json={}).status_code == 200
+    assert breaker.state == "closed"
@@ -0,0 +1,83 @@
+from unittest import mock
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import get_db
+from app.models import Base, Opportunity, Option, Query
+from app.service import OpportunityResponse, OpportunityService, QueryResponse, QueryService
+
+# main creates its tables on the configured database at import, the tests use SQLite instead
+with mock.patch.object(Base.metadata, "create_all"):
+    import main
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def db_session():
+    """One option with queries and enough opportunities for a compressed listing"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    db.add(Option(id=1, initial_option="Find work"))
+    db.add_all([
+        Query(option_id=1, ask="What is your rank?", order_num=2),
+        Query(option_id=1, ask="What are your skills?", order_num=1),
+    ])
+    db.add_all([
+        Opportunity(details=f"Engagement {number}: SAP FICO migration for a retail client", department_id=number % 3 or None, user_id=number)
+        for number in range(1, 51)
+    ])
+    db.add(Opportunity(details="Engagement 1: SAP FICO migration, reposted", department_id=1, duplicate_of=1))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+@pytest.fixture
+def client(db_session):
+    main.app.dependency_overrides[get_db] = lambda: db_session
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
+
+def test_query_fast_path_matches_response_model(client, db_session):
+    """Test the orjson query rows serialize like the QueryResponse models"""
+    response = client.get("/query/1")
+
+    assert response.status_code == 200
+    assert response.json() == [query.model_dump() for query in QueryService.list_all_queries_per_option(1, db_session)]
+    assert [QueryResponse(**row) for row in response.json()] == QueryService.list_all_queries_per_option(1, db_session)
+
+def test_opportunities_fast_path_matches_response_model(client, db_session):
+    """Test the orjson opportunity rows serialize like the OpportunityResponse models"""
+    response = client.get("/opportunities")
+
+    assert response.status_code == 200
+    assert len(response.json()) == 51
+    assert response.json() == [opportunity.model_dump() for opportunity in OpportunityService.get_opportunities(db_session)]
+    assert [OpportunityResponse(**row) for row in response.json()] == OpportunityService.get_opportunities(db_session)
+
+@pytest.mark.parametrize("accept_encoding, content_encoding", [("br", "br"), ("gzip", "gzip"), ("identity", None)])
+def test_large_responses_are_compressed_when_accepted(client, accept_encoding, content_encoding):
+    """Test bodies above the minimum size use brotli when accepted and gzip otherwise"""
+    response = client.get("/opportunities", headers={"Accept-Encoding": accept_encoding})
+
+    assert len(response.content) > main.RESPONSE_COMPRESSION_MIN_SIZE
+    assert response.headers.get("content-encoding") == content_encoding
+    assert len(response.json()) == 51
+
+@pytest.mark.parametrize("accept_encoding", ["br", "gzip"])
+def test_small_responses_are_not_compressed(client, accept_encoding):
+    """Test bodies below the minimum size are sent as is"""
+    response = client.get("/query/1", headers={"Accept-Encoding": accept_encoding})
+
+    assert len(response.content) < main.RESPONSE_COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in response.headers
+    assert len(response.json()) == 2
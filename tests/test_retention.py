@@ -0,0 +1,105 @@
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.service as service
+from app.controller import router
+from app.database import get_db
+from app.index_store import IndexSnapshotStore
+from app.models import ArchivedOpportunity, Base, Opportunity, OpportunityMatch, User
+from app.retrieval import OpportunityFilter
+from app.service import AIService, RetentionService
+from app.shards import IndexShards, shard_key
+from tests.test_index_format import LetterEmbedding
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def ai_service(tmp_path, monkeypatch):
+    """Service with a letter counting embedder and a snapshot store in a temporary directory"""
+    monkeypatch.setattr(service, "snapshot_store", IndexSnapshotStore(str(tmp_path)))
+    monkeypatch.setattr(service, "_loaded_shards", None)
+    return AIService(SimpleNamespace(embed_model=LetterEmbedding()))
+
+@pytest.fixture
+def db_session():
+    """An expired, a closed, an active and an undated opportunity, a duplicate of the expired one and a match"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    db.add(User(id=1, first_name="Ada", last_name="Lovelace", email="ada@example.com", password="x", department_id=1, designation_id=1))
+    db.add_all([
+        Opportunity(id=1, details="SAP FICO migration. Start Date: 01/15/2020", department_id=1),
+        Opportunity(id=2, details="Salesforce Apex rollout. Start Date: 01/15/2999", department_id=1,
+                    closed_at=datetime(2024, 1, 1, tzinfo=timezone.utc)),
+        Opportunity(id=3, details="Java Spring Boot asset. Start Date: 01/15/2999", department_id=2),
+        Opportunity(id=4, details="Kubernetes platform build", department_id=None),
+        Opportunity(id=5, details="SAP FICO migration again. Start Date: 01/15/2999", department_id=1, duplicate_of=1),
+    ])
+    db.add(OpportunityMatch(user_id=1, opportunity_id=1, score=0.9))
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def test_archive_reasons():
+    """Test closed and past start dates are archived with duplicates of archived opportunities"""
+    opportunities = [
+        SimpleNamespace(id=1, details="Start Date: 03/01/2025", closed_at=None, duplicate_of=None),
+        SimpleNamespace(id=2, details="Start Date: 03/20/2025", closed_at=None, duplicate_of=None),
+        SimpleNamespace(id=3, details="No date", closed_at=datetime(2025, 1, 1), duplicate_of=None),
+        SimpleNamespace(id=4, details="No date", closed_at=None, duplicate_of=1),
+        SimpleNamespace(id=5, details="No date", closed_at=None, duplicate_of=None),
+    ]
+    reasons = RetentionService.archive_reasons(opportunities, date(2025, 3, 15), archive_after_days=7)
+    assert reasons == {1: "expired", 3: "closed", 4: "duplicate"}
+
+def test_retention_moves_rows_and_removes_them_from_the_index(ai_service, db_session):
+    """Test stale opportunities leave the table and their shards while other shards are linked unchanged"""
+    ai_service.create_index("mistral", db_session)
+    before = IndexShards.open(service.snapshot_store.current_dir())
+
+    response = RetentionService.archive_stale_opportunities(db_session, ai_service)
+    assert (response.archived, response.expired, response.closed, response.duplicates) == (3, 1, 1, 1)
+    assert response.indexed
+
+    assert [opp.id for opp in db_session.query(Opportunity).order_by(Opportunity.id)] == [3, 4]
+    assert db_session.query(OpportunityMatch).count() == 0
+    assert db_session.get(ArchivedOpportunity, 5).duplicate_of == 1
+
+    after = ai_service.load_current_shards()
+    assert shard_key(1) not in after
+    assert after.documents[shard_key(2)] == before.documents[shard_key(2)]
+    retriever = ai_service.build_retriever(after, OpportunityFilter())
+    assert {hit.node.metadata["opportunity_id"] for hit in retriever.retrieve("sap fico migration")} <= {3, 4}
+
+def test_shard_keeps_remaining_opportunities(ai_service, db_session):
+    """Test removing one of two indexed opportunities from a shard keeps the other searchable"""
+    ai_service.create_index("mistral", db_session)
+    assert ai_service.remove_opportunities([1]).success
+
+    index, bm25_index = ai_service.load_current_shards().load(shard_key(1), ai_service.clients.embed_model)
+    assert {hit.node.metadata["opportunity_id"] for hit in index.as_retriever(similarity_top_k=5).retrieve("sap")} == {2}
+    assert len(bm25_index) == 1
+
+def test_close_and_list_archived_endpoints(ai_service, db_session):
+    """Test a closed opportunity is archived by the retention run and listed by the archive endpoint"""
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_db] = lambda: db_session
+    client = TestClient(app)
+
+    assert client.post("/opportunities/3/close").status_code == 200
+    assert client.post("/opportunities/99/close").status_code == 404
+
+    RetentionService.archive_stale_opportunities(db_session, ai_service)
+    archived = client.get("/opportunities/archived", params={"department_id": 2}).json()
+    assert [(opp["id"], opp["archive_reason"]) for opp in archived] == [(3, "closed")]
+    assert len(client.get("/opportunities/archived", params={"limit": 2}).json()) == 2
@@ -0,0 +1,96 @@
+from datetime import date
+from llama_index.core import Settings
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from app.retrieval import (
+    BM25Index,
+    ContextPacker,
+    OpportunityFilter,
+    parse_opportunity_type,
+    parse_start_date,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+def build_index():
+    index = BM25Index()
+    index.add("1", "Client engagement for an SAP S/4HANA migration, 2 Senior with SAP FICO skills")
+    index.add("2", "Salesforce CRM rollout, 3 Staff with Salesforce and Apex experience")
+    index.add("3", "Internal asset building in Java and Spring Boot")
+    return index
+
+def test_tokenize_keeps_tech_names():
+    """Test tokenizer keeps symbols that are part of tech stack names"""
+    assert tokenize("C++, C# and .NET.") == ["c++", "c#", "and", "net"]
+
+def test_bm25_ranks_exact_keyword_first():
+    """Test keyword query returns the opportunity mentioning it"""
+    results = build_index().search("Looking for SAP work", top_k=3)
+    assert results[0][0] == "1"
+    assert all(doc_id != "3" for doc_id, _ in results)
+
+def test_bm25_remove_and_replace():
+    """Test removing and re-adding documents updates the postings"""
+    index = build_index()
+    index.remove("2")
+    assert index.search("salesforce") == []
+    assert len(index) == 2
+
+    index.add("1", "Java microservices")
+    assert index.search("sap") == []
+    assert index.search("java")[0][0] in {"1", "3"}
+
+def test_bm25_persist_round_trip(tmp_path):
+    """Test persisted index loads with identical scores"""
+    index = build_index()
+    index.persist(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert loaded.search("salesforce apex") == index.search("salesforce apex")
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """Test ids ranked by both lists beat ids ranked by one"""
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]])
+    assert fused[0][0] == "b"
+    assert {doc_id for doc_id, _ in fused} == {"a", "b", "c", "d"}
+
+def test_parse_start_date_formats():
+    """Test start date is read from the start date section in either format"""
+    assert parse_start_date("Posted 01/02/2024\n4. Estimated Start Date and Timeline: 06/15/2025, 12 weeks") == date(2025, 6, 15)
+    assert parse_start_date("Estimated Start Date: July 1st, 2025") == date(2025, 7, 1)
+    assert parse_start_date("Start date to be confirmed") is None
+
+def test_parse_opportunity_type():
+    """Test the first mentioned opportunity type wins"""
+    assert parse_opportunity_type("This is a client engagement, not BD work") == "Client engagement"
+    assert parse_opportunity_type("Looking for Java work") is None
+
+def test_opportunity_filter_keeps_unknown_metadata():
+    """Test filter only excludes opportunities known not to match"""
+    opportunity_filter = OpportunityFilter(department_id=1, opportunity_type="BD Work", min_start_date=date(2025, 1, 1))
+    assert opportunity_filter.matches({"department_id": 1, "opportunity_type": "BD Work", "start_date": "2025-03-01"})
+    assert opportunity_filter.matches({"department_id": None, "opportunity_type": None, "start_date": None})
+    assert not opportunity_filter.matches({"department_id": 2})
+    assert not opportunity_filter.matches({"opportunity_type": "Client engagement"})
+    assert not opportunity_filter.matches({"start_date": "2024-12-31"})
+
+def test_context_packer_drops_duplicates_and_fits_budget():
+    """Test packed context skips near duplicates and stays within the token budget"""
+    sap = "Engagement Name: SAP migration. Required Resources: 2 Senior with SAP FICO skills."
+    nodes = [
+        NodeWithScore(node=TextNode(text=sap), score=0.9),
+        NodeWithScore(node=TextNode(text=sap + " Posted again."), score=0.8),
+        NodeWithScore(node=TextNode(text="Salesforce rollout. " + "Apex development work. " * 200), score=0.7),
+    ]
+
+    packer = ContextPacker(token_budget=120, max_passages=5, max_passage_tokens=100)
+    packed = packer.postprocess_nodes(nodes, query_bundle=QueryBundle("SAP FICO"))
+
+    assert len(packed) == 2
+    assert packed[0].node.get_content() == sap
+    assert packed[1].node.get_content().endswith("...")
+    assert sum(len(Settings.tokenizer(node.node.get_content())) for node in packed) <= 120
+
+def test_truncate_never_exceeds_max_tokens():
+    """Test truncation is capped at max_tokens when proportional cuts overshoot"""
+    packer = ContextPacker()
+    for text, max_tokens in [("word " * 200, 1), ("Salesforce Apex Lightning " * 50, 2), ("日本語のテキスト" * 100, 4)]:
+        assert len(Settings.tokenizer(packer._truncate(text, max_tokens))) <= max_tokens
@@ -0,0 +1,87 @@
+import os
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.service as service
+from app.index_store import IndexSnapshotStore
+from app.models import Base, Opportunity
+from app.retrieval import OpportunityFilter
+from app.service import AIService
+from app.shards import IndexShards, shard_key
+from tests.test_index_format import LetterEmbedding
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@pytest.fixture
+def ai_service(tmp_path, monkeypatch):
+    """Service with a letter counting embedder and a snapshot store in a temporary directory"""
+    monkeypatch.setattr(service, "snapshot_store", IndexSnapshotStore(str(tmp_path)))
+    monkeypatch.setattr(service, "_loaded_shards", None)
+    return AIService(SimpleNamespace(embed_model=LetterEmbedding()))
+
+@pytest.fixture
+def db_session():
+    """Opportunities in two departments and one without a department"""
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    db.add_all([
+        Opportunity(id=1, details="SAP FICO migration", department_id=1),
+        Opportunity(id=2, details="Salesforce Apex rollout", department_id=1),
+        Opportunity(id=3, details="Java Spring Boot asset", department_id=2),
+        Opportunity(id=4, details="Kubernetes platform build", department_id=None),
+    ])
+    db.commit()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+def retrieved_opportunities(retriever, query):
+    return {hit.node.metadata["opportunity_id"] for hit in retriever.retrieve(query)}
+
+def test_create_index_rebuilds_only_changed_departments(ai_service, db_session):
+    """Test a second build re-embeds the changed department and links the unchanged shards"""
+    assert ai_service.create_index("mistral", db_session).message.endswith("rebuilt 3 of 3 department shards")
+    first = IndexShards.open(service.snapshot_store.current_dir())
+
+    db_session.add(Opportunity(id=5, details="SAP S/4HANA upgrade", department_id=2))
+    db_session.commit()
+    assert ai_service.create_index("mistral", db_session).message.endswith("rebuilt 1 of 3 department shards")
+    second = IndexShards.open(service.snapshot_store.current_dir())
+
+    def inode(shards, key):
+        return os.stat(os.path.join(shards.shard_dir(key), "vectors.npy")).st_ino
+    assert inode(first, shard_key(1)) == inode(second, shard_key(1))
+    assert inode(first, shard_key(2)) != inode(second, shard_key(2))
+    assert set(second.documents[shard_key(2)]) == {"3", "5"}
+
+def test_department_shard_search_and_fan_out(ai_service, db_session):
+    """Test a department only searches its own shard unless asked to search every department"""
+    ai_service.create_index("mistral", db_session)
+    shards = ai_service.load_current_shards()
+
+    retriever = ai_service.build_retriever(shards, OpportunityFilter(department_id=1))
+    assert len(retriever.retrievers) == 2
+    assert retrieved_opportunities(retriever, "java spring") <= {1, 2, 4}
+
+    retriever = ai_service.build_retriever(shards, OpportunityFilter(department_id=1), search_all_departments=True)
+    assert len(retriever.retrievers) == 3
+    assert 3 in retrieved_opportunities(retriever, "java spring")
+
+def test_index_opportunities_updates_one_shard(ai_service, db_session):
+    """Test incremental indexing adds to its department's shard and keeps the others"""
+    ai_service.create_index("mistral", db_session)
+    opportunity = Opportunity(id=5, details="Data platform on Azure", department_id=3)
+    db_session.add(opportunity)
+    db_session.commit()
+
+    assert ai_service.index_opportunities([opportunity]).success
+    shards = ai_service.load_current_shards()
+    assert set(shards.keys()) == {shard_key(1), shard_key(2), shard_key(None), shard_key(3)}
+    index, bm25_index = shards.load(shard_key(3), ai_service.clients.embed_model)
+    assert len(bm25_index) == 1 and len(index.index_struct.nodes_dict) == 1
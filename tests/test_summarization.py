@@ -0,0 +1,69 @@
+import threading
+from types import SimpleNamespace
+from mistralai import AssistantMessage, SystemMessage, TextChunk, UserMessage
+
+from app.service import AIService
+from app.summarization import (
+    CHUNK_NOTES_INSTRUCTIONS,
+    REDUCE_INSTRUCTIONS,
+    SUMMARIZE_INSTRUCTIONS,
+    chunk_lines,
+    count_tokens,
+    serialize_chat_history,
+)
+
+class FakeChat:
+    """Records the instructions of every completion and answers with a short note"""
+
+    def __init__(self):
+        self.instructions = []
+        self.lock = threading.Lock()
+
+    def complete(self, model, messages):
+        with self.lock:
+            self.instructions.append(messages[1].content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Role: SAP FICO Senior"))])
+
+def make_service():
+    chat = FakeChat()
+    clients = SimpleNamespace(chat_client=SimpleNamespace(chat=chat))
+    return AIService(clients), chat
+
+def test_serialize_chat_history_is_compact():
+    """Test transcript keeps user and assistant text only, one line per message"""
+    lines = serialize_chat_history([
+        SystemMessage(content="You are a chat bot"),
+        UserMessage(content="I need  2 Seniors\nwith SAP"),
+        AssistantMessage(content=[TextChunk(text="When do they start?")]),
+        AssistantMessage(content=""),
+    ])
+    assert lines == ["User: I need 2 Seniors with SAP", "Assistant: When do they start?"]
+
+def test_chunk_lines_keeps_order_within_budget():
+    """Test chunks respect the token budget, keep line order and split an oversized line"""
+    lines = [f"User: message number {i} about the SAP engagement" for i in range(50)]
+    lines.append("Assistant: " + "very long answer " * 100)
+    chunks = chunk_lines(lines, max_tokens=60)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    assert "\n".join(chunks).startswith("\n".join(lines[:50]))
+
+def test_short_transcript_is_summarized_in_one_call():
+    """Test a transcript within the budget needs a single completion"""
+    service, chat = make_service()
+    assert service.summarize_transcript(["User: I need an SAP Senior"]) == "Role: SAP FICO Senior"
+    assert chat.instructions == [SUMMARIZE_INSTRUCTIONS]
+
+def test_long_transcript_is_mapped_then_reduced(monkeypatch):
+    """Test a long transcript is condensed per chunk, then reduced once"""
+    monkeypatch.setattr("app.service.SUMMARIZE_CHUNK_TOKENS", 150)
+    service, chat = make_service()
+    lines = [f"User: message number {i} about the SAP engagement" for i in range(50)]
+
+    service.summarize_transcript(lines)
+
+    map_calls = chat.instructions[:-1]
+    assert len(map_calls) == len(chunk_lines(lines, max_tokens=150)) > 1
+    assert set(map_calls) == {CHUNK_NOTES_INSTRUCTIONS}
+    assert chat.instructions[-1] == REDUCE_INSTRUCTIONS
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+import httpx
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.usage as usage
+from app.models import Base, LlmUsage
+from app.usage import UsageBuffer, UsageRecord, on_request, on_response, track_usage, usage_context
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+def make_record(user_key="user:1"):
+    return UsageRecord(user_key, "/chat", "chat", "mistral-large-latest", 10, 5, 15, 120.0, datetime.now(timezone.utc))
+
+def test_buffer_flushes_in_one_batch_and_bounds_memory():
+    """Test records are held until flushed, and records over the limit are dropped"""
+    Base.metadata.create_all(bind=engine)
+    buffer = UsageBuffer(TestingSessionLocal, max_records=2, flush_size=10)
+    for _ in range(3):
+        buffer.record(make_record())
+    assert len(buffer) == 2 and buffer.dropped == 1
+
+    assert buffer.flush() == 2
+    with TestingSessionLocal() as db:
+        assert db.query(LlmUsage).count() == 2
+    Base.metadata.drop_all(bind=engine)
+
+def test_failed_flush_keeps_records_and_stop_writes_them():
+    """Test records survive a failed insert and are written by the final flush"""
+    buffer = UsageBuffer(TestingSessionLocal, flush_size=10, flush_interval=60)
+    buffer.start()
+    buffer.record(make_record())
+    assert buffer.flush() == 0
+    assert len(buffer) == 1
+
+    Base.metadata.create_all(bind=engine)
+    buffer.stop()
+    with TestingSessionLocal() as db:
+        assert db.query(LlmUsage.user_key).scalar() == "user:1"
+    Base.metadata.drop_all(bind=engine)
+
+def test_http_hooks_record_mistral_usage(monkeypatch):
+    """Test the response hook buffers token usage attributed to the current caller"""
+    buffer = UsageBuffer(TestingSessionLocal)
+    monkeypatch.setattr(usage, "usage_buffer", buffer)
+
+    def handler(request):
+        return httpx.Response(200, json={"model": "mistral-large-latest", "usage": {"prompt_tokens": 7, "completion_tokens": 3, "total_tokens": 10}})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler), event_hooks={"request": [on_request], "response": [on_response]})
+    token = usage_context.set(("user:4", "/summarize"))
+    client.post("https://api.mistral.ai/v1/chat/completions", json={})
+    client.get("https://api.mistral.ai/v1/models")
+    usage_context.reset(token)
+
+    assert len(buffer) == 1
+    record = buffer._records[0]
+    assert (record.user_key, record.endpoint, record.operation, record.total_tokens) == ("user:4", "/summarize", "chat", 10)
+
+def test_track_usage_context_reaches_sync_endpoint():
+    """Test the dependency's context is visible inside a threadpool endpoint"""
+    app = FastAPI()
+
+    @app.get("/probe", dependencies=[Depends(track_usage)])
+    def probe():
+        return {"context": usage_context.get()}
+
+    assert TestClient(app).get("/probe").json()["context"] == ["ip:testclient", "/probe"]
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import app.database as database
+import app.warmup as warmup
+from app.controller import router
+from app.database import ReplicaPool
+from app.models import Base, Option
+from app.warmup import Readiness, prewarm
+
+@pytest.fixture
+def app(monkeypatch):
+    """App on an in-memory database seeded with one option"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        connection.execute(Option.__table__.insert(), {"initial_option": "Find work"})
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "replicas", ReplicaPool([]))
+
+    app = FastAPI()
+    app.include_router(router)
+    app.state.ai_clients = None
+    return app
+
+def test_prewarm_runs_steps_then_reports_ready(app):
+    """Test every step and warm-up request is recorded before the worker is ready"""
+    readiness = Readiness()
+    assert not readiness.report()["ready"]
+
+    asyncio.run(prewarm(app, readiness, paths=["/options", "/department"]))
+
+    report = readiness.report()
+    assert report["ready"] and not report["errors"]
+    assert {"database_pool", "reference_data", "password_hashing", "warmup_requests"} <= set(report["steps"])
+
+def test_prewarm_retries_failed_required_step(app, monkeypatch):
+    """Test the worker stays unready while the database is unreachable, then recovers"""
+    attempts = []
+    def flaky_pool():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Exception("connection refused")
+    monkeypatch.setattr(warmup, "open_database_pools", flaky_pool)
+    monkeypatch.setattr(warmup, "WARMUP_RETRY_SECONDS", 0)
+
+    readiness = Readiness()
+    asyncio.run(prewarm(app, readiness, paths=[]))
+
+    assert len(attempts) == 2
+    assert readiness.ready and "database_pool" not in readiness.errors